@@ -0,0 +1,70 @@
+"""
+Matrice d'atténuation (N positions × M gateways) : boucle shapely d'origine
+(un LineString et un `intersects` par paire gateway × région) comparée à
+l'index STRtree + polygones préparés, pour un bâtiment à nombreux murs.
+
+    python -m benchmarks.bench_attenuation [--walls 300] [--positions 200] [--gateways 8]
+"""
+import argparse
+import time
+
+import numpy as np
+from shapely.geometry import box
+
+from core.attenuation import AttenuationIndex, segment_intersects_zone
+
+
+def make_walls(count, rng, extent=(0, 40, 0, 25)):
+    walls = []
+    for _ in range(count):
+        x, y = rng.uniform(extent[0], extent[1]), rng.uniform(extent[2], extent[3])
+        length, thickness = rng.uniform(1, 6), 0.2
+        if rng.random() < 0.5:
+            polygon = box(x, y, x + length, y + thickness)
+        else:
+            polygon = box(x, y, x + thickness, y + length)
+        walls.append({"polygon": polygon, "attenuation_db": float(rng.integers(3, 12))})
+    return walls
+
+
+def naive_matrix(walls, beacons, gateways):
+    matrix = np.zeros((len(beacons), len(gateways)))
+    for i, beacon in enumerate(beacons):
+        for j, gateway in enumerate(gateways):
+            for wall in walls:
+                if segment_intersects_zone(beacon, gateway, wall["polygon"]):
+                    matrix[i, j] += wall["attenuation_db"]
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--walls", type=int, default=300)
+    parser.add_argument("--positions", type=int, default=200)
+    parser.add_argument("--gateways", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    walls = make_walls(args.walls, rng)
+    beacons = rng.uniform((0, 0), (40, 25), size=(args.positions, 2))
+    gateways = rng.uniform((0, 0), (40, 25), size=(args.gateways, 2))
+
+    started = time.perf_counter()
+    reference = naive_matrix(walls, beacons, gateways)
+    naive = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = AttenuationIndex(walls)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    matrix = index.attenuation_matrix(beacons, gateways)
+    indexed = time.perf_counter() - started
+
+    print(f"[BENCH] {args.walls} murs, {args.positions} positions × {args.gateways} gateways")
+    print(f"  boucle shapely  {naive * 1000:9.1f} ms")
+    print(f"  STRtree         {indexed * 1000:9.1f} ms  (construction {build * 1000:.1f} ms, "
+          f"x{naive / indexed:.0f}, identique : {np.allclose(matrix, reference)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Localisation par empreintes (k-NN sur cKDTree) comparée à la trilatération
+par lot, sur des RSSI simulés (modèle de propagation + atténuation + bruit)
+pour un préset simple étage.
+
+    python -m benchmarks.bench_fingerprint [--preset salle_1] [--beacons 500] [--noise 3]
+
+La carte radio et les rasters sont calculés dans un dossier temporaire.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from core import config
+from core.presets import PRESETS
+from core.trilateration_utils import distance_to_rssi_array, rssi_to_distance_array, trilateration_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", default="salle_1")
+    parser.add_argument("--beacons", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=3.0, help="écart-type du bruit RSSI (dB)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from core.attenuation import load_attenuation_raster
+    from core.fingerprint import FingerprintLocator, load_radio_map
+
+    preset = PRESETS[args.preset]
+    floor = preset["floors"][0] if preset.get("multi_floor") else preset
+    names = list(floor["gateway_positions"])
+    gateways = np.array([floor["gateway_positions"][name] for name in names], dtype=float)
+    x1, x2, y1, y2 = floor["extent"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.CACHE_DIR = tmp
+        config.RADIO_MAP_FILE = os.path.join(tmp, "radiomap_{preset}.npz")
+        started = time.perf_counter()
+        locator = FingerprintLocator(load_radio_map([floor], args.preset), names)
+        build = time.perf_counter() - started
+        raster = load_attenuation_raster(floor)
+
+    rng = np.random.default_rng(0)
+    truth = np.column_stack([
+        rng.uniform(x1, x2, args.beacons), rng.uniform(y1, y2, args.beacons), np.full(args.beacons, 1.0)
+    ])
+    distances = np.linalg.norm(truth[:, None, :] - gateways[None, :, :], axis=2)
+    rssi = distance_to_rssi_array(distances) - raster.lookup(truth) + rng.normal(0, args.noise, distances.shape)
+    floor_of_beacon = np.zeros(args.beacons, dtype=int)
+    mask = np.ones_like(rssi, dtype=bool)
+    bounds = [(x1, x2), (y1, y2), (0, 3)]
+
+    locator.locate(rssi, floor_of_beacon)  # construction de l'arbre hors mesure
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        knn, _ = locator.locate(rssi, floor_of_beacon)
+    knn_time = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        solved, _ = trilateration_batch(rssi_to_distance_array(rssi), mask, gateways, bounds=bounds)
+    lm_time = (time.perf_counter() - started) / args.repeat
+
+    def error(estimate):
+        return np.median(np.linalg.norm(estimate[:, :2] - truth[:, :2], axis=1))
+
+    print(f"[BENCH] {args.preset} : {args.beacons} balises, bruit {args.noise} dB "
+          f"(carte radio construite en {build * 1000:.0f} ms)")
+    print(f"  empreintes k-NN  {args.beacons / knn_time:>10.0f} balises/s  erreur médiane {error(knn):.2f} m")
+    print(f"  trilatération    {args.beacons / lm_time:>10.0f} balises/s  erreur médiane {error(solved):.2f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Débit d'ingestion de /collect_gateway_info : un relevé par requête (format
+ESP32 historique) comparé aux formats par lot (JSON, NDJSON, MessagePack).
+
+    python -m benchmarks.bench_ingest [--readings 20000] [--batch 50]
+
+Les mesures sont écrites dans un dossier temporaire ; la sortie console du
+serveur est masquée pendant les mesures.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from core import config
+from core import server
+
+
+def make_readings(count, beacons=20, gateways=4, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "gateway_id": f"esp32_{rng.randrange(gateways) + 1}",
+            "beacon_name": f"balise_{rng.randrange(beacons) + 1}",
+            "rssi": rng.randint(-95, -45),
+            "median": rng.randint(-95, -45),
+            "timestamp": i,
+        }
+        for i in range(count)
+    ]
+
+
+def run(client, requests):
+    """Envoie les requêtes (corps, type) et retourne (durée, mesures acceptées)"""
+    received = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for body, content_type in requests:
+            response = client.post("/collect_gateway_info", data=body, content_type=content_type)
+            received += response.get_json().get("received", 0)
+    return time.perf_counter() - started, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+
+    readings = make_readings(args.readings)
+    batches = [readings[i:i + args.batch] for i in range(0, len(readings), args.batch)]
+
+    scenarios = {
+        "unitaire (JSON)": [(json.dumps(r), "application/json") for r in readings],
+        "lot JSON": [
+            (json.dumps({"gateway_id": "esp32_1", "readings": batch}), "application/json")
+            for batch in batches
+        ],
+        "lot NDJSON": [
+            ("\n".join(json.dumps(r) for r in batch), "application/x-ndjson")
+            for batch in batches
+        ],
+    }
+    if server.msgpack is not None:
+        scenarios["lot MessagePack"] = [
+            (server.msgpack.packb({"gateway_id": "esp32_1", "readings": batch}), "application/msgpack")
+            for batch in batches
+        ]
+    else:
+        print("[BENCH] msgpack non installé : scénario MessagePack ignoré")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.LOG_DIR = os.path.join(tmp, "log")
+        config.BEACONS_DIR = os.path.join(tmp, "beacons")
+        server.ring_checked = True  # pas de mémoire partagée : on mesure le chemin HTTP + journal
+        client = server.app.test_client()
+
+        print(f"[BENCH] {args.readings} relevés, lots de {args.batch}")
+        baseline = None
+        for name, requests in scenarios.items():
+            elapsed, received = run(client, requests)
+            rate = received / elapsed
+            baseline = baseline or rate
+            print(f"  {name:<18} {len(requests):>6} requêtes  {rate:>10.0f} relevés/s  (x{rate / baseline:.1f})")
+        server.get_record_log().close()
+
+
+if __name__ == "__main__":
+    main()
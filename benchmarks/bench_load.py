@@ -0,0 +1,152 @@
+"""
+Capacité de bout en bout : gateways et balises virtuels (core/simulator.py)
+envoient leurs relevés à un serveur lancé dans son propre processus, et un
+moteur de positionnement lit la mémoire partagée comme le ferait le plot.
+
+    python -m benchmarks.bench_load [--preset salle_1] [--beacons 10 100] [--rate 2] [--format batch]
+                                    [--backend asyncio] [--minew 1] [--duration 20]
+
+Rapporte pour chaque nombre de balises le débit d'ingestion, les latences
+HTTP, la latence ingestion → position (horodatage serveur de la mesure →
+publication de la position qui l'intègre) et l'erreur de position par
+rapport à la vérité terrain. Tout est écrit dans un dossier temporaire.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_server import wait_for_port
+from core import config
+from core.simulator import FORMATS, VirtualSite, start_gateways, summarize
+from core.stream_state import MeasurementCursor
+
+SERVER_SETTINGS = ("SERVER_HOST", "SERVER_PORT", "UDP_PORT", "LOG_DIR", "BEACONS_DIR", "AGGREGATES_DIR",
+                   "SHM_RING_NAME")
+
+
+def serve(backend, udp, settings):
+    for name, value in settings.items():
+        setattr(config, name, value)
+    from core import server
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.start_server(backend, udp)
+
+
+class TimedCursor(MeasurementCursor):
+    """Curseur qui retient l'horodatage d'ingestion des mesures lues depuis la dernière publication."""
+
+    def __init__(self):
+        super().__init__()
+        self.pending = []
+
+    def poll(self):
+        entries = super().poll()
+        self.pending.extend(entry["ts"] for entry in entries if "ts" in entry)
+        return entries
+
+
+def bench(args, beacons, directory, port):
+    config.LOG_DIR = os.path.join(directory, "log")
+    config.BEACONS_DIR = os.path.join(directory, "beacons")
+    config.AGGREGATES_DIR = os.path.join(directory, "aggregates")
+    config.SHM_RING_NAME = f"bench_load_{os.getpid()}_{beacons}"
+    config.SERVER_HOST, config.SERVER_PORT, config.UDP_PORT = "127.0.0.1", port, port + 1
+
+    from core.engine import PositioningEngine
+    from core.shared_ring import MeasurementRing
+
+    site = VirtualSite(args.preset, beacons, seed=args.seed)
+    ring = MeasurementRing.create()
+    settings = {name: getattr(config, name) for name in SERVER_SETTINGS}
+    process = multiprocessing.Process(target=serve, args=(args.backend, args.format == "udp", settings), daemon=True)
+    process.start()
+    try:
+        wait_for_port(port)
+        cursor = TimedCursor()
+        engine = PositioningEngine(cursor=cursor)
+        latencies, errors, floors_ok = [], [], []
+
+        def measure(positions):
+            now = time.time()
+            latencies.extend(now - ts for ts in cursor.pending)
+            cursor.pending.clear()
+            truth_floor, truth = site.truth(now)
+            index = {name: i for i, name in enumerate(site.beacon_names)}
+            for name, result in positions.items():
+                i = index.get(name)
+                if i is None or result["x"] is None:
+                    continue
+                errors.append(np.hypot(result["x"] - truth[i, 0], result["y"] - truth[i, 1]))
+                floors_ok.append(result["floor"] == truth_floor[i])
+
+        engine.subscribe(measure)
+        engine.start()
+        # Premières secondes (filtres vides, positions absentes) hors mesure
+        time.sleep(args.warmup)
+        del latencies[:], errors[:], floors_ok[:]
+        gateways = start_gateways(site, ("127.0.0.1", port), args.format, args.rate, args.duration,
+                                  args.minew, ("127.0.0.1", port + 1), args.seed)
+        for gateway in gateways:
+            gateway.join()
+        engine.stop()
+    finally:
+        process.terminate()
+        process.join()
+        ring.close()
+
+    summary = summarize(gateways, args.duration)
+    latencies = np.array(latencies) * 1000
+    for p in (50, 95, 99):
+        summary[f"position_p{p}_ms"] = float(np.percentile(latencies, p)) if len(latencies) else None
+    summary["error_median_m"] = float(np.median(errors)) if errors else None
+    summary["error_p90_m"] = float(np.percentile(errors, 90)) if errors else None
+    summary["floor_ok"] = float(np.mean(floors_ok)) if floors_ok else None
+    return summary
+
+
+def fmt(value, unit="", digits=1):
+    return "—" if value is None else f"{value:.{digits}f}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", default="salle_1")
+    parser.add_argument("--beacons", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--rate", type=float, default=config.SIM_RATE, help="envois par seconde et par gateway")
+    parser.add_argument("--format", choices=FORMATS, default="batch")
+    parser.add_argument("--minew", type=int, default=0, help="gateways Minew G1 supplémentaires")
+    parser.add_argument("--backend", choices=("flask", "asyncio"), default=config.SERVER_BACKEND)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=5201)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method("spawn")
+    print(f"[BENCH] {args.preset}, format {args.format} ({args.backend}) + {args.minew} Minew, "
+          f"{args.rate:g} envoi(s)/s par gateway, {args.duration:.0f} s par mesure")
+    with tempfile.TemporaryDirectory() as tmp:
+        config.CACHE_DIR = os.path.join(tmp, "cache")
+        config.CONFIG_FILE = os.path.join(tmp, "config.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            config.load_preset(args.preset)
+        config.BEACON_FILTER = None  # balises virtuelles
+        for offset, beacons in enumerate(args.beacons):
+            result = bench(args, beacons, os.path.join(tmp, str(beacons)), args.port + 2 * offset)
+            print(f"  {beacons:>5} balises  {result['accepted_s']:>8.0f}/{result['readings_s']:.0f} relevés/s acceptés  "
+                  f"{result['requests_s']:>6.0f} req/s  HTTP p50/p99 {fmt(result['http_p50_ms'])}/"
+                  f"{fmt(result['http_p99_ms'])} ms  codes {result['statuses']}")
+            print(f"         ingestion → position p50/p95/p99 {fmt(result['position_p50_ms'], digits=0)}/"
+                  f"{fmt(result['position_p95_ms'], digits=0)}/{fmt(result['position_p99_ms'], digits=0)} ms  "
+                  f"erreur médiane/p90 {fmt(result['error_median_m'], ' m', 2)}/{fmt(result['error_p90_m'], ' m', 2)}  "
+                  f"étage correct {fmt(result['floor_ok'] and result['floor_ok'] * 100, ' %', 0)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Débit du suivi par filtre particulaire (balises × particules par seconde)
+et erreur de suivi sur des balises simulées en marche aléatoire, RSSI issus
+du modèle de propagation avec bruit.
+
+    python -m benchmarks.bench_particles [--preset salle_2_multi] [--beacons 10 100 500] [--particles 200 1000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.particle_filter import ParticleTracker, sample_in_zones
+from core.presets import PRESETS
+
+
+def floors_of(preset):
+    if preset.get("multi_floor"):
+        return preset["floors"]
+    return [{key: preset[key] for key in ("extent", "gateway_positions", "zones")}]
+
+
+def simulate(tracker, beacons, steps, noise, interval, rng):
+    """Itérations du filtre sur des balises qui se déplacent. Retourne (durée, erreurs finales)."""
+    truth_floor = rng.integers(0, len(tracker.floors), beacons)
+    truth = sample_in_zones(tracker.boxes, truth_floor, rng)
+    names = [f"beacon_{i}" for i in range(beacons)]
+    elapsed = 0.0
+    for _ in range(steps):
+        moved = truth + rng.normal(0, 0.5 * np.sqrt(interval), truth.shape)
+        inside = tracker._inside(moved, truth_floor)
+        truth = np.where(inside[:, None], moved, truth)
+        rssi = tracker.expected_rssi(truth, truth_floor) + rng.normal(0, noise, (beacons, len(tracker.gateway_names)))
+        rssi[rssi < -95] = np.nan  # hors de portée
+        started = time.perf_counter()
+        floor_of_beacon, positions, _ = tracker.update(names, rssi, interval)
+        elapsed += time.perf_counter() - started
+    errors = np.linalg.norm(positions[:, :2] - truth, axis=1)
+    return elapsed, errors, floor_of_beacon == truth_floor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", default="salle_2_multi")
+    parser.add_argument("--beacons", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--particles", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--noise", type=float, default=3.0, help="écart-type du bruit RSSI (dB)")
+    parser.add_argument("--interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    floors = floors_of(PRESETS[args.preset])
+    # Colonnes des gateways comme dans le moteur
+    gateway_names, gateway_floor, gateway_xyz = [], [], []
+    for floor_idx, floor in enumerate(floors):
+        for gw, position in floor["gateway_positions"].items():
+            gateway_names.append(gw)
+            gateway_floor.append(floor_idx)
+            gateway_xyz.append(position)
+
+    print(f"[BENCH] {args.preset} : {len(floors)} étage(s), {len(gateway_names)} gateways, "
+          f"{args.steps} itérations, bruit {args.noise} dB")
+    for particles in args.particles:
+        for beacons in args.beacons:
+            rng = np.random.default_rng(0)
+            tracker = ParticleTracker(floors, gateway_names, gateway_floor, gateway_xyz,
+                                      particles=particles, seed=0)
+            elapsed, errors, floor_ok = simulate(tracker, beacons, args.steps, args.noise, args.interval, rng)
+            rate = beacons * particles * args.steps / elapsed
+            print(f"  {beacons:>5} balises × {particles:>5} particules  {rate / 1e6:>7.2f} M/s  "
+                  f"{elapsed / args.steps * 1000:>8.1f} ms/itération  erreur médiane {np.median(errors):.2f} m  "
+                  f"étage correct {floor_ok.mean() * 100:.0f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Débit de /collect_gateway_info servi par Flask (serveur de développement)
+puis par le frontal asyncio, avec des clients HTTP keep-alive concurrents
+envoyant un relevé ESP32 par requête.
+
+    python -m benchmarks.bench_server [--clients 8] [--duration 5]
+
+Chaque serveur tourne dans son propre processus et écrit dans un dossier
+temporaire.
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from core import config
+
+
+def serve(backend, port, directory):
+    config.SERVER_HOST = "127.0.0.1"
+    config.SERVER_PORT = port
+    config.LOG_DIR = os.path.join(directory, "log")
+    config.BEACONS_DIR = os.path.join(directory, "beacons")
+    from core import server
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.start_server(backend)
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), 0.2):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Serveur injoignable sur le port {port}")
+
+
+def client(port, duration, latencies, statuses, seed):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    deadline = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < deadline:
+        body = json.dumps({
+            "gateway_id": f"esp32_{seed}", "beacon_name": f"balise_{i % 20}",
+            "rssi": -60 - i % 30, "median": -62, "timestamp": i,
+        })
+        started = time.perf_counter()
+        connection.request("POST", "/collect_gateway_info", body, headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        i += 1
+    connection.close()
+
+
+def bench(backend, port, clients, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        process = multiprocessing.Process(target=serve, args=(backend, port, tmp), daemon=True)
+        process.start()
+        try:
+            wait_for_port(port)
+            latencies, statuses = [], {}
+            threads = [
+                threading.Thread(target=client, args=(port, duration, latencies, statuses, k))
+                for k in range(clients)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            process.terminate()
+            process.join()
+    latencies = np.array(latencies) * 1000
+    return {
+        "req_s": len(latencies) / duration,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=5101)
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method("spawn")
+    print(f"[BENCH] {args.clients} clients keep-alive, {args.duration:.0f} s par serveur")
+    for offset, backend in enumerate(("flask", "asyncio")):
+        result = bench(backend, args.port + offset, args.clients, args.duration)
+        print(f"  {backend:<8} {result['req_s']:>8.0f} req/s  p50 {result['p50_ms']:6.2f} ms  "
+              f"p99 {result['p99_ms']:6.2f} ms  codes {result['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Débit du stockage réparti (ShardPool) selon le nombre de workers, et
+cohérence avec le mode mono-processus : pour chaque balise, la suite des
+(rssi, médiane) écrite doit être identique quel que soit le nombre de shards.
+
+    python -m benchmarks.bench_shards [--readings 200000] [--workers 1,2,4]
+
+Les relevés sont au format Minew (médiane glissante calculée par le shard).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from core import config
+from core.sharding import ShardPool
+from core.storage import iter_log_records
+
+
+def make_entries(count, beacons=200, batch=50, seed=0):
+    rng = random.Random(seed)
+    entries = [
+        {
+            "time": i,
+            "beacon": f"C30000{rng.randrange(beacons):06X}",
+            "mac": None,
+            "rssi": rng.randint(-95, -45),
+            "median": None,
+            "source": "minew",
+        }
+        for i in range(count)
+    ]
+    for entry in entries:
+        entry["mac"] = entry["beacon"]
+    return [entries[i:i + batch] for i in range(0, count, batch)]
+
+
+def run(workers, batches, directory):
+    config.LOG_DIR = os.path.join(directory, "log")
+    config.BEACONS_DIR = os.path.join(directory, "beacons")
+    config.SHM_RING_NAME = f"bench_shards_{os.getpid()}"  # pas de tampon : écriture disque seule
+    pool = ShardPool(workers, queue_size=len(batches)).start()
+    time.sleep(1.0)  # démarrage des workers hors mesure
+
+    started = time.perf_counter()
+    for batch in batches:
+        if not pool.dispatch([dict(entry) for entry in batch]):
+            raise RuntimeError("File d'un shard pleine")
+    pool.close()  # attend l'écriture de toutes les mesures
+    elapsed = time.perf_counter() - started
+
+    sequences = defaultdict(list)
+    for record in iter_log_records(config.LOG_DIR):
+        sequences[record["beacon"]].append((record["rssi"], record["median"]))
+    return elapsed, sequences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--workers", default="1,2,4")
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method("spawn")
+    batches = make_entries(args.readings)
+    print(f"[BENCH] {args.readings} relevés, {multiprocessing.cpu_count()} cœurs")
+    reference = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            elapsed, sequences = run(workers, batches, tmp)
+        reference = reference or sequences
+        total = sum(len(values) for values in sequences.values())
+        consistent = "identique" if sequences == reference else "DIFFÉRENT"
+        print(f"  {workers} worker(s) {total / elapsed:>10.0f} relevés/s  "
+              f"({total} écrits, résultat {consistent})")
+
+
+if __name__ == "__main__":
+    main()
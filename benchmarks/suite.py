@@ -0,0 +1,304 @@
+"""
+Micro-benchmarks des chemins critiques du positionnement (filtres, modèle
+de distance, solveurs, détection d'étage, atténuation, handler HTTP) à
+plusieurs échelles, sur données synthétiques à graine fixe.
+
+    python -m benchmarks.suite [--filter kalman] [--output data/benchmarks/latest.json]
+                               [--baseline benchmarks/baseline.json] [--threshold 0.25] [--update-baseline]
+
+Chaque cas est chronométré par lots (durée minimale `--min-time`), en
+gardant le meilleur de `--repeat` lots. Les résultats sont écrits en JSON
+puis comparés à la référence : un cas plus lent que la référence de plus de
+`--threshold` (fraction) est une régression et le code de sortie vaut 1.
+La référence dépend de la machine : la régénérer avec --update-baseline
+sur la machine de mesure.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+from shapely.geometry import box
+
+from core import config
+
+DEFAULT_OUTPUT = os.path.join(config.DATA_DIR, "benchmarks", "latest.json")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+CASES = []
+
+
+def case(name, **scales):
+    """
+    Déclare un cas : `scales` associe à chaque paramètre la liste de ses
+    valeurs ; la fonction décorée reçoit une combinaison et retourne
+    l'appel (sans argument) à chronométrer.
+    """
+    def register(setup):
+        combinations = [{}]
+        for param, values in scales.items():
+            combinations = [dict(c, **{param: value}) for c in combinations for value in values]
+        for params in combinations:
+            label = ",".join(f"{param}={value}" for param, value in params.items())
+            CASES.append((f"{name}[{label}]", setup, params))
+        return setup
+    return register
+
+
+def random_floor(rng, gateways, extent=(0.0, 20.0, 0.0, 11.0)):
+    x1, x2, y1, y2 = extent
+    return {
+        "extent": list(extent),
+        "gateway_positions": {
+            f"gw_{k}": (float(rng.uniform(x1, x2)), float(rng.uniform(y1, y2)), 2.5) for k in range(gateways)
+        },
+        "zones": [],
+    }
+
+
+def floor_readings(rng, floors, history):
+    """{étage: {gateway: [rssi]}} avec un étage nettement plus fort que les autres"""
+    return {
+        floor_idx: {
+            gw: list(rng.normal(-65 - 15 * floor_idx, 3, history)) for gw in floor["gateway_positions"]
+        }
+        for floor_idx, floor in enumerate(floors)
+    }
+
+
+# === Filtres ===
+
+@case("apply_kalman_filter", history=[10, 100, 1000])
+def bench_kalman(rng, history):
+    from core.filters import apply_kalman_filter
+    values = list(rng.normal(-70, 4, history))
+    return lambda: apply_kalman_filter(values)
+
+
+@case("apply_butterworth_filter", history=[10, 100, 1000])
+def bench_butterworth(rng, history):
+    from core.filters import apply_butterworth_filter
+    values = list(rng.normal(-70, 4, history))
+    return lambda: apply_butterworth_filter(values)
+
+
+# === Modèle de distance et solveurs ===
+
+@case("rssi_to_distance", values=[100, 10000])
+def bench_rssi_to_distance(rng, values):
+    from core.trilateration_utils import rssi_to_distance
+    rssi = rng.integers(-95, -40, values).tolist()
+    return lambda: [rssi_to_distance(value) for value in rssi]
+
+
+@case("trilateration_optim", gateways=[3, 4, 8])
+def bench_trilateration_optim(rng, gateways):
+    from core.trilateration_utils import trilateration_optim
+    positions = [tuple(p) for p in np.column_stack([rng.uniform(0, 20, gateways), rng.uniform(0, 11, gateways),
+                                                   np.full(gateways, 2.5)])]
+    beacon = np.array([rng.uniform(0, 20), rng.uniform(0, 11), 1.0])
+    distances = list(np.linalg.norm(np.array(positions) - beacon, axis=1) * rng.uniform(0.8, 1.2, gateways))
+    return lambda: trilateration_optim(distances, positions)
+
+
+@case("trilateration_multifloor", floors=[2, 3], gateways=[3, 6])
+def bench_trilateration_multifloor(rng, floors, gateways):
+    from core.trilateration_utils import trilateration_multifloor
+    config_floors = [random_floor(rng, gateways) for _ in range(floors)]
+    readings = floor_readings(rng, config_floors, 10)
+    return lambda: trilateration_multifloor(readings, config_floors, "balise_bench")
+
+
+@case("detect_floor_from_rssi", floors=[2, 4], gateways=[3, 8])
+def bench_detect_floor(rng, floors, gateways):
+    from core.trilateration_utils import detect_floor_from_rssi
+    config_floors = [random_floor(rng, gateways) for _ in range(floors)]
+    readings = floor_readings(rng, config_floors, 10)
+    return lambda: detect_floor_from_rssi(readings, config_floors, verbose=False)
+
+
+# === Atténuation ===
+
+@case("apply_path_based_attenuation", zones=[0, 10, 100], gateways=[4, 16])
+def bench_attenuation(rng, zones, gateways):
+    from core import attenuation
+    regions = []
+    for _ in range(zones):
+        x, y = rng.uniform(0, 19), rng.uniform(0, 10)
+        regions.append({"polygon": box(x, y, x + rng.uniform(0.1, 1.0), y + rng.uniform(0.1, 1.0)),
+                        "attenuation_db": float(rng.uniform(3, 12))})
+    attenuation._index = attenuation.AttenuationIndex(regions)   # index de ce cas (au lieu de la config)
+    gateway_positions = random_floor(rng, gateways)["gateway_positions"]
+    rssi = {gw: float(rng.uniform(-90, -50)) for gw in gateway_positions}
+    beacon = (rng.uniform(0, 20), rng.uniform(0, 11), 1.0)
+    return lambda: attenuation.apply_path_based_attenuation(beacon, rssi, gateway_positions)
+
+
+# === Handler HTTP ===
+
+@case("collect_data", readings=[1, 50])
+def bench_collect_data(rng, readings):
+    from core import server
+    client = server.app.test_client()
+    if readings == 1:
+        body = json.dumps({"gateway_id": "esp32_1", "beacon_name": "balise_1", "rssi": -70, "median": -70,
+                           "timestamp": "2024-01-01T00:00:00"})
+    else:
+        body = json.dumps({"gateway_id": "esp32_1", "readings": [
+            {"beacon_name": f"balise_{k % 20}", "rssi": int(rssi), "median": int(rssi), "timestamp": k}
+            for k, rssi in enumerate(rng.integers(-95, -45, readings))
+        ]})
+    return lambda: client.post("/collect_gateway_info", data=body, content_type="application/json")
+
+
+# === Métriques ===
+
+@case("metrics_timed", enabled=[False, True])
+def bench_metrics_timed(rng, enabled):
+    """Coût d'un point de mesure seul, à comparer à la durée des étapes qu'il chronomètre"""
+    from core import metrics
+    metrics.registry = metrics.MetricsRegistry("bench") if enabled else None
+    metrics.enabled = enabled
+
+    def call():
+        with metrics.timed("bench"):
+            pass
+    return call
+
+
+def measure(call, min_time, repeat):
+    """Meilleur temps par appel (s) sur `repeat` lots d'au moins `min_time` secondes."""
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # comme timeit : pas de collecte au milieu d'un lot
+    try:
+        return _measure(call, min_time, repeat)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure(call, min_time, repeat):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed * 1.2) + 1))
+    # Le lot d'étalonnage sert de préchauffage (caches, imports paresseux) : non retenu
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best, number
+
+
+def run(pattern=None, min_time=0.1, repeat=5):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Journal et partitions du handler HTTP hors du dossier data/ du projet
+        config.LOG_DIR = os.path.join(tmp, "log")
+        config.BEACONS_DIR = os.path.join(tmp, "beacons")
+        for name, setup, params in CASES:
+            if pattern and pattern not in name:
+                continue
+            rng = np.random.default_rng(0)
+            # Les fonctions mesurées écrivent sur la console : sortie masquée
+            with contextlib.redirect_stdout(io.StringIO()):
+                call = setup(rng, **params)
+                per_call, number = measure(call, min_time, repeat)
+            results[name] = {"seconds": per_call, "number": number, "params": params}
+            print(f"  {name:<60} {per_call * 1e6:>12.1f} µs")
+        from core import attenuation, metrics, server
+        attenuation._index = None
+        metrics.enabled, metrics.registry = False, None
+        if server.record_log is not None:
+            server.record_log.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Affiche les écarts à la référence. Retourne la liste des régressions."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"  {name:<60} {'(nouveau)':>12}")
+            continue
+        ratio = result["seconds"] / reference["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ❌ régression"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  ✅ amélioration"
+        print(f"  {name:<60} {ratio:>11.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", help="ne lancer que les cas dont le nom contient ce texte")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="ralentissement toléré (fraction)")
+    parser.add_argument("--min-time", type=float, default=0.1, help="durée minimale (s) d'un lot")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true", help="enregistrer ces résultats comme référence")
+    args = parser.parse_args()
+
+    print(f"[BENCH] {len(CASES)} cas, lots ≥ {args.min_time} s, meilleur de {args.repeat}")
+    results = run(args.filter, args.min_time, args.repeat)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Résultats écrits dans {args.output}")
+
+    if args.update_baseline:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)["results"]
+        report["results"] = dict(previous, **results)  # un --filter ne met à jour que ses cas
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Référence mise à jour : {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"[WARNING] Pas de référence ({args.baseline}) : relancer avec --update-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print(f"[BENCH] Comparaison à {args.baseline} ({baseline['meta']['timestamp']}, seuil {args.threshold:.0%})")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"[BENCH] ❌ {len(regressions)} régression(s)")
+        sys.exit(1)
+    print("[BENCH] ✅ Aucune régression")
+
+
+if __name__ == "__main__":
+    main()
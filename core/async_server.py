@@ -0,0 +1,228 @@
+import asyncio
+import json
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from core import config, metrics, positions
+from core import server
+
+# Frontal d'ingestion asyncio (sans dépendance) : un serveur HTTP/1.1 minimal
+# qui valide les payloads de /collect_gateway_info, les pousse dans la file
+# bornée du journal et répond immédiatement. Les écritures disque restent dans
+# le thread du journal ; quand sa file est pleine, la requête est refusée
+# (429/503 + Retry-After) au lieu d'accumuler de la latence.
+
+INGEST_PATH = "/collect_gateway_info"
+METRICS_PATH = "/metrics"
+PROFILE_PATH = "/debug/profile"
+POSITIONS_PATH = "/positions"
+POSITIONS_STREAM_PATH = "/positions/stream"
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class IngestStats:
+    """Compteurs du frontal, résumés périodiquement sur une seule ligne."""
+
+    def __init__(self):
+        self.requests = 0
+        self.readings = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def record(self, status, body):
+        self.requests += 1
+        if status == 200:
+            self.readings += body.get("received", 0)
+        elif status in (429, 503):
+            self.rejected += 1
+        else:
+            self.errors += 1
+
+    async def report(self, interval):
+        last = (0, 0, time.monotonic())
+        while True:
+            await asyncio.sleep(interval)
+            requests, readings, started = last
+            now = time.monotonic()
+            if self.requests != requests:
+                elapsed = now - started
+                print(f"[ASYNC] {(self.requests - requests) / elapsed:.0f} req/s | "
+                      f"{(self.readings - readings) / elapsed:.0f} relevés/s | "
+                      f"rejets: {self.rejected} | erreurs: {self.errors} | "
+                      f"file: {server.queued_entries()}")
+            last = (self.requests, self.readings, now)
+
+
+def build_response(status, body, keep_alive=True, retry_after=None, content_type="application/json"):
+    """Réponse complète ; `body` est sérialisé en JSON, sauf une chaîne envoyée telle quelle."""
+    payload = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(payload)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if retry_after is not None:
+        lines.append(f"Retry-After: {retry_after}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+
+def parse_head(head):
+    """Ligne de requête (chemin et paramètres séparés) et en-têtes. Lève ValueError si la requête est mal formée."""
+    request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+    method, target, version = request_line.split(" ", 2)
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    path, _, query = target.partition("?")
+    return method, path, query, version, headers
+
+
+async def read_chunked(reader, max_body):
+    body = bytearray()
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+        if size == 0:
+            await reader.readuntil(b"\r\n")  # fin des chunks (trailers ignorés)
+            return bytes(body)
+        if len(body) + size > max_body:
+            raise OverflowError
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+
+class IngestServer:
+    """Serveur HTTP asyncio exposant /collect_gateway_info."""
+
+    def __init__(self, host=None, port=None, max_body=None, stats_interval=None):
+        self.host = host or config.SERVER_HOST
+        self.port = port or config.SERVER_PORT
+        self.max_body = max_body or config.SERVER_MAX_BODY
+        self.stats_interval = stats_interval or config.SERVER_STATS_INTERVAL
+        self.stats = IngestStats()
+        self.positions_changed = None   # asyncio.Event remplacé à chaque changement de la table des positions
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader, writer):
+        """Traite une requête. Retourne False si la connexion doit être fermée."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return False  # connexion fermée par le client entre deux requêtes
+        except asyncio.LimitOverrunError:
+            writer.write(build_response(431, {'error': 'Headers too large'}, keep_alive=False))
+            return False
+
+        try:
+            method, path, query, version, headers = parse_head(head)
+        except ValueError:
+            writer.write(build_response(400, {'error': 'Bad request'}, keep_alive=False))
+            return False
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                body = await read_chunked(reader, self.max_body)
+            else:
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    raise OverflowError
+                body = await reader.readexactly(length)
+        except OverflowError:
+            writer.write(build_response(413, {'error': 'Payload too large'}, keep_alive=False))
+            return False
+        except ValueError:
+            writer.write(build_response(400, {'error': 'Bad request'}, keep_alive=False))
+            return False
+
+        if path == POSITIONS_STREAM_PATH and method == "GET" and server.position_table is not None:
+            await self.stream_positions(writer, headers.get("last-event-id"))
+            return False
+
+        content_type = "application/json"
+        if path in (POSITIONS_PATH, POSITIONS_STREAM_PATH) and method == "GET":
+            status, response = server.positions_request(parse_qs(query).get("beacon", [None])[0])
+        elif path == METRICS_PATH and method == "GET":
+            status, response, content_type = 200, metrics.exposition(), metrics.CONTENT_TYPE
+        elif path == PROFILE_PATH and method == "POST":
+            peer = writer.get_extra_info("peername")
+            seconds = parse_qs(query).get("seconds", [None])[0]
+            status, response = server.profile_request(peer[0] if peer else "", seconds)
+        elif path != INGEST_PATH:
+            status, response = 404, {'error': 'Not found'}
+        elif method != "POST":
+            status, response = 405, {'error': 'Method not allowed'}
+        else:
+            mimetype = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            try:
+                status, response = server.ingest_payload(body, mimetype, verbose=False)
+            except Exception as e:
+                # Comme Flask : 500 au client plutôt qu'une connexion coupée sans réponse
+                print(f"[ERREUR] Requête d'ingestion non traitée : {e!r}")
+                status, response = 500, {'error': 'Internal server error'}
+            self.stats.record(status, response)
+            metrics.inc("requests_total", status=status)
+
+        retry_after = 1 if status in (429, 503) else None
+        writer.write(build_response(status, response, keep_alive, retry_after, content_type))
+        await writer.drain()
+        return keep_alive
+
+    async def stream_positions(self, writer, last_event_id=None):
+        """Flux SSE des positions, jusqu'à la déconnexion du client"""
+        table = server.position_table
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                      "Connection: close\r\n\r\n").encode("latin-1"))
+        event, version = positions.start_stream(table, last_event_id)
+        while True:
+            writer.write((event or positions.SSE_KEEPALIVE).encode("utf-8"))
+            await writer.drain()
+            if table.version == version:
+                changed = self.positions_changed
+                try:
+                    await asyncio.wait_for(changed.wait(), config.POSITIONS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    pass
+            event, version = positions.next_event(table, version)
+
+    def notify_positions(self):
+        changed, self.positions_changed = self.positions_changed, asyncio.Event()
+        changed.set()
+
+    async def serve(self):
+        if server.position_table is not None:
+            # Le moteur publie depuis son thread : réveil des flux dans la boucle asyncio
+            loop = asyncio.get_running_loop()
+            self.positions_changed = asyncio.Event()
+            server.position_table.subscribe(lambda version: loop.call_soon_threadsafe(self.notify_positions))
+        listener = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES
+        )
+        reporter = asyncio.ensure_future(self.stats.report(self.stats_interval))
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            reporter.cancel()
+
+
+def run(host=None, port=None):
+    """Lance le frontal asyncio (bloquant)."""
+    try:
+        asyncio.run(IngestServer(host, port).serve())
+    except KeyboardInterrupt:
+        pass
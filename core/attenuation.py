@@ -1,6 +1,20 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import shapely
+from shapely import STRtree
 from shapely.geometry import LineString, box, Polygon
+from core import config
 from core.config import ATTENUATION_REGIONS as ATTENUATION_ZONES
 
+# Les régions d'atténuation (murs, cloisons...) sont chargées une fois dans un
+# STRtree de polygones préparés. Les trajets balise → gateway sont construits
+# en bloc (shapely 2, vectorisé) ; l'arbre filtre les paires candidates par
+# boîte englobante puis `intersects` n'est évalué que sur celles-ci.
+
 
 def segment_intersects_zone(A, B, zone_polygon: Polygon):
     """Retourne True si le segment [A,B] intersecte une zone d'atténuation."""
@@ -10,18 +24,186 @@ def segment_intersects_zone(A, B, zone_polygon: Polygon):
     return line.intersects(zone_polygon)
 
 
+def _xy(points):
+    """Coordonnées (K, 2) de positions 2D ou 3D."""
+    points = np.asarray(points, dtype=float)
+    if points.size == 0:
+        return np.empty((0, 2))
+    return np.atleast_2d(points)[:, :2]
+
+
+class AttenuationIndex:
+    """Index spatial des régions d'atténuation."""
+
+    def __init__(self, regions=None):
+        regions = [
+            zone for zone in (ATTENUATION_ZONES if regions is None else regions)
+            if isinstance(zone.get("polygon"), Polygon)
+        ]
+        self.polygons = np.array([zone["polygon"] for zone in regions], dtype=object)
+        self.attenuation_db = np.array([zone["attenuation_db"] for zone in regions], dtype=float)
+        shapely.prepare(self.polygons)
+        self.tree = STRtree(self.polygons)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def attenuation_matrix(self, beacon_positions, gateway_positions):
+        """
+        Atténuation totale (dB) de chaque trajet balise → gateway.
+
+        Args:
+            beacon_positions: (N, 2) ou (N, 3), seules x et y sont utilisées
+            gateway_positions: (M, 2) ou (M, 3)
+
+        Returns:
+            ndarray (N, M)
+        """
+        beacons, gateways = _xy(beacon_positions), _xy(gateway_positions)
+        n, m = len(beacons), len(gateways)
+        matrix = np.zeros(n * m)
+        if not n or not m or not len(self.polygons):
+            return matrix.reshape(n, m)
+
+        # Un segment par paire (balise, gateway), dans l'ordre ligne par ligne
+        coords = np.empty((n, m, 2, 2))
+        coords[:, :, 0, :] = beacons[:, None, :]
+        coords[:, :, 1, :] = gateways[None, :, :]
+        lines = shapely.linestrings(coords.reshape(n * m, 2, 2))
+
+        # Candidats par boîte englobante, puis test exact sur les polygones préparés
+        line_idx, polygon_idx = self.tree.query(lines)
+        if len(line_idx):
+            hit = shapely.intersects(self.polygons[polygon_idx], lines[line_idx])
+            np.add.at(matrix, line_idx[hit], self.attenuation_db[polygon_idx[hit]])
+        return matrix.reshape(n, m)
+
+
+_index = None
+
+
+def get_attenuation_index():
+    """Index des régions de la configuration (construit au premier appel)."""
+    global _index
+    if _index is None:
+        _index = AttenuationIndex()
+    return _index
+
+
 def apply_path_based_attenuation(beacon_pos, filtered_rssi, gateway_positions):
     """Applique une atténuation du RSSI si le trajet passe dans une ou plusieurs zones définies."""
     adjusted_rssi = filtered_rssi.copy()
-    for gw_name, gw_pos in gateway_positions.items():
-        total_attenuation = 0
-        for zone in ATTENUATION_ZONES:
-            polygon = zone.get("polygon")
-            if isinstance(polygon, Polygon) and segment_intersects_zone(beacon_pos, gw_pos, polygon):
-                total_attenuation += zone["attenuation_db"]
+    names = list(gateway_positions)
+    if not names:
+        return adjusted_rssi
+    attenuation = get_attenuation_index().attenuation_matrix(
+        [beacon_pos], [gateway_positions[gw_name][:2] for gw_name in names]
+    )[0]
+    for gw_name, total_attenuation in zip(names, attenuation.tolist()):
         if gw_name in adjusted_rssi:
             adjusted_rssi[gw_name] += total_attenuation
         else:
             adjusted_rssi[gw_name] = total_attenuation
 
     return adjusted_rssi
+
+
+# === RASTERS PRÉCALCULÉS ===
+# Pour un préset donné, l'atténuation entre un gateway et un point de l'étage
+# ne dépend que de la géométrie : elle est échantillonnée une fois sur une
+# grille couvrant l'extent (un plan par gateway), mise en cache sur disque
+# sous une clé dérivée de la géométrie, puis lue par interpolation bilinéaire.
+# Assez rapide pour être évaluée à chaque itération du solveur.
+
+def geometry_hash(extent, gateway_positions, resolution, regions=None):
+    """Clé de cache : extent, gateways, régions d'atténuation et résolution."""
+    regions = ATTENUATION_ZONES if regions is None else regions
+    geometry = {
+        "extent": [float(v) for v in extent],
+        "gateways": {name: [float(v) for v in pos] for name, pos in gateway_positions.items()},
+        "regions": [
+            [shapely.to_wkb(zone["polygon"], hex=True), float(zone["attenuation_db"])]
+            for zone in regions if isinstance(zone.get("polygon"), Polygon)
+        ],
+        "resolution": float(resolution),
+    }
+    return hashlib.sha1(json.dumps(geometry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class AttenuationRaster:
+    """Atténuation (dB) échantillonnée sur une grille, un plan par gateway."""
+
+    def __init__(self, extent, resolution, gateway_names, grid):
+        self.extent = tuple(float(v) for v in extent)
+        self.resolution = float(resolution)
+        self.gateway_names = list(gateway_names)
+        self.grid = np.asarray(grid, dtype=np.float32)   # (ny, nx, gateways)
+
+    @classmethod
+    def build(cls, extent, gateway_positions, resolution, index=None):
+        """Échantillonne l'atténuation de chaque gateway aux nœuds de la grille."""
+        index = index or get_attenuation_index()
+        xs = np.arange(extent[0], extent[1] + resolution / 2, resolution)
+        ys = np.arange(extent[2], extent[3] + resolution / 2, resolution)
+        gx, gy = np.meshgrid(xs, ys)
+        names = list(gateway_positions)
+        matrix = index.attenuation_matrix(
+            np.column_stack([gx.ravel(), gy.ravel()]), [gateway_positions[name] for name in names]
+        )
+        return cls(extent, resolution, names, matrix.reshape(len(ys), len(xs), len(names)))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path, grid=self.grid, extent=np.asarray(self.extent), resolution=self.resolution,
+            gateway_names=np.asarray(self.gateway_names),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["extent"], float(data["resolution"]), data["gateway_names"].tolist(), data["grid"])
+
+    def lookup(self, points):
+        """Atténuation (K, gateways) aux points (K, 2+) par interpolation bilinéaire."""
+        points = _xy(points)
+        ny, nx, _ = self.grid.shape
+        fx = np.clip((points[:, 0] - self.extent[0]) / self.resolution, 0, nx - 1)
+        fy = np.clip((points[:, 1] - self.extent[2]) / self.resolution, 0, ny - 1)
+        i0 = np.minimum(fx.astype(int), max(nx - 2, 0))
+        j0 = np.minimum(fy.astype(int), max(ny - 2, 0))
+        i1, j1 = np.minimum(i0 + 1, nx - 1), np.minimum(j0 + 1, ny - 1)
+        tx, ty = (fx - i0)[:, None], (fy - j0)[:, None]
+        g = self.grid
+        return ((1 - tx) * (1 - ty) * g[j0, i0] + tx * (1 - ty) * g[j0, i1]
+                + (1 - tx) * ty * g[j1, i0] + tx * ty * g[j1, i1])
+
+
+def load_attenuation_raster(floor, resolution=None, cache_dir=None):
+    """
+    Raster d'un étage ({extent, gateway_positions}) depuis le cache disque,
+    calculé et enregistré s'il est absent ou si la géométrie a changé.
+    """
+    resolution = resolution or config.ATTENUATION_RESOLUTION
+    key = geometry_hash(floor["extent"], floor["gateway_positions"], resolution)
+    path = os.path.join(cache_dir or config.CACHE_DIR, f"attenuation-{key}.npz")
+    if os.path.exists(path):
+        try:
+            return AttenuationRaster.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] Cache d'atténuation illisible ({path}) : {e}")
+    raster = AttenuationRaster.build(floor["extent"], floor["gateway_positions"], resolution)
+    raster.save(path)
+    print(f"[ATTENUATION] Raster {raster.grid.shape[1]}×{raster.grid.shape[0]} × "
+          f"{len(raster.gateway_names)} gateways enregistré dans {path}")
+    return raster
+
+
+if __name__ == "__main__":
+    # Précalcul hors ligne : python -m core.attenuation <préset>
+    from core.presets import PRESETS
+    for preset_key in sys.argv[1:] or list(PRESETS):
+        preset = PRESETS[preset_key]
+        for floor in preset["floors"] if preset.get("multi_floor") else [preset]:
+            load_attenuation_raster(floor)
+
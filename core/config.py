@@ -4,8 +4,108 @@ import json
 
 # === CONFIGURATION GLOBALE ===
 DATA_DIR = "data"
-DATA_FILE = os.path.join(DATA_DIR, "data.json")
 CONFIG_FILE = os.path.join(DATA_DIR, "current_config.json")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")   # Données dérivées des présets (rasters...)
+
+# === SERVEUR D'INGESTION ===
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5001
+SERVER_BACKEND = "flask"           # "flask" (serveur de développement) ou "asyncio" (frontal non bloquant)
+SERVER_MAX_BODY = 1024 * 1024      # Taille max (octets) d'un corps de requête pour le frontal asyncio
+SERVER_STATS_INTERVAL = 10.0       # Période (s) du résumé de débit (frontal asyncio, UDP)
+UDP_ENABLED = False                # Écoute UDP (enregistrements binaires) en plus du HTTP
+UDP_PORT = 5002
+SLIDING_MEDIAN_WINDOW = 5          # Relevés Minew par médiane glissante
+SLIDING_MEDIAN_TTL = 300.0         # Flux (MAC) oublié après ce délai (s) sans relevé
+SLIDING_MEDIAN_MAX_STREAMS = 10000 # Flux suivis au plus (les moins récents sont évincés)
+INGEST_WORKERS = 1                 # > 1 : stockage réparti sur N processus par hachage de la balise
+SHARD_QUEUE_SIZE = 10000           # Lots en attente par worker (au-delà : 429)
+
+# === STOCKAGE DES MESURES (journal append-only) ===
+LOG_DIR = os.path.join(DATA_DIR, "log")    # Segments NDJSON du journal global
+LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024   # Rotation du segment au-delà de cette taille
+LOG_SEGMENT_MAX_AGE = 600.0                # ... ou de cet âge (s), pour que la rétention puisse le compacter
+STORAGE_QUEUE_SIZE = 100000                # Mesures en attente d'écriture (au-delà : rejet)
+STORAGE_FLUSH_INTERVAL = 0.5               # Délai max (s) avant écriture d'un lot
+STORAGE_FLUSH_BATCH = 500                  # Taille de lot déclenchant une écriture immédiate
+STORAGE_FSYNC_POLICY = "interval"          # "batch" (fsync à chaque lot), "interval" ou "never"
+STORAGE_FSYNC_INTERVAL = 5.0               # Délai (s) entre deux fsync en mode "interval"
+
+# === PARTITIONS PAR BALISE ===
+BEACONS_DIR = os.path.join(DATA_DIR, "beacons")  # Un sous-dossier de segments par balise
+BEACON_SEGMENT_MAX_BYTES = 4 * 1024 * 1024       # Rotation des segments d'une balise
+BEACON_SEGMENT_MAX_AGE = 600.0                   # ... ou au-delà de cet âge (s)
+BEACON_INDEX_INTERVAL = 1.0                      # Une entrée d'index (temps → offset) par seconde
+BEACON_MAX_OPEN_PARTITIONS = 256                 # Partitions gardées ouvertes (LRU)
+
+# === RÉTENTION DE L'HISTORIQUE ===
+# Les horizons bruts doivent dépasser l'âge max des segments (un segment plus
+# vieux que l'horizon n'est plus jamais rouvert en écriture).
+AGGREGATES_DIR = os.path.join(DATA_DIR, "aggregates")  # Agrégats par seconde / minute
+RETENTION_HOT_WINDOW = 60.0             # Flux (balise, gateway) gardé en mémoire sans nouvelle mesure (s)
+RETENTION_RAW_HORIZON = 3600.0          # Mesures brutes (journal, partitions) conservées sur disque (s)
+RETENTION_SECOND_HORIZON = 86400.0      # Agrégats par seconde conservés (s)
+RETENTION_MINUTE_HORIZON = 30 * 86400.0 # Agrégats par minute conservés (s)
+RETENTION_INTERVAL = 60.0               # Période (s) des passes de compaction
+
+# === SOLVEUR DE TRILATÉRATION ===
+SOLVER_MODE = "fast"               # "fast" : solution linéaire + raffinement si besoin, "optim" : toujours itératif
+SOLVER_RESIDUAL_THRESHOLD = 1.0    # Erreur RMS (m) au-delà de laquelle la solution linéaire est raffinée
+
+# === ATTÉNUATION (murs, cloisons) ===
+ATTENUATION_RESOLUTION = 0.25      # Pas (m) des rasters d'atténuation précalculés
+ATTENUATION_IN_SOLVER = False      # Corriger les distances (solveur) ou les RSSI attendus (particules) par l'atténuation du trajet
+
+# === LOCALISATION PAR EMPREINTES RSSI ===
+RADIO_MAP_FILE = os.path.join(DATA_DIR, "radiomap_{preset}.npz")  # Carte radio d'un préset
+RADIO_MAP_RESOLUTION = 0.5         # Pas (m) de la grille d'une carte simulée
+RADIO_MAP_HEIGHT = 1.0             # Hauteur (m) des points d'une carte simulée
+FINGERPRINT_K = 4                  # Voisins retenus (k-NN pondéré par l'inverse de la distance)
+
+# === SUIVI PAR FILTRE PARTICULAIRE ===
+PF_PARTICLES = 500                 # Particules par balise
+PF_MOTION_STD = 0.7                # Écart-type (m/√s) de la marche aléatoire
+PF_RSSI_STD = 6.0                  # Écart-type (dB) de la vraisemblance RSSI
+PF_FLOOR_CHANGE_PROB = 0.01        # Probabilité par itération qu'une particule change d'étage
+PF_FLOOR_LOSS_DB = 15.0            # Perte (dB) attendue vers un gateway d'un autre étage
+PF_HEIGHT = 1.0                    # Hauteur (m) supposée des balises
+
+# === SIMULATEUR DE CHARGE ===
+SIM_BEACONS = 20                   # Balises virtuelles
+SIM_RATE = 2.0                     # Envois par seconde et par gateway virtuel
+SIM_SPEED = 1.0                    # Vitesse (m/s) des balises sur leurs trajectoires
+SIM_NOISE_DB = 3.0                 # Écart-type (dB) du bruit ajouté au RSSI simulé
+SIM_FLOOR_LOSS_DB = 15.0           # Perte (dB) vers un gateway d'un autre étage
+SIM_SENSITIVITY = -100             # RSSI (dBm) en dessous duquel un gateway n'entend pas la balise
+
+# === MOTEUR DE POSITIONNEMENT ===
+ENGINE_INTERVAL = 0.5              # Période (s) du pipeline de positionnement, indépendante de l'affichage
+POSITIONING_MODE = "trilateration" # "trilateration" (solveur), "fingerprint" (carte radio, k-NN) ou "particle" (suivi)
+
+# === POSITIONS EN DIRECT (routes /positions du serveur) ===
+SERVER_POSITIONS = False           # Le serveur héberge un moteur de positionnement et expose ses positions
+POSITIONS_MIN_MOVE = 0.05          # Déplacement minimal (m) publié comme changement de position
+POSITIONS_HISTORY = 256            # Mises à jour conservées pour la reprise d'un flux (Last-Event-ID)
+POSITIONS_KEEPALIVE = 15.0         # Période (s) du commentaire keep-alive d'un flux sans changement
+
+# === MÉTRIQUES ===
+METRICS_ENABLED = False            # Chronométrage des étapes, compteurs et route /metrics
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")  # Instantanés des processus autres que le serveur
+METRICS_WINDOW = 1024              # Durées conservées par étape pour les quantiles
+METRICS_EXPORT_INTERVAL = 5.0      # Période (s) d'écriture des instantanés
+METRICS_SUMMARY_INTERVAL = 30.0    # Période (s) de la ligne de résumé dans la console
+
+# === PROFILAGE À LA DEMANDE ===
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")  # Profils (.pstats, .collapsed) et instantanés tracemalloc
+PROFILE_DURATION = 10.0            # Durée (s) par défaut d'une session (route /debug/profile, SIGUSR1)
+PROFILE_MAX_DURATION = 120.0       # Durée maximale (s) acceptée
+PROFILE_SAMPLE_INTERVAL = 0.005    # Période (s) d'échantillonnage des piles
+PROFILE_TRACEMALLOC_FRAMES = 10    # Profondeur des piles enregistrées par tracemalloc
+PROFILE_MEMORY_TOP = 50            # Lignes du résumé des allocations
+
+# === MÉMOIRE PARTAGÉE SERVEUR → AFFICHAGE ===
+SHM_RING_NAME = "ble_trilat_ring"  # Nom du segment de mémoire partagée
+SHM_RING_CAPACITY = 65536          # Nombre de mesures conservées dans le tampon circulaire
 
 # === CONFIGURATION ACTIVE (sera définie par le préset choisi) ===
 ACTIVE_PRESET = None
@@ -0,0 +1,337 @@
+import threading
+import time
+
+import numpy as np
+
+from core import config, metrics
+from core.stream_state import MeasurementCursor, StreamState
+from core.trilateration_utils import (
+    detect_floor_from_rssi, get_solver_stats, rssi_to_distance_array, trilateration_batch,
+)
+
+# Moteur de positionnement sans interface : ingestion → filtrage → détection
+# d'étage → trilatération → zones, cadencé par son propre thread. Les plots
+# (ou tout autre consommateur) lisent les dernières positions via
+# `get_positions()` ou s'abonnent aux mises à jour avec `subscribe()`.
+
+
+def active_floors():
+    """Étages de la configuration active (un étage unique pour un préset simple)"""
+    if config.floors:
+        return config.floors
+    return [{
+        "name": config.ACTIVE_PRESET or "",
+        "image_file": config.IMAGE_FILE,
+        "extent": config.EXTENT,
+        "gateway_positions": config.GATEWAY_POSITIONS,
+        "zones": config.ZONES,
+    }]
+
+
+def locate_zone(x, y, zones, snap=False):
+    """
+    Zone contenant (x, y). Si la position est hors zone et `snap` est vrai,
+    elle est ramenée au point le plus proche de la zone la plus proche.
+
+    Returns:
+        (zone_name ou None, x, y, in_zone)
+    """
+    for name, x1, y1, x2, y2 in zones:
+        if x1 <= x <= x2 and y1 <= y <= y2:
+            return name, x, y, True
+    if not snap or not zones:
+        return None, x, y, False
+
+    min_distance = float('inf')
+    closest_zone, corrected = None, (x, y)
+    for name, x1, y1, x2, y2 in zones:
+        corrected_x = max(x1, min(x, x2))
+        corrected_y = max(y1, min(y, y2))
+        distance = ((x - corrected_x) ** 2 + (y - corrected_y) ** 2) ** 0.5
+        if distance < min_distance:
+            min_distance = distance
+            closest_zone, corrected = name, (corrected_x, corrected_y)
+    return closest_zone, corrected[0], corrected[1], False
+
+
+class PositioningEngine:
+    """Pipeline de positionnement exécuté dans son propre thread."""
+
+    def __init__(self, interval=None, cursor=None, state=None, min_samples=None, min_gateways=None,
+                 mode=None):
+        self.interval = interval or config.ENGINE_INTERVAL
+        self.mode = mode or config.POSITIONING_MODE
+        self.cursor = cursor or MeasurementCursor()
+        self.state = state or StreamState()
+        self.floors = active_floors()
+        multi_floor = len(self.floors) > 1
+        # Mêmes seuils que les plots : 5 valeurs / 3 gateways en simple étage,
+        # 3 valeurs / 2 gateways (trilatération approximative) en multi-étages
+        self.min_samples = min_samples or (3 if multi_floor else 5)
+        self.min_gateways = min_gateways or (2 if multi_floor else 3)
+
+        # Tous les gateways, tous étages confondus (colonnes du problème de trilatération)
+        self.gateway_names = []
+        self.gateway_floor = []
+        for floor_idx, floor in enumerate(self.floors):
+            for gw in floor["gateway_positions"]:
+                self.gateway_names.append(gw)
+                self.gateway_floor.append(floor_idx)
+        self.gateway_column = {gw: j for j, gw in enumerate(self.gateway_names)}
+        self.gateway_floor = np.array(self.gateway_floor, dtype=int)
+        self.gateway_xyz = np.array(
+            [self.floors[f]["gateway_positions"][gw] for gw, f in zip(self.gateway_names, self.gateway_floor)],
+            dtype=float,
+        ).reshape(-1, 3)
+        self.floor_bounds = np.array([
+            [(floor["extent"][0], floor["extent"][1]), (floor["extent"][2], floor["extent"][3]), (0, 3)]
+            for floor in self.floors
+        ], dtype=float)
+
+        # Rasters d'atténuation par étage (précalculés, en cache disque) si le solveur les utilise
+        self.attenuation = None
+        if config.ATTENUATION_IN_SOLVER:
+            from core.attenuation import load_attenuation_raster
+            self.attenuation = [load_attenuation_raster(floor) for floor in self.floors]
+
+        # Carte radio du préset (relevée ou simulée, en cache) pour le mode empreintes
+        self.fingerprint = None
+        if self.mode == "fingerprint":
+            from core.fingerprint import FingerprintLocator, load_radio_map
+            self.fingerprint = FingerprintLocator(load_radio_map(self.floors), self.gateway_names)
+
+        # Filtres particulaires (un nuage par balise, étage porté par les particules) pour le mode suivi
+        self.tracker = None
+        self._tracked_at = None
+        if self.mode == "particle":
+            from core.particle_filter import ParticleTracker
+            self.tracker = ParticleTracker(
+                self.floors, self.gateway_names, self.gateway_floor, self.gateway_xyz,
+                attenuation=self.attenuation,
+            )
+
+        self.positions = {}          # dernier résultat par balise (remplacé d'un bloc)
+        self.last_update = None
+        self.subscribers = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    # === API ===
+
+    def get_positions(self):
+        """Dernières positions connues : {balise: résultat}"""
+        return self.positions
+
+    def subscribe(self, callback):
+        """Appelle `callback(positions)` après chaque itération du pipeline"""
+        self.subscribers.append(callback)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="positioning-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """Boucle du moteur (bloquante) : une itération toutes les `interval` secondes"""
+        if metrics.enable("engine"):
+            metrics.gauge("beacons", lambda: len(self.state.beacons))
+            metrics.collector(lambda: {f"solver_{name}_total": value for name, value in get_solver_stats().items()})
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.step()
+            except Exception as e:
+                print(f"[ENGINE] ❌ Erreur dans le pipeline : {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    # === Pipeline ===
+
+    def _select_floors(self, beacons, filtered):
+        """Étage de chaque balise (index), -1 si aucun"""
+        selected = np.full(len(beacons), -1, dtype=int)
+        if len(self.floors) == 1:
+            selected[np.isfinite(filtered).any(axis=1)] = 0
+            return selected
+
+        for i, beacon_name in enumerate(beacons):
+            floor_data = {floor_idx: {} for floor_idx in range(len(self.floors))}
+            for gw, values in self.state.streams(beacon_name).items():
+                j = self.gateway_column.get(gw)
+                if j is not None:
+                    floor_data[self.gateway_floor[j]][gw] = list(values)
+            floor_idx = detect_floor_from_rssi(floor_data, self.floors, verbose=False)
+            if floor_idx is None:
+                # Un seul étage capte la balise : pas de comparaison possible, on le retient
+                seen = np.unique(self.gateway_floor[np.isfinite(filtered[i])])
+                floor_idx = int(seen[0]) if len(seen) == 1 else None
+            if floor_idx is not None:
+                selected[i] = floor_idx
+        return selected
+
+    def _attenuation_at(self, pos, floor_of_beacon):
+        """Atténuation (N, gateways) des trajets depuis `pos`, gateways de l'étage de chaque balise."""
+        attenuation = np.zeros((len(pos), len(self.gateway_names)))
+        with metrics.timed("attenuation"):
+            for floor_idx, raster in enumerate(self.attenuation):
+                rows = np.flatnonzero(floor_of_beacon == floor_idx)
+                if len(rows):
+                    columns = [self.gateway_column[gw] for gw in raster.gateway_names]
+                    attenuation[np.ix_(rows, columns)] = raster.lookup(pos[rows])
+        return attenuation
+
+    def step(self):
+        """Une itération complète du pipeline. Retourne les positions calculées."""
+        with metrics.timed("filter"):
+            self.state.ingest(self.cursor.poll())
+            beacons = list(self.state.beacons)
+            if not beacons or not self.gateway_names:
+                return self.positions
+
+            # RSSI filtré (moyenne des 5 dernières valeurs) par balise × gateway
+            filtered = np.full((len(beacons), len(self.gateway_names)), np.nan)
+            for i, beacon_name in enumerate(beacons):
+                for gw, values in self.state.filtered_streams(beacon_name).items():
+                    j = self.gateway_column.get(gw)
+                    if j is not None and len(values) >= self.min_samples:
+                        filtered[i, j] = np.mean(list(values)[-5:])
+            distances = rssi_to_distance_array(np.nan_to_num(filtered, nan=0.0))
+
+        if self.tracker is not None:
+            return self._track(beacons, filtered, distances)
+
+        with metrics.timed("floor"):
+            floor_of_beacon = self._select_floors(beacons, filtered)
+        if self.fingerprint is not None:
+            with metrics.timed("solve"):
+                solved, residuals = self.fingerprint.locate(filtered, floor_of_beacon, self.min_gateways)
+            return self._publish(beacons, filtered, distances, floor_of_beacon, solved, residuals)
+
+        mask = np.isfinite(filtered) & (self.gateway_floor[None, :] == floor_of_beacon[:, None])
+        bounds = self.floor_bounds[np.maximum(floor_of_beacon, 0)]
+
+        # Départ à chaud depuis la position précédente sur le même étage
+        x0 = np.full((len(beacons), 3), np.nan)
+        for i, beacon_name in enumerate(beacons):
+            previous = self.positions.get(beacon_name)
+            if previous and previous["x"] is not None and previous["floor"] == floor_of_beacon[i]:
+                x0[i] = (previous["x"], previous["y"], previous["z"])
+
+        distance_fn = None
+        if self.attenuation is not None:
+            # RSSI compensé de l'atténuation du trajet depuis la position courante du solveur
+            rssi = np.nan_to_num(filtered, nan=0.0)
+            distance_fn = lambda pos: rssi_to_distance_array(
+                np.where(rssi != 0, rssi + self._attenuation_at(pos, floor_of_beacon), 0.0)
+            )
+
+        with metrics.timed("solve"):
+            solved, residuals = trilateration_batch(
+                distances, mask, self.gateway_xyz, bounds=bounds, x0=x0, min_gateways=self.min_gateways,
+                distance_fn=distance_fn,
+            )
+
+        return self._publish(beacons, filtered, distances, floor_of_beacon, solved, residuals)
+
+    def _track(self, beacons, filtered, distances):
+        """Mode suivi : une itération des filtres particulaires des balises entendues."""
+        now = time.monotonic()
+        dt = self.interval if self._tracked_at is None else now - self._tracked_at
+        self._tracked_at = now
+        self.tracker.retain(beacons)
+
+        floor_of_beacon = np.full(len(beacons), -1, dtype=int)
+        solved = np.full((len(beacons), 3), np.nan)
+        residuals = np.full(len(beacons), np.nan)
+        heard = np.flatnonzero(np.isfinite(filtered).any(axis=1))
+        if len(heard):
+            with metrics.timed("solve"):
+                floors, positions, spread = self.tracker.update([beacons[i] for i in heard], filtered[heard], dt)
+            floor_of_beacon[heard], solved[heard], residuals[heard] = floors, positions, spread
+        return self._publish(beacons, filtered, distances, floor_of_beacon, solved, residuals)
+
+    def _publish(self, beacons, filtered, distances, floor_of_beacon, solved, residuals):
+        """Construit les résultats (zones incluses), les publie et notifie les abonnés."""
+        now = time.time()
+        snap = getattr(config, 'USE_ZONES', False)
+        positions = {}
+        with metrics.timed("zones"):
+            for i, beacon_name in enumerate(beacons):
+                floor_idx = int(floor_of_beacon[i])
+                gateways = {
+                    gw: {
+                        "floor": int(self.gateway_floor[j]),
+                        "rssi": float(filtered[i, j]),
+                        "distance": float(distances[i, j]),
+                    }
+                    for j, gw in enumerate(self.gateway_names) if np.isfinite(filtered[i, j])
+                }
+                result = {
+                    "beacon": beacon_name,
+                    "floor": floor_idx if floor_idx >= 0 else None,
+                    "x": None, "y": None, "z": None,
+                    "zone": None,
+                    "in_zone": False,
+                    "residual": None,
+                    "timestamp": now,
+                    "gateways": gateways,
+                }
+                if floor_idx >= 0 and np.isfinite(solved[i]).all():
+                    zone, x, y, in_zone = locate_zone(
+                        solved[i, 0], solved[i, 1], self.floors[floor_idx]["zones"], snap=snap
+                    )
+                    result.update({
+                        "x": float(x), "y": float(y), "z": float(solved[i, 2]),
+                        "zone": zone,
+                        "in_zone": in_zone,
+                        "residual": float(residuals[i]),
+                    })
+                positions[beacon_name] = result
+
+        if metrics.enabled:
+            metrics.inc("positions_total", sum(result["x"] is not None for result in positions.values()))
+        self.positions = positions
+        self.last_update = now
+        for callback in self.subscribers:
+            try:
+                callback(positions)
+            except Exception as e:
+                print(f"[ENGINE] ❌ Erreur d'un abonné : {e}")
+        return positions
+
+
+def print_positions(positions):
+    """Abonné par défaut du mode headless : une ligne par balise positionnée"""
+    for result in positions.values():
+        if result["x"] is None:
+            continue
+        zone = result["zone"] or "hors zone"
+        print(f"[ENGINE] 📍 {result['beacon']} étage {result['floor']} : "
+              f"({result['x']:.2f}, {result['y']:.2f}, {result['z']:.2f}) | {zone} | résidu {result['residual']:.2f} m")
+
+
+def start_headless():
+    """Point d'entrée du processus de positionnement sans interface graphique"""
+    print("[ENGINE] Démarrage du moteur de positionnement (headless)...")
+    if not config.load_config_from_file():
+        print("[ERREUR] Impossible de charger la configuration")
+        return
+
+    engine = PositioningEngine()
+    engine.subscribe(print_positions)
+    from core import profiler
+    profiler.install_signal_handler("engine")
+    print(f"[ENGINE] {len(engine.floors)} étage(s), {len(engine.gateway_names)} gateways, "
+          f"période {engine.interval:.2f} s")
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        pass
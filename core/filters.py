@@ -1,5 +1,10 @@
+import bisect
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
 from filterpy.kalman import KalmanFilter
-from scipy.signal import butter, filtfilt
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
 import numpy as np
 
 # Aucun paramètre de config global requis ici,
@@ -22,9 +27,279 @@ def apply_kalman_filter(values, R=17, Q_scale=0.02):
     return [kf.update(np.array([[v]])) or kf.x[0, 0] for v in (kf.predict() or v for v in values)]
 
 
+@lru_cache(maxsize=None)
+def butterworth_sos(order=2, cutoff=0.1):
+    """Conception (mise en cache) d'un passe-bas de Butterworth en sections d'ordre 2."""
+    return butter(order, cutoff, btype='low', analog=False, output='sos')
+
+
 def apply_butterworth_filter(data, order=2, cutoff=0.1):
     """Applique un filtre passe-bas de Butterworth."""
     if len(data) < max(3 * order, 10):
         return data
-    b, a = butter(order, cutoff, btype='low', analog=False)
-    return filtfilt(b, a, data).tolist()
+    return sosfiltfilt(butterworth_sos(order, cutoff), data).tolist()
+
+
+class KalmanFilterBank:
+    """
+    Banque de filtres de Kalman à vitesse constante, un par flux RSSI
+    (balise, gateway). Même modèle que `apply_kalman_filter`, mais l'état de
+    tous les flux est conservé dans des tableaux NumPy contigus et n'avance
+    que des nouveaux échantillons, en une seule étape vectorisée par lot.
+    """
+
+    F = np.array([[1., 1.], [0., 1.]])  # matrice de transition
+    H = np.array([1., 0.])              # matrice d'observation
+
+    def __init__(self, R=17, Q_scale=0.02, capacity=64):
+        self.R = R                                # bruit de mesure
+        self.Q = np.eye(2) * Q_scale              # bruit de process
+        self.index = {}                           # clé de flux → ligne
+        self.keys = []                            # ligne → clé de flux
+        self.x = np.zeros((capacity, 2))          # états [rssi, dérivée]
+        self.P = np.zeros((capacity, 2, 2))       # covariances
+
+    def __len__(self):
+        return len(self.index)
+
+    def _rows(self, keys, values):
+        """Lignes des flux, en initialisant les nouveaux sur leur premier échantillon."""
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self.index.get(key)
+            if row is None:
+                row = len(self.index)
+                if row >= len(self.x):
+                    self.x = np.concatenate([self.x, np.zeros_like(self.x)])
+                    self.P = np.concatenate([self.P, np.zeros_like(self.P)])
+                self.index[key] = row
+                self.keys.append(key)
+                self.x[row] = (values[i], 0.)     # état initial
+                self.P[row] = np.eye(2) * 1000.   # incertitude initiale
+            rows[i] = row
+        return rows
+
+    def step(self, keys, values):
+        """
+        Avance d'un échantillon chaque flux de `keys` (clés distinctes).
+        Retourne les RSSI filtrés (n,).
+        """
+        z = np.asarray(values, dtype=float)
+        rows = self._rows(keys, z)
+        x, P = self.x[rows], self.P[rows]
+
+        # Prédiction
+        x = x @ self.F.T
+        P = self.F @ P @ self.F.T + self.Q
+
+        # Mise à jour (forme de Joseph, comme filterpy)
+        S = P[:, 0, 0] + self.R
+        K = P[:, :, 0] / S[:, None]
+        x = x + K * (z - x[:, 0])[:, None]
+        I_KH = np.eye(2) - K[:, :, None] * self.H[None, None, :]
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + self.R * K[:, :, None] * K[:, None, :]
+
+        self.x[rows], self.P[rows] = x, P
+        return x[:, 0]
+
+    def update(self, keys, values):
+        """
+        Intègre des échantillons dans l'ordre d'arrivée, plusieurs par flux
+        possibles. Retourne la valeur filtrée après chaque échantillon.
+        """
+        filtered = np.empty(len(keys))
+        occurrence = {}
+        rounds = []  # rounds[k] : positions des k-ièmes échantillons de chaque flux
+        for i, key in enumerate(keys):
+            k = occurrence.get(key, 0)
+            occurrence[key] = k + 1
+            if k == len(rounds):
+                rounds.append([])
+            rounds[k].append(i)
+
+        for positions in rounds:
+            filtered[positions] = self.step([keys[i] for i in positions], [values[i] for i in positions])
+        return filtered
+
+    def estimate(self, key):
+        """Dernier RSSI filtré d'un flux (None si inconnu)."""
+        row = self.index.get(key)
+        return None if row is None else float(self.x[row, 0])
+
+    def discard(self, keys):
+        """Oublie des flux (la dernière ligne prend la place de chaque ligne libérée)."""
+        for key in keys:
+            row = self.index.pop(key, None)
+            if row is None:
+                continue
+            last_key = self.keys.pop()
+            if last_key != key:
+                last = len(self.keys)
+                self.x[row], self.P[row] = self.x[last], self.P[last]
+                self.keys[row] = last_key
+                self.index[last_key] = row
+
+
+class ButterworthStreamBank:
+    """
+    Passe-bas de Butterworth causal et incrémental pour de nombreux flux.
+
+    Contrairement à `apply_butterworth_filter` (filtfilt sur une fenêtre
+    recalculée), chaque flux garde l'état interne `zi` de ses sections
+    d'ordre 2 : les échantillons sont traités au fil de l'eau, et tous les
+    flux d'un lot sont filtrés en un seul appel à `sosfilt`.
+    """
+
+    def __init__(self, order=2, cutoff=0.1, capacity=64):
+        self.sos = butterworth_sos(order, cutoff)
+        self.zi_unit = sosfilt_zi(self.sos)                   # état stationnaire pour une entrée de 1
+        self.index = {}                                       # clé de flux → ligne
+        self.keys = []                                        # ligne → clé de flux
+        self.zi = np.zeros((len(self.sos), capacity, 2))      # (sections, flux, 2)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _rows(self, keys, first_values):
+        """Lignes des flux ; un nouveau flux démarre en régime établi sur sa première valeur."""
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self.index.get(key)
+            if row is None:
+                row = len(self.index)
+                if row >= self.zi.shape[1]:
+                    self.zi = np.concatenate([self.zi, np.zeros_like(self.zi)], axis=1)
+                self.index[key] = row
+                self.keys.append(key)
+                self.zi[:, row, :] = self.zi_unit * first_values[i]
+            rows[i] = row
+        return rows
+
+    def process(self, keys, samples):
+        """
+        Filtre un bloc (n_flux, n_échantillons) de nouveaux échantillons,
+        une ligne par flux de `keys` (clés distinctes). Retourne le bloc filtré.
+        """
+        x = np.atleast_2d(np.asarray(samples, dtype=float))
+        rows = self._rows(keys, x[:, 0])
+        y, zf = sosfilt(self.sos, x, axis=-1, zi=self.zi[:, rows, :])
+        self.zi[:, rows, :] = zf
+        return y
+
+    def update(self, keys, values):
+        """
+        Intègre des échantillons isolés dans l'ordre d'arrivée, plusieurs par
+        flux possibles. Retourne la valeur filtrée après chaque échantillon.
+        """
+        filtered = np.empty(len(keys))
+        occurrence = {}
+        rounds = []  # rounds[k] : positions des k-ièmes échantillons de chaque flux
+        for i, key in enumerate(keys):
+            k = occurrence.get(key, 0)
+            occurrence[key] = k + 1
+            if k == len(rounds):
+                rounds.append([])
+            rounds[k].append(i)
+
+        for positions in rounds:
+            block = np.asarray([values[i] for i in positions], dtype=float)[:, None]
+            filtered[positions] = self.process([keys[i] for i in positions], block)[:, 0]
+        return filtered
+
+    def discard(self, keys):
+        """Oublie des flux (la dernière ligne prend la place de chaque ligne libérée)."""
+        for key in keys:
+            row = self.index.pop(key, None)
+            if row is None:
+                continue
+            last_key = self.keys.pop()
+            if last_key != key:
+                last = len(self.keys)
+                self.zi[:, row, :] = self.zi[:, last, :]
+                self.keys[row] = last_key
+                self.index[last_key] = row
+
+
+class RunningMedian:
+    """
+    Médiane glissante sur les `window` dernières valeurs d'un flux.
+
+    Les valeurs sont gardées dans l'ordre d'arrivée (pour savoir laquelle
+    sort) et dans une liste triée mise à jour par bisection : ni tri complet
+    ni `pop(0)` à chaque mesure.
+    """
+
+    __slots__ = ("window", "values", "ordered", "last_seen")
+
+    def __init__(self, window=5):
+        self.window = window
+        self.values = deque()
+        self.ordered = []
+        self.last_seen = 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value):
+        """Ajoute une valeur et retourne la nouvelle médiane."""
+        self.values.append(value)
+        bisect.insort(self.ordered, value)
+        if len(self.values) > self.window:
+            oldest = self.values.popleft()
+            del self.ordered[bisect.bisect_left(self.ordered, oldest)]
+        return self.median()
+
+    def median(self):
+        ordered = self.ordered
+        n = len(ordered)
+        if n == 0:
+            return None
+        return ordered[n // 2] if n % 2 == 1 else (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+
+
+class RunningMedianBank:
+    """
+    Médianes glissantes indexées par flux (MAC), avec éviction des flux
+    inactifs : au-delà de `ttl` secondes sans mesure, ou du plus ancien dès
+    que `max_streams` est dépassé. La mémoire reste bornée même quand un
+    gateway voit passer des milliers d'adresses éphémères.
+    """
+
+    def __init__(self, window=5, ttl=300.0, max_streams=10000, clock=time.monotonic):
+        self.window = window
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self.clock = clock
+        self.streams = OrderedDict()  # du moins au plus récemment mis à jour
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.streams)
+
+    def __contains__(self, key):
+        return key in self.streams
+
+    def update(self, key, value):
+        """Ajoute une valeur au flux `key` et retourne sa médiane glissante."""
+        now = self.clock()
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = RunningMedian(self.window)
+        else:
+            self.streams.move_to_end(key)
+        stream.last_seen = now
+        median = stream.push(value)
+        self.evict(now)
+        return median
+
+    def evict(self, now=None):
+        """Retire les flux expirés puis les plus anciens au-delà de `max_streams`."""
+        now = self.clock() if now is None else now
+        streams = self.streams
+        while streams:
+            key, oldest = next(iter(streams.items()))
+            if now - oldest.last_seen <= self.ttl and len(streams) <= self.max_streams:
+                break
+            del streams[key]
+            self.evicted += 1
+
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from core import config
+from core.trilateration_utils import distance_to_rssi_array
+
+# Localisation par empreintes RSSI : une carte radio associe à des points de
+# l'étage le vecteur de RSSI (corrigé) attendu sur chaque gateway, relevé sur
+# site ou simulé par le modèle de propagation et l'atténuation des murs. Une
+# balise est placée par k plus proches voisins pondérés dans l'espace des
+# RSSI (cKDTree), toutes les balises d'un étage en une requête.
+#
+# Fichier .npz par préset (data/radiomap_<préset>.npz), pour chaque étage i :
+#   floor{i}_points   (P, 3) float32    positions des points de la carte
+#   floor{i}_rssi     (P, G) float32    RSSI attendu par gateway
+#   floor{i}_gateways (G,)   str        noms des gateways (colonnes)
+# plus "source" ("simulated" ou "survey") et "geometry" (clé de la géométrie
+# d'où une carte simulée a été calculée, voir `radio_map_geometry`).
+
+
+def radio_map_geometry(floors, resolution=None, height=None):
+    """
+    Clé d'une carte simulée : géométrie de chaque étage (extent, gateways,
+    régions d'atténuation) au pas de la grille, et hauteur des points.
+    Calculée sans simuler, pour valider une carte en cache.
+    """
+    from core.attenuation import geometry_hash
+    resolution = resolution or config.RADIO_MAP_RESOLUTION
+    height = config.RADIO_MAP_HEIGHT if height is None else height
+    keys = [geometry_hash(floor["extent"], floor["gateway_positions"], resolution) for floor in floors]
+    return "-".join(keys + [f"h{float(height):g}"])
+
+
+class RadioMap:
+    """Carte radio d'un préset : points et vecteurs RSSI, par étage."""
+
+    def __init__(self, floors, source="simulated", geometry=""):
+        self.floors = floors          # [(points (P, 3), rssi (P, G), [gateways])]
+        self.source = source
+        self.geometry = geometry
+
+    @classmethod
+    def simulate(cls, floors, resolution=None, height=None):
+        """
+        Carte simulée : grille sur l'extent de chaque étage, RSSI du modèle
+        de propagation diminué de l'atténuation des murs sur le trajet.
+        """
+        from core.attenuation import load_attenuation_raster
+        resolution = resolution or config.RADIO_MAP_RESOLUTION
+        height = config.RADIO_MAP_HEIGHT if height is None else height
+
+        maps = []
+        for floor in floors:
+            x1, x2, y1, y2 = floor["extent"]
+            gx, gy = np.meshgrid(np.arange(x1, x2 + resolution / 2, resolution),
+                                 np.arange(y1, y2 + resolution / 2, resolution))
+            points = np.column_stack([gx.ravel(), gy.ravel(), np.full(gx.size, height)])
+            names = list(floor["gateway_positions"])
+            gateways = np.array([floor["gateway_positions"][name] for name in names], dtype=float)
+            distances = np.linalg.norm(points[:, None, :] - gateways[None, :, :], axis=2)
+            attenuation = load_attenuation_raster(floor).lookup(points)
+            rssi = distance_to_rssi_array(distances) - attenuation
+            maps.append((points.astype(np.float32), rssi.astype(np.float32), names))
+        return cls(maps, "simulated", radio_map_geometry(floors, resolution, height))
+
+    def save(self, path):
+        arrays = {"source": self.source, "geometry": self.geometry}
+        for i, (points, rssi, names) in enumerate(self.floors):
+            arrays[f"floor{i}_points"] = points
+            arrays[f"floor{i}_rssi"] = rssi
+            arrays[f"floor{i}_gateways"] = np.asarray(names)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        floors = []
+        with np.load(path) as data:
+            i = 0
+            while f"floor{i}_points" in data:
+                floors.append((data[f"floor{i}_points"], data[f"floor{i}_rssi"],
+                               data[f"floor{i}_gateways"].tolist()))
+                i += 1
+            return cls(floors, str(data["source"]), str(data["geometry"]))
+
+
+def radio_map_path(preset_key=None):
+    return config.RADIO_MAP_FILE.format(preset=preset_key or config.ACTIVE_PRESET)
+
+
+def load_radio_map(floors, preset_key=None):
+    """
+    Carte radio du préset : celle du fichier si c'est un relevé de terrain ou
+    une simulation de la même géométrie, sinon simulée puis enregistrée.
+    """
+    path = radio_map_path(preset_key)
+    if os.path.exists(path):
+        try:
+            radio_map = RadioMap.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] Carte radio illisible ({path}) : {e}")
+        else:
+            if radio_map.source == "survey":
+                return radio_map
+            if radio_map.geometry == radio_map_geometry(floors):
+                return radio_map
+    radio_map = RadioMap.simulate(floors)
+    radio_map.save(path)
+    print(f"[FINGERPRINT] Carte radio simulée enregistrée dans {path} "
+          f"({sum(len(points) for points, _, _ in radio_map.floors)} points)")
+    return radio_map
+
+
+class FingerprintLocator:
+    """
+    k plus proches voisins pondérés sur une carte radio. Un arbre est construit
+    (puis gardé) par étage et par combinaison de gateways entendus, pour ne
+    comparer que les RSSI réellement mesurés.
+    """
+
+    def __init__(self, radio_map, gateway_names, k=None):
+        self.radio_map = radio_map
+        self.k = k or config.FINGERPRINT_K
+        column = {name: j for j, name in enumerate(gateway_names)}
+        # Colonnes du problème (engine) de chaque gateway de la carte, par étage
+        self.columns = [
+            np.array([column.get(name, -1) for name in names]) for _, _, names in radio_map.floors
+        ]
+        self.trees = {}
+
+    def _tree(self, floor_idx, heard):
+        key = (floor_idx, heard.tobytes())
+        tree = self.trees.get(key)
+        if tree is None:
+            _, rssi, _ = self.radio_map.floors[floor_idx]
+            tree = self.trees[key] = cKDTree(rssi[:, heard])
+        return tree
+
+    def locate(self, filtered, floor_of_beacon, min_gateways=3):
+        """
+        Positions (N, 3) et dispersion des voisins retenus (N,) en mètres,
+        à partir des RSSI filtrés (N, colonnes du moteur, NaN si non entendu)
+        et de l'étage de chaque balise (-1 : aucun). NaN si non localisable.
+        """
+        positions = np.full((len(filtered), 3), np.nan)
+        spread = np.full(len(filtered), np.nan)
+        for floor_idx, (points, _, _) in enumerate(self.radio_map.floors):
+            rows = np.flatnonzero(floor_of_beacon == floor_idx)
+            if not len(rows):
+                continue
+            columns = self.columns[floor_idx]
+            observed = np.full((len(rows), len(columns)), np.nan)
+            known = columns >= 0
+            observed[:, known] = filtered[np.ix_(rows, columns[known])]
+            heard = np.isfinite(observed)
+
+            # Une requête groupée par combinaison de gateways entendus
+            patterns, inverse = np.unique(heard, axis=0, return_inverse=True)
+            for p, pattern in enumerate(patterns):
+                if pattern.sum() < min_gateways:
+                    continue
+                group = rows[inverse.ravel() == p]
+                query = observed[inverse.ravel() == p][:, pattern]
+                k = min(self.k, len(points))
+                distances, neighbours = self._tree(floor_idx, pattern).query(query, k=k)
+                distances, neighbours = distances.reshape(len(group), k), neighbours.reshape(len(group), k)
+                weights = 1.0 / np.maximum(distances, 1e-6)
+                weights /= weights.sum(axis=1, keepdims=True)
+                candidates = points[neighbours].astype(float)         # (n, k, 3)
+                estimate = (weights[..., None] * candidates).sum(axis=1)
+                positions[group] = estimate
+                spread[group] = np.sqrt(
+                    (weights * ((candidates - estimate[:, None, :]) ** 2).sum(axis=2)).sum(axis=1)
+                )
+        return positions, spread
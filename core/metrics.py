@@ -0,0 +1,349 @@
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from core import config
+
+# Instrumentation légère du pipeline : durée de chaque étape (analyse des
+# requêtes, persistance, filtrage, détection d'étage, résolution,
+# atténuation, zones, rendu) dans des fenêtres glissantes (p50/p95/p99),
+# compteurs (relevés par gateway, requêtes par code HTTP, itérations et
+# échecs du solveur) et jauges (file d'attente, balises suivies).
+#
+# Désactivée (METRICS_ENABLED = False), chaque point de mesure se réduit au
+# test d'un booléen du module. Le serveur expose ses métriques et celles des
+# autres processus (plot/moteur, shards) sur /metrics au format texte de
+# Prometheus : chaque processus autre que le serveur écrit périodiquement un
+# instantané JSON dans METRICS_DIR, relu à chaque requête.
+
+PREFIX = "ble_trilat"
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"   # format texte d'exposition de Prometheus
+OTHER_GATEWAY = "other"                                     # étiquette des relevés d'un gateway absent du préset
+
+enabled = False
+registry = None
+
+
+class RollingWindow:
+    """
+    Dernières durées d'une étape (tampon circulaire) et totaux depuis le
+    démarrage. Alimentée par plusieurs threads (requêtes, journal, moteur) :
+    un verrou par fenêtre, pour que deux étapes ne se disputent pas le même.
+    """
+
+    __slots__ = ("samples", "index", "count", "total", "lock")
+
+    def __init__(self, size):
+        self.samples = [0.0] * size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.samples[self.index] = value
+            self.index = (self.index + 1) % len(self.samples)
+            self.count += 1
+            self.total += value
+
+    def summary(self):
+        with self.lock:
+            window = self.samples[:min(self.count, len(self.samples))]
+            count, total = self.count, self.total
+        quantiles = np.quantile(window, QUANTILES).tolist() if window else [0.0] * len(QUANTILES)
+        return {"quantiles": quantiles, "count": count, "sum": total}
+
+
+class MetricsRegistry:
+    """Métriques d'un processus (`role` : server, engine, shard0...)."""
+
+    def __init__(self, role, window=None):
+        self.role = role
+        self.window = window or config.METRICS_WINDOW
+        self.stages = {}
+        self.counters = {}          # (nom, ((label, valeur), ...)) → valeur
+        self.gauges = {}            # nom → fonction sans argument
+        self.collectors = []        # fonctions → {nom de compteur: valeur} lues à l'export
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        window = self.stages.get(stage)
+        if window is None:
+            with self.lock:
+                window = self.stages.setdefault(stage, RollingWindow(self.window))
+        window.add(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        """Instantané sérialisable (JSON) de toutes les métriques."""
+        with self.lock:
+            stages = dict(self.stages)
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self.counters.items()]
+        for collect in self.collectors:
+            try:
+                counters.extend({"name": name, "labels": {}, "value": value} for name, value in collect().items())
+            except Exception as e:
+                print(f"[METRICS] ❌ Erreur d'un collecteur : {e}")
+        gauges = {}
+        for name, read in self.gauges.items():
+            try:
+                gauges[name] = float(read())
+            except Exception:
+                continue
+        return {
+            "role": self.role,
+            "time": time.time(),
+            "stages": {stage: window.summary() for stage, window in stages.items()},
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+# === Points de mesure (sans effet tant que les métriques sont désactivées) ===
+
+def timed(stage):
+    """Contexte qui chronomètre une étape : `with metrics.timed("solve"): ...`"""
+    return _Timer(stage) if enabled else NULL_TIMER
+
+
+def timed_calls(stage):
+    """Décorateur : chronomètre chaque appel de la fonction décorée"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(stage, seconds):
+    if enabled:
+        registry.observe(stage, seconds)
+
+
+def inc(name, value=1, **labels):
+    if enabled:
+        registry.inc(name, value, **labels)
+
+
+def configured_gateways():
+    """Noms des gateways du préset chargé, tous étages confondus"""
+    names = set(config.GATEWAY_POSITIONS)
+    for floor in config.floors:
+        names.update(floor.get("gateway_positions", {}))
+    return names
+
+
+def count_readings(entries):
+    """
+    Relevés reçus, par gateway. `source` vient du client : seuls les gateways
+    configurés ont leur propre série, les autres sont comptés dans "other".
+    """
+    if not enabled:
+        return
+    known = configured_gateways()
+    per_gateway = {}
+    for entry in entries:
+        gateway = entry.get("source")
+        if not isinstance(gateway, str) or gateway not in known:
+            gateway = OTHER_GATEWAY
+        per_gateway[gateway] = per_gateway.get(gateway, 0) + 1
+    for gateway, count in per_gateway.items():
+        registry.inc("readings_total", count, gateway=gateway)
+
+
+def gauge(name, read):
+    """Déclare une jauge lue à chaque export (`read()` → nombre)"""
+    if enabled:
+        registry.gauges[name] = read
+
+
+def collector(collect):
+    """Déclare des compteurs tenus ailleurs (ex. solver_stats), lus à chaque export"""
+    if enabled:
+        registry.collectors.append(collect)
+
+
+def enable(role, export=None):
+    """
+    Active les métriques de ce processus si METRICS_ENABLED. `export` : écrire
+    les instantanés dans METRICS_DIR (défaut : tous les processus sauf le serveur).
+    Démarre le rapport périodique. Retourne True si les métriques sont actives.
+    """
+    global enabled, registry
+    if not config.METRICS_ENABLED:
+        return False
+    if registry is None:
+        registry = MetricsRegistry(role)
+        enabled = True
+        MetricsReporter(role != "server" if export is None else export).start()
+    return True
+
+
+# === Export ===
+
+def snapshot_path(role, directory=None):
+    return os.path.join(directory or config.METRICS_DIR, f"{role}.json")
+
+
+def write_snapshot(directory=None):
+    """Écrit l'instantané de ce processus (remplacement atomique du fichier)."""
+    path = snapshot_path(registry.role, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp, path)
+
+
+def read_snapshots(directory=None, max_age=None):
+    """Instantanés récents des autres processus (ceux d'un processus arrêté sont ignorés)."""
+    max_age = max_age or 3 * config.METRICS_EXPORT_INTERVAL
+    now = time.time()
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory or config.METRICS_DIR, "*.json"))):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - snapshot.get("time", 0) <= max_age and (registry is None or snapshot.get("role") != registry.role):
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(snapshots):
+    """Format texte d'exposition de Prometheus pour une liste d'instantanés."""
+    stage_lines, counters, gauges = [], {}, {}
+    for snapshot in snapshots:
+        process = snapshot["role"]
+        for stage, summary in sorted(snapshot["stages"].items()):
+            labels = {"process": process, "stage": stage}
+            for q, value in zip(QUANTILES, summary["quantiles"]):
+                stage_lines.append(f"{PREFIX}_stage_seconds{_labels(dict(labels, quantile=q))} {value:.9g}")
+            stage_lines.append(f"{PREFIX}_stage_seconds_sum{_labels(labels)} {summary['sum']:.9g}")
+            stage_lines.append(f"{PREFIX}_stage_seconds_count{_labels(labels)} {summary['count']}")
+        for counter in snapshot["counters"]:
+            labels = _labels(dict(counter["labels"], process=process))
+            counters.setdefault(counter["name"], []).append(f"{PREFIX}_{counter['name']}{labels} {counter['value']:.9g}")
+        for name, value in snapshot["gauges"].items():
+            gauges.setdefault(name, []).append(f"{PREFIX}_{name}{_labels({'process': process})} {value:.9g}")
+
+    lines = []
+    if stage_lines:
+        lines += [f"# HELP {PREFIX}_stage_seconds Durée des étapes du pipeline (fenêtre glissante)",
+                  f"# TYPE {PREFIX}_stage_seconds summary"] + stage_lines
+    for name, samples in sorted(counters.items()):
+        lines += [f"# TYPE {PREFIX}_{name} counter"] + samples
+    for name, samples in sorted(gauges.items()):
+        lines += [f"# TYPE {PREFIX}_{name} gauge"] + samples
+    return "\n".join(lines) + "\n"
+
+
+def exposition(directory=None):
+    """Texte /metrics : ce processus et les instantanés récents des autres."""
+    snapshots = [registry.snapshot()] if enabled else []
+    return render_prometheus(snapshots + read_snapshots(directory))
+
+
+def summary_line(snapshot, previous=None):
+    """Ligne de résumé : p50/p95 par étape, débit de relevés depuis le résumé précédent."""
+    parts = [
+        f"{stage} {summary['quantiles'][0] * 1000:.2f}/{summary['quantiles'][1] * 1000:.2f} ms"
+        for stage, summary in sorted(snapshot["stages"].items())
+    ]
+    readings = sum(c["value"] for c in snapshot["counters"] if c["name"] == "readings_total")
+    if previous is not None and readings:
+        previous_readings = sum(c["value"] for c in previous["counters"] if c["name"] == "readings_total")
+        elapsed = max(snapshot["time"] - previous["time"], 1e-9)
+        parts.append(f"{(readings - previous_readings) / elapsed:.0f} relevés/s")
+    parts += [f"{name} {value:g}" for name, value in sorted(snapshot["gauges"].items())]
+    return f"[METRICS] {snapshot['role']} | p50/p95 " + " | ".join(parts)
+
+
+class MetricsReporter:
+    """Thread d'export des instantanés et de la ligne de résumé périodique."""
+
+    def __init__(self, export, export_interval=None, summary_interval=None):
+        self.export = export
+        self.export_interval = export_interval or config.METRICS_EXPORT_INTERVAL
+        self.summary_interval = summary_interval or config.METRICS_SUMMARY_INTERVAL
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        interval = min(self.export_interval, self.summary_interval) if self.export else self.summary_interval
+        previous, next_summary = None, time.monotonic() + self.summary_interval
+        while not self._stop.wait(interval):
+            try:
+                if self.export:
+                    write_snapshot()
+                if time.monotonic() >= next_summary:
+                    next_summary += self.summary_interval
+                    snapshot = registry.snapshot()
+                    print(summary_line(snapshot, previous))
+                    previous = snapshot
+            except Exception as e:
+                print(f"[METRICS] ❌ Erreur d'export : {e}")
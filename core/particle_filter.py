@@ -0,0 +1,207 @@
+import numpy as np
+
+from core import config
+from core.trilateration_utils import distance_to_rssi_array
+
+# Suivi par filtre particulaire : chaque balise garde un nuage de particules
+# (x, y, étage), stockées dans un seul tableau contigu (balises × particules)
+# pour que prédiction, pondération et rééchantillonnage soient vectorisés sur
+# toutes les balises à la fois. Les particules restent dans les zones (ou
+# l'extent) de leur étage et peuvent changer d'étage dans un préset
+# multi-étages ; la position publiée est la moyenne pondérée sur l'étage le
+# plus probable.
+
+
+def zone_boxes(floors):
+    """
+    Rectangles autorisés de chaque étage, (étages, zones max, 4) en
+    [x1, y1, x2, y2]. Un étage sans zone est limité à son extent ; les
+    lignes de remplissage sont vides (x1 > x2).
+    """
+    boxes = []
+    for floor in floors:
+        zones = [zone[1:5] for zone in floor["zones"]]
+        if not zones:
+            x1, x2, y1, y2 = floor["extent"]
+            zones = [(x1, y1, x2, y2)]
+        boxes.append(zones)
+    width = max(len(zones) for zones in boxes)
+    padded = np.tile(np.array([1.0, 1.0, 0.0, 0.0]), (len(floors), width, 1))
+    for f, zones in enumerate(boxes):
+        padded[f, :len(zones)] = np.array(zones, dtype=float)
+    return padded
+
+
+def sample_in_zones(boxes, floors_of_points, rng):
+    """Points uniformes dans les zones (`zone_boxes`) de l'étage de chaque point."""
+    area = np.clip(boxes[..., 2] - boxes[..., 0], 0, None) * np.clip(boxes[..., 3] - boxes[..., 1], 0, None)
+    area = area[floors_of_points]                                    # (points, zones)
+    cumulative = np.cumsum(area, axis=1)
+    pick = (rng.random(len(floors_of_points)) * cumulative[:, -1])[:, None]
+    zone = np.minimum((cumulative < pick).sum(axis=1), area.shape[1] - 1)
+    box = boxes[floors_of_points, zone]                              # (points, 4)
+    return box[:, :2] + rng.random((len(box), 2)) * (box[:, 2:] - box[:, :2])
+
+
+class ParticleTracker:
+    """Filtres particulaires de toutes les balises, en un bloc de tableaux."""
+
+    def __init__(self, floors, gateway_names, gateway_floor, gateway_xyz, particles=None,
+                 motion_std=None, rssi_std=None, floor_change_prob=None, floor_loss_db=None,
+                 height=None, attenuation=None, capacity=16, seed=None):
+        self.floors = floors
+        self.gateway_names = list(gateway_names)
+        self.gateway_floor = np.asarray(gateway_floor, dtype=int)
+        self.gateway_xyz = np.asarray(gateway_xyz, dtype=float)
+        self.n_particles = particles or config.PF_PARTICLES
+        self.motion_std = config.PF_MOTION_STD if motion_std is None else motion_std
+        self.rssi_std = rssi_std or config.PF_RSSI_STD
+        self.floor_change_prob = config.PF_FLOOR_CHANGE_PROB if floor_change_prob is None else floor_change_prob
+        self.floor_loss_db = config.PF_FLOOR_LOSS_DB if floor_loss_db is None else floor_loss_db
+        self.height = config.PF_HEIGHT if height is None else height
+        self.attenuation = attenuation      # rasters par étage (optionnel)
+        self.rng = np.random.default_rng(seed)
+
+        self.boxes = zone_boxes(floors)
+
+        self.index = {}                     # balise → ligne
+        self.keys = []                      # ligne → balise
+        self.xy = np.zeros((capacity, self.n_particles, 2))
+        self.floor = np.zeros((capacity, self.n_particles), dtype=np.int16)
+        self.weights = np.zeros((capacity, self.n_particles))
+
+    def __len__(self):
+        return len(self.index)
+
+    # === Gestion des balises ===
+
+    def _rows(self, beacons):
+        rows = np.empty(len(beacons), dtype=np.intp)
+        for i, beacon_name in enumerate(beacons):
+            row = self.index.get(beacon_name)
+            if row is None:
+                row = len(self.index)
+                if row >= len(self.xy):
+                    self.xy = np.concatenate([self.xy, np.zeros_like(self.xy)])
+                    self.floor = np.concatenate([self.floor, np.zeros_like(self.floor)])
+                    self.weights = np.concatenate([self.weights, np.zeros_like(self.weights)])
+                self.index[beacon_name] = row
+                self.keys.append(beacon_name)
+                # Nuage initial : uniforme sur tous les étages et leurs zones
+                floors = self.rng.integers(0, len(self.floors), self.n_particles)
+                self.floor[row] = floors
+                self.xy[row] = sample_in_zones(self.boxes, floors, self.rng)
+                self.weights[row] = 1.0 / self.n_particles
+            rows[i] = row
+        return rows
+
+    def retain(self, beacons):
+        """Oublie les balises absentes de `beacons` (la dernière ligne comble chaque trou)."""
+        keep = set(beacons)
+        for beacon_name in [key for key in self.keys if key not in keep]:
+            row = self.index.pop(beacon_name)
+            last_key = self.keys.pop()
+            if last_key != beacon_name:
+                last = len(self.keys)
+                self.xy[row], self.floor[row], self.weights[row] = self.xy[last], self.floor[last], self.weights[last]
+                self.keys[row] = last_key
+                self.index[last_key] = row
+
+    # === Filtre ===
+
+    def _inside(self, xy, floors):
+        """Particules situées dans une zone de leur étage."""
+        boxes = self.boxes[floors]                                   # (..., zones, 4)
+        x, y = xy[..., 0, None], xy[..., 1, None]
+        return ((x >= boxes[..., 0]) & (x <= boxes[..., 2]) &
+                (y >= boxes[..., 1]) & (y <= boxes[..., 3])).any(axis=-1)
+
+    def predict(self, rows, dt):
+        """Marche aléatoire, changement d'étage occasionnel, contrainte aux zones."""
+        xy, floors = self.xy[rows], self.floor[rows]
+        moved = xy + self.rng.normal(0.0, self.motion_std * np.sqrt(max(dt, 1e-3)), xy.shape)
+        moved_floors = floors
+        if len(self.floors) > 1 and self.floor_change_prob > 0:
+            jump = self.rng.random(floors.shape) < self.floor_change_prob
+            other = (floors + self.rng.integers(1, len(self.floors), floors.shape)) % len(self.floors)
+            moved_floors = np.where(jump, other, floors).astype(floors.dtype)
+        # Une particule qui sortirait des zones de son étage reste sur place
+        inside = self._inside(moved, moved_floors)
+        self.xy[rows] = np.where(inside[..., None], moved, xy)
+        self.floor[rows] = np.where(inside, moved_floors, floors)
+
+    def expected_rssi(self, xy, floors):
+        """RSSI attendu (..., gateways) : modèle de propagation, perte inter-étages, murs."""
+        points = np.concatenate([xy, np.full(xy.shape[:-1] + (1,), self.height)], axis=-1)
+        distances = np.linalg.norm(points[..., None, :] - self.gateway_xyz, axis=-1)
+        rssi = distance_to_rssi_array(distances)
+        rssi -= self.floor_loss_db * (floors[..., None] != self.gateway_floor)
+        if self.attenuation is not None:
+            flat_xy, flat_floors = xy.reshape(-1, 2), floors.ravel()
+            flat_rssi = rssi.reshape(-1, len(self.gateway_names))
+            column = {name: j for j, name in enumerate(self.gateway_names)}
+            for floor_idx, raster in enumerate(self.attenuation):
+                selected = np.flatnonzero(flat_floors == floor_idx)
+                if len(selected):
+                    columns = [column[name] for name in raster.gateway_names]
+                    flat_rssi[np.ix_(selected, columns)] -= raster.lookup(flat_xy[selected])
+        return rssi
+
+    def weigh(self, rows, observed):
+        """Vraisemblance gaussienne des RSSI observés (NaN : gateway non entendu)."""
+        expected = self.expected_rssi(self.xy[rows], self.floor[rows])    # (B, P, G)
+        heard = np.isfinite(observed)[:, None, :]
+        error = np.where(heard, (np.nan_to_num(observed)[:, None, :] - expected) / self.rssi_std, 0.0)
+        log_likelihood = -0.5 * (error ** 2).sum(axis=2)
+        log_weights = np.log(np.maximum(self.weights[rows], 1e-300)) + log_likelihood
+        log_weights -= log_weights.max(axis=1, keepdims=True)
+        weights = np.exp(log_weights)
+        self.weights[rows] = weights / weights.sum(axis=1, keepdims=True)
+
+    def resample(self, rows):
+        """Rééchantillonnage systématique des balises dont l'effectif utile est trop faible."""
+        weights = self.weights[rows]
+        effective = 1.0 / (weights ** 2).sum(axis=1)
+        rows = rows[effective < self.n_particles / 2]
+        if not len(rows):
+            return
+        n, p = len(rows), self.n_particles
+        # Une seule recherche pour toutes les balises : chaque ligne décalée de son numéro
+        cumulative = np.cumsum(self.weights[rows], axis=1)
+        cumulative /= cumulative[:, -1:]
+        cumulative += np.arange(n)[:, None]
+        cumulative[:, -1] = np.arange(1, n + 1)  # bornes exactes malgré les arrondis
+        positions = (self.rng.random((n, 1)) + np.arange(p)) / p + np.arange(n)[:, None]
+        picked = np.searchsorted(cumulative.ravel(), positions.ravel()).reshape(n, p) - np.arange(n)[:, None] * p
+        picked = np.clip(picked, 0, p - 1)
+        self.xy[rows] = np.take_along_axis(self.xy[rows], picked[..., None], axis=1)
+        self.floor[rows] = np.take_along_axis(self.floor[rows], picked, axis=1)
+        self.weights[rows] = 1.0 / p
+
+    def estimate(self, rows):
+        """Étage le plus probable, position moyenne sur cet étage et dispersion (m)."""
+        weights, floors, xy = self.weights[rows], self.floor[rows], self.xy[rows]
+        floor_weight = np.stack([(weights * (floors == f)).sum(axis=1) for f in range(len(self.floors))], axis=1)
+        best = floor_weight.argmax(axis=1)
+        on_floor = weights * (floors == best[:, None])
+        on_floor /= np.maximum(on_floor.sum(axis=1, keepdims=True), 1e-300)
+        mean = (on_floor[..., None] * xy).sum(axis=1)
+        spread = np.sqrt((on_floor * ((xy - mean[:, None, :]) ** 2).sum(axis=2)).sum(axis=1))
+        return best, mean, spread
+
+    def update(self, beacons, observed, dt):
+        """
+        Une itération pour les balises données : prédiction sur `dt` secondes,
+        pondération par les RSSI observés (B, gateways), rééchantillonnage.
+        Retourne (étages (B,), positions (B, 3), dispersions (B,)).
+        """
+        rows = self._rows(beacons)
+        observed = np.asarray(observed, dtype=float)
+        self.predict(rows, dt)
+        has_data = np.isfinite(observed).any(axis=1)
+        if has_data.any():
+            self.weigh(rows[has_data], observed[has_data])
+            self.resample(rows[has_data])
+        floors, mean, spread = self.estimate(rows)
+        positions = np.column_stack([mean, np.full(len(rows), self.height)])
+        return floors, positions, spread
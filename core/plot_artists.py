@@ -0,0 +1,101 @@
+import matplotlib.pyplot as plt
+
+# Couche de rendu des plots en direct : les artistes (marqueur par balise,
+# cercle et étiquette de distance par balise × gateway) sont créés une fois
+# puis mis à jour sur place. Ils sont "animés" : exclus du fond (image de la
+# carte, gateways, zones) que FuncAnimation(blit=True) met en cache, seuls
+# eux sont redessinés à chaque image. La légende est animée elle aussi (placée
+# dans l'axe, donc dans la zone restaurée par le blit) : elle n'est
+# reconstruite que lorsque l'ensemble des balises change, et le fond mis en
+# cache n'a jamais à être recapturé.
+
+
+class ArtistPool:
+    """Artistes réutilisés d'un axe : marqueurs, cercles de trilatération et étiquettes."""
+
+    def __init__(self, ax, fontsize=8, digits=2):
+        self.ax = ax
+        self.fontsize = fontsize
+        self.digits = digits
+        self.markers = {}           # balise → Line2D
+        self.circles = {}           # (balise, gateway) → (Circle, Text)
+        self.legend = None
+        self._legend_beacons = None
+        self._shown = set()         # cercles mis à jour pendant l'image
+        self._moved = set()         # marqueurs placés pendant l'image
+
+    def begin(self):
+        """Début d'une image : marqueurs et cercles non mis à jour d'ici `finish()` seront masqués"""
+        self._shown = set()
+        self._moved = set()
+
+    def marker(self, beacon, color):
+        """Marqueur de la balise (créé au premier appel, position vide)"""
+        point = self.markers.get(beacon)
+        if point is None:
+            point, = self.ax.plot([], [], 'o', color=color, label=f"{beacon}", markersize=8, animated=True)
+            self.markers[beacon] = point
+        return point
+
+    def move(self, beacon, color, x=None, y=None):
+        """Place le marqueur de la balise, ou le vide si `x` est None"""
+        self.marker(beacon, color).set_data([] if x is None else [x], [] if y is None else [y])
+        if x is not None:
+            self._moved.add(beacon)
+
+    def hide(self, beacon):
+        """Vide le marqueur de la balise s'il existe"""
+        point = self.markers.get(beacon)
+        if point is not None:
+            point.set_data([], [])
+        self._moved.discard(beacon)
+
+    def circle(self, beacon, gateway, center, radius, color, linestyle='--', alpha=0.4, linewidth=1.5,
+               text_alpha=None):
+        """Cercle de rayon `radius` autour du gateway et son étiquette de distance"""
+        key = (beacon, gateway)
+        pair = self.circles.get(key)
+        if pair is None:
+            circle = plt.Circle(center, radius, fill=False, animated=True)
+            self.ax.add_patch(circle)
+            # Découpée à l'axe : le blit ne restaure que la zone de l'axe
+            text = self.ax.text(0, 0, "", fontsize=self.fontsize, clip_on=True, animated=True)
+            pair = self.circles[key] = (circle, text)
+        circle, text = pair
+        circle.center = center
+        circle.set_radius(radius)
+        circle.set(edgecolor=color, linestyle=linestyle, alpha=alpha, linewidth=linewidth, visible=True)
+        text.set_position((center[0] + radius * 0.7, center[1] + radius * 0.7))
+        text.set(text=f"{radius:.{self.digits}f}m", color=color,
+                 alpha=alpha if text_alpha is None else text_alpha, visible=True)
+        self._shown.add(key)
+
+    def artists(self):
+        """Tous les artistes de l'axe à redessiner (retour de la fonction d'animation)"""
+        artists = list(self.markers.values())
+        for circle, text in self.circles.values():
+            artists += (circle, text)
+        if self.legend is not None:
+            artists.append(self.legend)
+        return artists
+
+    def finish(self):
+        """
+        Fin d'une image : vide les marqueurs des balises non placées (disparues
+        du moteur), masque les cercles non mis à jour et reconstruit la
+        légende si de nouvelles balises sont apparues. Retourne `artists()`.
+        """
+        for beacon, point in self.markers.items():
+            if beacon not in self._moved:
+                point.set_data([], [])
+        for key, (circle, text) in self.circles.items():
+            if key not in self._shown:
+                circle.set_visible(False)
+                text.set_visible(False)
+        beacons = tuple(self.markers)
+        if beacons != self._legend_beacons:
+            self._legend_beacons = beacons
+            self.legend = self.ax.legend(loc='upper right')
+            self.legend.set_animated(True)
+        return self.artists()
+
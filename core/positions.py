@@ -0,0 +1,154 @@
+import json
+import math
+import threading
+from collections import deque
+
+from core import config
+
+# Table des dernières positions, tenue en mémoire par le serveur à partir
+# d'un moteur de positionnement hébergé dans son processus : lecture O(1)
+# par balise pour la route /positions, et journal borné des changements pour
+# /positions/stream (Server-Sent Events). Chaque mise à jour qui modifie au
+# moins une balise (déplacement ≥ POSITIONS_MIN_MOVE, changement d'étage ou
+# de zone, apparition, disparition) incrémente la version de la table ; un
+# client qui connaît la version v ne reçoit que les balises modifiées depuis.
+# Une balise immobile garde sa position publiée, mais son horodatage et son
+# résidu sont rafraîchis à chaque mise à jour (sans changement de version).
+
+FIELDS = ("beacon", "floor", "x", "y", "z", "zone", "in_zone", "residual", "timestamp")
+
+
+def position_row(result):
+    """Champs publiés d'un résultat du moteur"""
+    return {field: result[field] for field in FIELDS}
+
+
+def moved(previous, row, min_move):
+    """Vrai si la position publiée doit être remplacée par `row`"""
+    if previous["floor"] != row["floor"] or previous["zone"] != row["zone"]:
+        return True
+    if (previous["x"] is None) != (row["x"] is None):
+        return True
+    if row["x"] is None:
+        return False
+    return math.dist((previous["x"], previous["y"], previous["z"]), (row["x"], row["y"], row["z"])) >= min_move
+
+
+class PositionTable:
+    """Dernière position de chaque balise et changements récents, partagés entre threads."""
+
+    def __init__(self, history=None, min_move=None):
+        self.min_move = config.POSITIONS_MIN_MOVE if min_move is None else min_move
+        self.latest = {}                                   # balise → position (remplacée, jamais modifiée)
+        self.version = 0
+        self.changes = deque(maxlen=history or config.POSITIONS_HISTORY)  # (version, {balise: position ou None})
+        self.listeners = []
+        self.condition = threading.Condition()
+
+    def get(self, beacon):
+        return self.latest.get(beacon)
+
+    def snapshot(self):
+        """(version, {balise: position})"""
+        with self.condition:
+            return self.version, dict(self.latest)
+
+    def update(self, positions):
+        """Abonné du moteur : enregistre les balises modifiées, disparues comprises."""
+        changed, refreshed = {}, {}
+        for beacon, result in positions.items():
+            row = position_row(result)
+            previous = self.latest.get(beacon)
+            if previous is None or moved(previous, row, self.min_move):
+                changed[beacon] = row
+            else:
+                # Balise immobile : position inchangée, mesure encore fraîche
+                refreshed[beacon] = {**previous, "residual": row["residual"], "timestamp": row["timestamp"]}
+        for beacon in self.latest.keys() - positions.keys():
+            changed[beacon] = None
+
+        if not changed and not refreshed:
+            return
+
+        with self.condition:
+            self.latest.update(refreshed)
+            if not changed:
+                return
+            self.version += 1
+            for beacon, row in changed.items():
+                if row is None:
+                    del self.latest[beacon]
+                else:
+                    self.latest[beacon] = row
+            self.changes.append((self.version, changed))
+            self.condition.notify_all()
+            version = self.version
+        for listener in self.listeners:
+            listener(version)
+
+    def changes_since(self, version):
+        """
+        (version courante, {balise: position ou None}) des balises modifiées
+        depuis `version`, ou None si ces changements ne sont plus dans le
+        journal (le client doit repartir d'un instantané).
+        """
+        with self.condition:
+            if version == self.version:
+                return self.version, {}
+            # Version inconnue (autre lancement du serveur) ou trop ancienne
+            if version > self.version or not self.changes or self.changes[0][0] > version + 1:
+                return None
+            merged = {}
+            for change_version, changed in self.changes:
+                if change_version > version:
+                    merged.update(changed)
+            return self.version, merged
+
+    def wait(self, version, timeout):
+        """Attend une version > `version` (ou l'expiration). Retourne la version courante."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    def subscribe(self, callback):
+        """Appelle `callback(version)` après chaque changement (depuis le thread du moteur)"""
+        self.listeners.append(callback)
+
+
+def sse_event(event, version, positions):
+    """Événement Server-Sent Events : `snapshot` (toutes les balises) ou `delta` (balises modifiées)"""
+    data = json.dumps({"version": version, "positions": positions})
+    return f"event: {event}\nid: {version}\ndata: {data}\n\n"
+
+
+SSE_KEEPALIVE = ": keepalive\n\n"
+
+
+def start_stream(table, last_event_id=None):
+    """
+    Premier événement d'un flux : reprise après `Last-Event-ID` si les
+    changements manqués sont encore connus, sinon instantané complet.
+    Retourne (événement, version).
+    """
+    if last_event_id is not None:
+        try:
+            since = table.changes_since(int(last_event_id))
+        except ValueError:
+            since = None
+        if since is not None:
+            version, changed = since
+            return (sse_event("delta", version, changed) if changed else ""), version
+    version, latest = table.snapshot()
+    return sse_event("snapshot", version, latest), version
+
+
+def next_event(table, version):
+    """Événement suivant d'un flux à la version `version`. Retourne (événement, version)."""
+    since = table.changes_since(version)
+    if since is None:
+        version, latest = table.snapshot()
+        return sse_event("snapshot", version, latest), version
+    new_version, changed = since
+    if not changed:
+        return "", version
+    return sse_event("delta", new_version, changed), new_version
@@ -0,0 +1,184 @@
+import ipaddress
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from core import config
+
+# Profilage à la demande d'un processus en cours d'exécution (serveur, plot
+# ou moteur), sans redémarrage sous cProfile : un thread échantillonne les
+# piles de tous les threads (`sys._current_frames()`) pendant une durée
+# bornée, et tracemalloc enregistre les allocations de la session.
+#
+# Fichiers écrits dans PROFILE_DIR, préfixés par le rôle, le PID et l'heure :
+#   .pstats      profil (python -m pstats, snakeviz...) reconstruit depuis les échantillons
+#   .collapsed   piles repliées (flamegraph.pl, speedscope, inferno...)
+#   .tracemalloc instantané (tracemalloc.Snapshot.load) + top des allocations en .txt
+#
+# Les durées sont en temps mural : un thread bloqué (attente réseau, sleep)
+# compte autant qu'un thread qui calcule. Déclenchement : route
+# /debug/profile du serveur (localhost uniquement) ou SIGUSR1 pour le
+# processus de plot/moteur lancé par main.py.
+
+_session = None
+_lock = threading.Lock()
+
+
+def code_key(code):
+    """Clé pstats d'une fonction : (fichier, première ligne, nom)"""
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def code_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SampledStats:
+    """Échantillons de piles présentés comme un profil pstats (`pstats.Stats(SampledStats(...))`)."""
+
+    def __init__(self, stacks, period):
+        self.stacks = stacks        # {(thread, (code racine, ..., code feuille)): échantillons}
+        self.period = period        # durée (s) représentée par un échantillon
+        self.stats = {}
+
+    def create_stats(self):
+        own, total, calls, edges = Counter(), Counter(), Counter(), {}
+        for (_, stack), count in self.stacks.items():
+            if not stack:
+                continue
+            keys = [code_key(code) for code in stack]
+            own[keys[-1]] += count
+            # Une fonction récursive n'est comptée qu'une fois par échantillon
+            for key in set(keys):
+                total[key] += count
+                calls[key] += count
+            for caller, callee in set(zip(keys, keys[1:])):
+                edge = edges.setdefault(callee, {}).setdefault(caller, [0, 0.0, 0.0])
+                edge[0] += count
+                edge[2] += count * self.period
+                if callee == keys[-1]:
+                    edge[1] += count * self.period
+        self.stats = {
+            key: (calls[key], calls[key], own[key] * self.period, total[key] * self.period,
+                  {caller: (n, n, tt, ct) for caller, (n, tt, ct) in edges.get(key, {}).items()})
+            for key in total
+        }
+
+
+class ProfileSession:
+    """Session de profilage bornée dans le temps, exécutée dans son propre thread."""
+
+    def __init__(self, role, duration=None, interval=None, directory=None, frames=None):
+        self.role = role
+        self.duration = min(duration or config.PROFILE_DURATION, config.PROFILE_MAX_DURATION)
+        self.interval = interval or config.PROFILE_SAMPLE_INTERVAL
+        self.directory = directory or config.PROFILE_DIR
+        self.frames = frames or config.PROFILE_TRACEMALLOC_FRAMES
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.base = os.path.join(self.directory, f"{role}-{os.getpid()}-{stamp}")
+        self.stacks = Counter()
+        self.samples = 0
+        self._thread = None
+
+    @property
+    def files(self):
+        return [self.base + suffix for suffix in (".pstats", ".collapsed", ".tracemalloc", "-memory.txt")]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def sample(self, own_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+        self.samples += 1
+
+    def run(self):
+        global _session
+        traced_here = not tracemalloc.is_tracing()
+        if traced_here:
+            tracemalloc.start(self.frames)
+        print(f"[PROFILE] Session de {self.duration:g} s ({self.role}, PID {os.getpid()})")
+        try:
+            own_ident = threading.get_ident()
+            started = time.perf_counter()
+            deadline = started + self.duration
+            while time.perf_counter() < deadline:
+                self.sample(own_ident)
+                time.sleep(self.interval)
+            elapsed = time.perf_counter() - started
+            memory = tracemalloc.take_snapshot()
+            self.write(elapsed, memory)
+            print(f"[PROFILE] ✅ {self.samples} échantillons → {self.base}.*")
+        except Exception as e:
+            print(f"[PROFILE] ❌ Erreur de profilage : {e}")
+        finally:
+            if traced_here:
+                tracemalloc.stop()
+            with _lock:
+                _session = None
+
+    def write(self, elapsed, memory):
+        import pstats
+        os.makedirs(self.directory, exist_ok=True)
+        period = elapsed / max(self.samples, 1)
+        pstats.Stats(SampledStats(self.stacks, period)).dump_stats(self.base + ".pstats")
+
+        with open(self.base + ".collapsed", "w") as f:
+            for (thread, stack), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(";".join([thread.replace(";", ":")] + [code_label(code) for code in stack]) + f" {count}\n")
+
+        # Allocations du profileur lui-même exclues
+        memory = memory.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+        memory.dump(self.base + ".tracemalloc")
+        top = memory.statistics("lineno")
+        with open(self.base + "-memory.txt", "w") as f:
+            f.write(f"# {sum(stat.size for stat in top) / 1024:.1f} Kio alloués pendant la session "
+                    f"et encore vivants, par ligne\n")
+            for stat in top[:config.PROFILE_MEMORY_TOP]:
+                f.write(f"{stat}\n")
+
+
+def start_session(role, duration=None):
+    """Démarre une session si aucune n'est en cours. Retourne la session ou None."""
+    global _session
+    with _lock:
+        if _session is not None:
+            return None
+        session = _session = ProfileSession(role, duration)
+    return session.start()
+
+
+def is_local(address):
+    """Adresse de boucle locale (127.0.0.0/8, ::1) ?"""
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def install_signal_handler(role):
+    """SIGUSR1 → session de profilage (à appeler depuis le thread principal)."""
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: start_session(role))
+    print(f"[PROFILE] Profilage à la demande : kill -USR1 {os.getpid()}")
+    return True
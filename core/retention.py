@@ -0,0 +1,229 @@
+import calendar
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from core import config
+from core.storage import INDEX_SUFFIX, SEGMENT_SUFFIX, list_segments
+
+# Rétention de l'historique : les mesures brutes ne restent sur disque que
+# RETENTION_RAW_HORIZON secondes. Les segments du journal plus anciens sont
+# compactés en agrégats par seconde et par minute (nombre, min, max, moyenne,
+# médiane du RSSI par balise × gateway) puis supprimés, de même que les vieux
+# segments des partitions. Les agrégats sont rangés dans un fichier par heure
+# (secondes) ou par jour (minutes), effacé une fois son horizon dépassé.
+# Mémoire et disque restent ainsi constants sur un déploiement de plusieurs
+# semaines.
+
+RESOLUTIONS = {
+    # nom : (pas en secondes, format de la période d'un fichier, durée de cette période)
+    "second": (1, "%Y%m%d%H", 3600),
+    "minute": (60, "%Y%m%d", 86400),
+}
+
+
+def aggregate(records, step):
+    """
+    Agrège des mesures par (balise, gateway, intervalle de `step` secondes).
+    Retourne une liste de dicts {t, beacon, source, count, min, max, mean, median}.
+    """
+    keys, key_index = [], {}
+    k, t, v = [], [], []
+    for record in records:
+        try:
+            key = (record["beacon"], record["source"])
+            ts, rssi = float(record["ts"]), float(record["rssi"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if key not in key_index:
+            key_index[key] = len(keys)
+            keys.append(key)
+        k.append(key_index[key])
+        t.append(ts)
+        v.append(rssi)
+    if not v:
+        return []
+
+    k = np.asarray(k)
+    t = np.floor(np.asarray(t) / step) * step
+    v = np.asarray(v)
+    order = np.lexsort((v, t, k))  # par flux, puis intervalle, puis RSSI croissant
+    k, t, v = k[order], t[order], v[order]
+
+    starts = np.flatnonzero(np.r_[True, (np.diff(k) != 0) | (np.diff(t) != 0)])
+    counts = np.diff(np.r_[starts, len(v)])
+    ends = starts + counts - 1
+    means = np.add.reduceat(v, starts) / counts
+    medians = (v[starts + (counts - 1) // 2] + v[starts + counts // 2]) / 2
+
+    return [
+        {
+            "t": bucket, "beacon": keys[key][0], "source": keys[key][1],
+            "count": count, "min": low, "max": high, "mean": round(mean, 2), "median": median,
+        }
+        for bucket, key, count, low, high, mean, median in zip(
+            t[starts].tolist(), k[starts].tolist(), counts.tolist(),
+            v[starts].tolist(), v[ends].tolist(), means.tolist(), medians.tolist(),
+        )
+    ]
+
+
+def aggregate_path(resolution, ts, directory=None):
+    """Fichier d'agrégats contenant l'instant `ts` pour une résolution."""
+    _, period_format, _ = RESOLUTIONS[resolution]
+    period = time.strftime(period_format, time.gmtime(ts))
+    return os.path.join(directory or config.AGGREGATES_DIR, f"{resolution}-{period}{SEGMENT_SUFFIX}")
+
+
+def write_aggregates(resolution, rows, directory=None):
+    """Ajoute des agrégats à la fin des fichiers de leurs périodes."""
+    by_path = {}
+    for row in rows:
+        by_path.setdefault(aggregate_path(resolution, row["t"], directory), []).append(row)
+    for path, path_rows in by_path.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in path_rows).encode("utf-8"))
+
+
+def read_aggregates(resolution="minute", since=None, until=None, beacon=None, directory=None):
+    """
+    Agrégats d'une résolution entre `since` et `until` (epoch), triés par
+    temps. Un intervalle coupé par une limite de segment apparaît en deux
+    lignes à la compaction : elles sont fusionnées ici (médiane alors
+    approchée par la moyenne des médianes pondérée par le nombre de mesures).
+    """
+    merged = {}
+    for path in list_segments(directory or config.AGGREGATES_DIR, resolution):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if (since is not None and row["t"] < since) or (until is not None and row["t"] > until):
+                    continue
+                if beacon is not None and row["beacon"] != beacon:
+                    continue
+                key = (row["t"], row["beacon"], row["source"])
+                previous = merged.get(key)
+                if previous is None:
+                    merged[key] = row
+                    continue
+                count = previous["count"] + row["count"]
+                previous["mean"] = round((previous["mean"] * previous["count"] + row["mean"] * row["count"]) / count, 2)
+                previous["median"] = (previous["median"] * previous["count"] + row["median"] * row["count"]) / count
+                previous["min"] = min(previous["min"], row["min"])
+                previous["max"] = max(previous["max"], row["max"])
+                previous["count"] = count
+    return [merged[key] for key in sorted(merged)]
+
+
+def _read_records(path):
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # ligne tronquée (arrêt brutal)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+class RetentionManager:
+    """Passes périodiques de compaction et de purge, dans un thread du serveur."""
+
+    def __init__(self, interval=None, log_dir=None, beacons_dir=None, aggregates_dir=None):
+        self.interval = interval or config.RETENTION_INTERVAL
+        self.log_dir = log_dir or config.LOG_DIR
+        self.beacons_dir = beacons_dir or config.BEACONS_DIR
+        self.aggregates_dir = aggregates_dir or config.AGGREGATES_DIR
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[RETENTION] ❌ Erreur pendant la compaction : {e}")
+
+    def run_once(self, now=None):
+        """Une passe complète. Retourne (segments compactés, fichiers supprimés)."""
+        now = time.time() if now is None else now
+        compacted = self.compact_log(now - config.RETENTION_RAW_HORIZON)
+        removed = self.prune_partitions(now - config.RETENTION_RAW_HORIZON)
+        removed += self.prune_aggregates("second", now - config.RETENTION_SECOND_HORIZON)
+        removed += self.prune_aggregates("minute", now - config.RETENTION_MINUTE_HORIZON)
+        if compacted or removed:
+            print(f"[RETENTION] {compacted} segment(s) compacté(s), {removed} fichier(s) supprimé(s)")
+        return compacted, removed
+
+    def compact_log(self, cutoff):
+        """Agrège puis supprime les segments du journal non modifiés depuis `cutoff`."""
+        compacted = 0
+        for path in list_segments(self.log_dir):
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                records = _read_records(path)
+            except OSError:
+                continue
+            for resolution, (step, _, _) in RESOLUTIONS.items():
+                write_aggregates(resolution, aggregate(records, step), self.aggregates_dir)
+            os.remove(path)
+            compacted += 1
+        return compacted
+
+    def prune_partitions(self, cutoff):
+        """Supprime les segments (et index) de partition non modifiés depuis `cutoff`."""
+        removed = 0
+        if not os.path.isdir(self.beacons_dir):
+            return removed
+        for name in os.listdir(self.beacons_dir):
+            partition = os.path.join(self.beacons_dir, name)
+            for path in list_segments(partition):
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                    os.remove(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+                except OSError:
+                    continue
+            try:
+                os.rmdir(partition)  # balise disparue : dossier vide
+            except OSError:
+                pass
+        return removed
+
+    def prune_aggregates(self, resolution, cutoff):
+        """Supprime les fichiers d'agrégats dont toute la période précède `cutoff`."""
+        _, period_format, period_length = RESOLUTIONS[resolution]
+        removed = 0
+        for path in list_segments(self.aggregates_dir, resolution):
+            period = os.path.basename(path)[len(resolution) + 1:-len(SEGMENT_SUFFIX)]
+            try:
+                start = calendar.timegm(time.strptime(period, period_format))
+            except ValueError:
+                continue
+            if start + period_length < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
@@ -1,12 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime
 import logging
 import json
 import os
-from collections import defaultdict
-from core.config import DATA_DIR, DATA_FILE  # 🔁 On récupère depuis config
+import signal
+import sys
+import threading
+import atexit
+import numpy as np
+from core import config, metrics, profiler
+from core.config import DATA_DIR  # 🔁 On récupère depuis config
+from core.storage import RecordLog, BeaconStore
+from core.filters import RunningMedianBank
+from core.shared_ring import MeasurementRing
 import socket
 
+try:
+    import msgpack  # optionnel : payloads MessagePack
+except ImportError:
+    msgpack = None
+
 # === Setup ===
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
@@ -14,9 +27,20 @@ app = Flask(__name__)
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
-rssi_data = []
-sliding_windows = defaultdict(list)
-WINDOW_SIZE = 5
+record_log = None
+measurement_ring = None
+shard_pool = None       # ShardPool en mode multi-processus (INGEST_WORKERS > 1)
+position_table = None   # PositionTable si le serveur héberge le moteur (SERVER_POSITIONS)
+ring_checked = False
+# Médianes glissantes des relevés Minew, par MAC (flux inactifs évincés)
+sliding_medians = RunningMedianBank(
+    window=config.SLIDING_MEDIAN_WINDOW,
+    ttl=config.SLIDING_MEDIAN_TTL,
+    max_streams=config.SLIDING_MEDIAN_MAX_STREAMS,
+)
+# Mode mono-processus : vérification de place, médianes glissantes et mise en
+# file d'un lot atomiques, pour qu'un lot refusé n'entre pas dans les médianes
+submit_lock = threading.Lock()
 
 BEACON_ALIASES = {
     "C300003731FD": "balise_1",
@@ -25,69 +49,124 @@ BEACON_ALIASES = {
     "C300003731DD": "balise_5"
 }
 
-def save_to_beacon_file(entry):
-    """Sauvegarder une entrée dans le fichier spécifique du beacon"""
-    beacon_name = entry["beacon"]
-    beacon_file = os.path.join(DATA_DIR, f"{beacon_name}.json")
-    
+def get_record_log():
+    """Journal global des mesures (démarré au premier appel dans le processus serveur)"""
+    global record_log
+    if record_log is None:
+        record_log = RecordLog(sinks=[BeaconStore()]).start()
+        atexit.register(record_log.close)
+    return record_log
+
+def get_measurement_ring():
+    """Tampon partagé avec les processus d'affichage (None s'il n'a pas été créé par main.py)"""
+    global measurement_ring, ring_checked
+    if not ring_checked:
+        ring_checked = True
+        measurement_ring = MeasurementRing.attach()
+        if measurement_ring is None:
+            print("[WARNING] Mémoire partagée indisponible : les lecteurs passeront par le journal")
+    return measurement_ring
+
+def compute_sliding_median(mac, new_rssi):
+    return sliding_medians.update(mac, new_rssi)
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def decode_body(raw, mimetype):
+    """
+    Décode le corps d'une requête : JSON (défaut), NDJSON (un relevé par
+    ligne) ou MessagePack. Lève ValueError si le corps est illisible.
+    """
+    if mimetype in NDJSON_TYPES:
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    if mimetype in MSGPACK_TYPES:
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+def _int_values(values):
+    """Conversion vectorisée en entiers ; les valeurs invalides sont masquées (None)."""
     try:
-        # Charger les données existantes
-        if os.path.exists(beacon_file):
-            with open(beacon_file, "r") as f:
-                beacon_data = json.load(f)
-        else:
-            beacon_data = []
-        
-        # Ajouter la nouvelle entrée
-        beacon_data.append(entry)
-        
-        # Sauvegarder
-        with open(beacon_file, "w") as f:
-            json.dump(beacon_data, f, indent=2)
-            
-    except Exception as e:
-        print(f"[ERREUR] Impossible d'écrire dans {beacon_file} : {e}")
-
-# === Chargement initial du fichier de données
-if os.path.exists(DATA_FILE) and os.path.getsize(DATA_FILE) > 2:
+        array = np.asarray(values, dtype=float)
+    except (ValueError, TypeError):
+        # Au moins une valeur non numérique : conversion élément par élément
+        array = np.array([_to_float(v) for v in values], dtype=float)
+    valid = np.isfinite(array)
+    return np.where(valid, array, 0).astype(int).tolist(), valid.tolist()
+
+def _to_float(value):
     try:
-        with open(DATA_FILE, "r") as f:
-            rssi_data = json.load(f)
-    except Exception as e:
-        print(f"[WARN] Le fichier {DATA_FILE} est corrompu. Réinitialisation. ({e})")
-        rssi_data = []
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
 
-def compute_sliding_median(mac, new_rssi):
-    window = sliding_windows[mac]
-    window.append(new_rssi)
-    if len(window) > WINDOW_SIZE:
-        window.pop(0)
-    sorted_vals = sorted(window)
-    n = len(sorted_vals)
-    return sorted_vals[n // 2] if n % 2 == 1 else (sorted_vals[n // 2 - 1] + sorted_vals[n // 2]) / 2
+def beacon_alias(beacon_name):
+    """Alias d'un nom de balise reçu (chaîne non vide), ou None si le nom est invalide"""
+    if not isinstance(beacon_name, str) or not beacon_name:
+        return None
+    return BEACON_ALIASES.get(beacon_name.upper(), beacon_name)
 
-@app.route('/collect_gateway_info', methods=['POST'])
-def collect_data():
-    global rssi_data
-    data = request.get_json()
+def parse_readings_batch(readings, gateway_id=None, default_time=None):
+    """
+    Convertit un lot de relevés ESP32 ({beacon_name, rssi, median, timestamp,
+    gateway_id optionnel}) en mesures. Les relevés invalides sont ignorés.
+    """
+    readings = [r for r in readings if isinstance(r, dict)]
+    if not readings:
+        return []
+    default_time = default_time or datetime.utcnow().isoformat()
+    rssi, rssi_ok = _int_values([r.get("rssi") for r in readings])
+    median, median_ok = _int_values([r.get("median", r.get("rssi")) for r in readings])
 
-    if not data:
-        print("[ERREUR] JSON non reçu ou invalide")
-        return jsonify({'error': 'No JSON received'}), 400
+    entries = []
+    for r, rssi_value, median_value, ok_rssi, ok_median in zip(readings, rssi, median, rssi_ok, median_ok):
+        alias = beacon_alias(r.get("beacon_name"))
+        source = r.get("gateway_id", gateway_id)
+        if not (ok_rssi and ok_median and alias and source):
+            continue
+        entries.append({
+            "time": r.get("timestamp", default_time),
+            "beacon": alias,
+            "rssi": rssi_value,
+            "median": median_value,
+            "source": source
+        })
+    return entries
 
+def parse_payload(data, verbose=True, sliding_median=True):
+    """
+    Transforme un payload décodé en liste de mesures. Formats acceptés :
+      - ESP32, un relevé : {"gateway_id", "beacon_name", "rssi", "median", "timestamp"}
+      - ESP32, par lot : {"gateway_id", "readings": [{"beacon_name", "rssi", "median", "timestamp"}, ...]}
+      - Minew G1 : [{"type": "iBeacon", "mac", "rssi"}, ...]
+      - NDJSON : une ligne par relevé ESP32 (décodée en liste)
+    Lève ValueError pour un relevé unique invalide. `verbose=False` supprime
+    le log par relevé (frontal asyncio : pas d'écriture console par requête).
+    Avec `sliding_median=False`, la médiane glissante des relevés Minew est
+    laissée à None (avec leur "mac") pour n'être calculée qu'une fois le lot
+    accepté : par `submit_entries`, ou par le shard de la balise (voir
+    apply_sliding_medians).
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
     entries_to_add = []
 
+    # === Cas ESP32 → lot de relevés d'un même gateway
+    if isinstance(data, dict) and isinstance(data.get("readings"), list):
+        entries_to_add = parse_readings_batch(data["readings"], data.get("gateway_id"))
+        log(f"[LOT] {data.get('gateway_id')} → {len(entries_to_add)}/{len(data['readings'])} relevés acceptés")
+
     # === Cas ESP32 → JSON sous forme d'objet
-    if isinstance(data, dict) and "gateway_id" in data:
+    elif isinstance(data, dict) and "gateway_id" in data:
         gateway_id = data.get('gateway_id')
-        beacon_name = data.get('beacon_name')
+        alias = beacon_alias(data.get('beacon_name'))
+        if alias is None:
+            raise ValueError('missing beacon_name')
         try:
             rssi = int(data.get('rssi'))
             median = int(data.get('median'))
         except (ValueError, TypeError):
-            return jsonify({'error': 'RSSI/median must be int'}), 400
+            raise ValueError('RSSI/median must be int')
 
-        alias = BEACON_ALIASES.get(beacon_name.upper(), beacon_name)
         timestamp = data.get('timestamp', datetime.utcnow().isoformat())
         entry = {
             "time": timestamp,
@@ -97,14 +176,12 @@ def collect_data():
             "source": gateway_id
         }
         entries_to_add.append(entry)
-        
-        # Sauvegarder dans le fichier individuel du beacon
-        save_to_beacon_file(entry)
 
-        print(f"[{timestamp}] {gateway_id} → {alias} | RSSI: {rssi} | Médiane: {median}")
+        log(f"[{timestamp}] {gateway_id} → {alias} | RSSI: {rssi} | Médiane: {median}")
 
-    # === Cas MINEW G1 → JSON sous forme de liste
+    # === Cas MINEW G1 → JSON sous forme de liste (ou NDJSON de relevés ESP32)
     elif isinstance(data, list):
+        esp32_readings = []
         for item in data:
             if isinstance(item, dict) and item.get("type") == "iBeacon":
                 mac = item.get("mac")
@@ -112,36 +189,211 @@ def collect_data():
                     rssi = int(item.get("rssi"))
                 except (ValueError, TypeError):
                     continue
-                if mac:
-                    alias = BEACON_ALIASES.get(mac.upper(), mac)
-                    median = compute_sliding_median(mac, rssi)
+                alias = beacon_alias(mac)
+                if alias:
                     entry = {
                         "time": datetime.utcnow().isoformat(),
                         "beacon": alias,
                         "rssi": rssi,
-                        "median": median,
+                        "median": None,
                         "source": "minew"
                     }
                     entries_to_add.append(entry)
-                    
-                    # Sauvegarder dans le fichier individuel du beacon
-                    save_to_beacon_file(entry)
-                    
-                    print(f"[Minew G1] → {alias} | RSSI: {rssi} | Médiane glissante: {median:.1f}")
-
-    # === Sauvegarde dans le fichier global (optionnel, peut être supprimé)
-    rssi_data.extend(entries_to_add)
+
+                    if sliding_median:
+                        entry["median"] = median = compute_sliding_median(mac, rssi)
+                        log(f"[Minew G1] → {alias} | RSSI: {rssi} | Médiane glissante: {median:.1f}")
+                    else:
+                        entry["mac"] = mac
+                        log(f"[Minew G1] → {alias} | RSSI: {rssi}")
+            elif isinstance(item, dict) and "gateway_id" in item:
+                esp32_readings.append(item)
+
+        if esp32_readings:
+            batch = parse_readings_batch(esp32_readings)
+            entries_to_add.extend(batch)
+            log(f"[LOT] NDJSON → {len(batch)}/{len(esp32_readings)} relevés acceptés")
+
+    return entries_to_add
+
+def apply_sliding_medians(entries):
+    """Complète la médiane glissante des relevés Minew laissée à None par parse_payload"""
+    for entry in entries:
+        if entry.get("median") is None:
+            entry["median"] = compute_sliding_median(entry.pop("mac", entry["beacon"]), entry["rssi"])
+    return entries
+
+def store_entries(entries_to_add):
+    """
+    Persiste (écriture différée) et publie des mesures.
+    Retourne False si la file d'écriture est pleine.
+    """
+    with metrics.timed("persist"):
+        # === Ajout au journal global et aux partitions par balise (écriture différée)
+        accepted = get_record_log().extend(entries_to_add)
+        if accepted < len(entries_to_add):
+            print(f"[ERREUR] File d'écriture pleine : lot de {len(entries_to_add)} mesure(s) rejeté")
+            return False
+
+        # === Publication immédiate pour les processus d'affichage
+        ring = get_measurement_ring()
+        if ring is not None:
+            ring.write(entries_to_add)
+    return True
+
+def submit_entries(entries_to_add):
+    """
+    Remet des mesures validées au stockage : aux shards en mode multi-processus,
+    sinon au journal local. Retourne 200, 429 (file pleine) ou 503.
+    """
+    metrics.count_readings(entries_to_add)
+    if shard_pool is not None:
+        return 200 if shard_pool.dispatch(entries_to_add) else 429
+
+    with submit_lock:
+        # Contre-pression : refuser le lot entier plutôt que de l'accepter en partie
+        if get_record_log().free_slots() < len(entries_to_add):
+            return 429
+        # Lot accepté : médianes glissantes Minew, puis mise en file (place réservée ci-dessus)
+        apply_sliding_medians(entries_to_add)
+        return 200 if store_entries(entries_to_add) else 503
+
+def queued_entries():
+    """Mesures (ou lots, en mode multi-processus) en attente de stockage"""
+    if shard_pool is not None:
+        return shard_pool.qsize()
+    return get_record_log().qsize()
+
+def ingest_payload(raw, mimetype, verbose=True):
+    """
+    Traitement complet d'un corps de requête /collect_gateway_info, commun aux
+    frontaux Flask et asyncio. Retourne (code HTTP, corps de réponse).
+    """
+    if mimetype in MSGPACK_TYPES and msgpack is None:
+        print("[ERREUR] Payload MessagePack reçu mais le module msgpack n'est pas installé")
+        return 415, {'error': 'MessagePack not supported'}
+
+    with metrics.timed("parse"):
+        try:
+            data = decode_body(raw, mimetype)
+        except ValueError as e:
+            print(f"[ERREUR] Corps de requête illisible : {e}")
+            return 400, {'error': 'No JSON received'}
+
+        if not data:
+            print("[ERREUR] JSON non reçu ou invalide")
+            return 400, {'error': 'No JSON received'}
+
+        try:
+            entries_to_add = parse_payload(data, verbose=verbose, sliding_median=False)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+    status = submit_entries(entries_to_add)
+    if status == 429:
+        return 429, {'error': 'Ingestion queue full, retry later'}
+    if status == 503:
+        return 503, {'error': 'Storage queue full'}
+
+    return 200, {'status': 'ok', 'received': len(entries_to_add)}
+
+@app.route('/collect_gateway_info', methods=['POST'])
+def collect_data():
+    status, body = ingest_payload(request.get_data(), request.mimetype)
+    metrics.inc("requests_total", status=status)
+    response = jsonify(body)
+    if status in (429, 503):
+        response.headers['Retry-After'] = '1'
+    return response, status
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Métriques de tous les processus, format texte de Prometheus"""
+    return metrics.exposition(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+def profile_request(remote_addr, seconds=None):
+    """
+    Session de profilage du processus serveur (localhost uniquement).
+    Retourne (code HTTP, corps) : 202 avec les fichiers qui seront écrits,
+    403 hors localhost, 400 durée invalide, 409 session déjà en cours.
+    """
+    if not profiler.is_local(remote_addr):
+        return 403, {'error': 'Forbidden'}
     try:
-        with open(DATA_FILE, "w") as f:
-            json.dump(rssi_data, f, indent=2)
-    except Exception as e:
-        print(f"[ERREUR] Impossible d'écrire dans {DATA_FILE} : {e}")
+        duration = float(seconds) if seconds else None
+    except ValueError:
+        duration = -1
+    if duration is not None and not 0 < duration <= config.PROFILE_MAX_DURATION:
+        return 400, {'error': f'Invalid duration (0 < seconds <= {config.PROFILE_MAX_DURATION:g})'}
+    session = profiler.start_session("server", duration)
+    if session is None:
+        return 409, {'error': 'Profiling already running'}
+    return 202, {'seconds': session.duration, 'files': session.files}
+
+def start_positions():
+    """Moteur de positionnement dans le processus serveur, publié dans `position_table`."""
+    global position_table
+    from core.engine import PositioningEngine
+    from core.positions import PositionTable
+    if not config.load_config_from_file():
+        print("[ERREUR] Configuration indisponible : routes /positions désactivées")
+        return None
+    position_table = PositionTable()
+    engine = PositioningEngine()
+    engine.subscribe(position_table.update)
+    return engine.start()
+
+def positions_request(beacon=None):
+    """Dernières positions (toutes, ou celle de `beacon`). Retourne (code HTTP, corps)."""
+    if position_table is None:
+        return 503, {'error': 'Positions unavailable (SERVER_POSITIONS disabled)'}
+    if beacon is not None:
+        row = position_table.get(beacon)
+        return (200, row) if row is not None else (404, {'error': f'Unknown beacon {beacon}'})
+    version, latest = position_table.snapshot()
+    return 200, {'version': version, 'positions': latest}
+
+@app.route('/positions', methods=['GET'])
+def positions_route():
+    """Instantané des dernières positions : GET /positions[?beacon=balise_1]"""
+    status, body = positions_request(request.args.get('beacon'))
+    return jsonify(body), status
+
+@app.route('/positions/stream', methods=['GET'])
+def positions_stream_route():
+    """Flux SSE : instantané puis changements (événements `snapshot` et `delta`)"""
+    if position_table is None:
+        status, body = positions_request()
+        return jsonify(body), status
+    from core import positions
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def generate():
+        event, version = positions.start_stream(position_table, last_event_id)
+        yield event or positions.SSE_KEEPALIVE
+        while True:
+            position_table.wait(version, config.POSITIONS_KEEPALIVE)
+            event, version = positions.next_event(position_table, version)
+            yield event or positions.SSE_KEEPALIVE
 
-    return jsonify({'status': 'ok', 'received': len(entries_to_add)}), 200
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
+@app.route('/debug/profile', methods=['POST'])
+def profile_route():
+    """Profilage à la demande : POST /debug/profile?seconds=10 depuis localhost"""
+    status, body = profile_request(request.remote_addr, request.args.get('seconds'))
+    return jsonify(body), status
 
 
-def start_server():
+def start_server(backend=None, udp=None, workers=None, positions=None):
+    global shard_pool
+    backend = backend or config.SERVER_BACKEND
+    udp = config.UDP_ENABLED if udp is None else udp
+    workers = workers or config.INGEST_WORKERS
+    positions = config.SERVER_POSITIONS if positions is None else positions
+    host, port = config.SERVER_HOST, config.SERVER_PORT
+
     # Obtenir l'adresse IP locale réelle du serveur
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -151,10 +403,41 @@ def start_server():
     except Exception:
         local_ip = "127.0.0.1"
 
-    print(f"[INFO] IP locale du serveur Flask : {local_ip}")
-    print(f"[INFO] Flask démarre sur http://0.0.0.0:5001/ (accessible à http://{local_ip}:5001/)")
+    print(f"[INFO] IP locale du serveur : {local_ip}")
+    # SIGTERM (Process.terminate) → sortie propre pour vider le journal via atexit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if workers > 1:
+        # Les workers possèdent les médianes, le journal et les partitions de leurs balises
+        from core.sharding import ShardPool
+        shard_pool = ShardPool(workers).start()
+        atexit.register(shard_pool.close)
+    else:
+        get_record_log()
+        get_measurement_ring()
+    if metrics.enable("server"):
+        metrics.gauge("queue_depth", queued_entries)
+        print(f"[INFO] Métriques activées : http://{local_ip}:{port}/metrics")
+    if positions and start_positions() is not None:
+        print(f"[INFO] Positions en direct : http://{local_ip}:{port}/positions et /positions/stream (SSE)")
+    print(f"[INFO] Profilage à la demande : curl -X POST 'http://127.0.0.1:{port}/debug/profile?seconds=10'")
+
+    # Compaction / purge de l'historique (disque constant sur la durée)
+    from core.retention import RetentionManager
+    RetentionManager().start()
+
+    if udp:
+        from core.udp_listener import UdpListener
+        UdpListener(host).start()
+
+    if backend == "asyncio":
+        from core import async_server
+        print(f"[INFO] Frontal asyncio démarre sur http://{host}:{port}/ (accessible à http://{local_ip}:{port}/)")
+        async_server.run(host, port)
+        return
+
+    print(f"[INFO] Flask démarre sur http://{host}:{port}/ (accessible à http://{local_ip}:{port}/)")
     
-    app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False)
+    app.run(host=host, port=port, debug=False, use_reloader=False)
 
 if __name__ == '__main__':
     start_server()
@@ -0,0 +1,136 @@
+import multiprocessing
+import signal
+import sys
+import threading
+import zlib
+from collections import defaultdict
+
+from core import config, metrics
+
+# Ingestion multi-processus : le frontal HTTP/UDP valide les payloads puis
+# répartit les mesures entre N workers selon un hachage stable de la balise.
+# Chaque worker possède les médianes glissantes, le segment de journal
+# ("shard<k>-*.ndjson") et les partitions de ses balises ; toutes les mesures
+# d'une balise passent par le même worker, dans leur ordre d'arrivée, d'où
+# des résultats identiques au mode mono-processus.
+
+# Réglages transmis aux workers (démarrés en "spawn", ils relisent config.py)
+SHARD_SETTINGS = (
+    "LOG_DIR", "LOG_SEGMENT_MAX_BYTES", "LOG_SEGMENT_MAX_AGE", "BEACONS_DIR",
+    "BEACON_SEGMENT_MAX_BYTES", "BEACON_SEGMENT_MAX_AGE",
+    "BEACON_INDEX_INTERVAL", "BEACON_MAX_OPEN_PARTITIONS", "STORAGE_QUEUE_SIZE",
+    "STORAGE_FLUSH_INTERVAL", "STORAGE_FLUSH_BATCH", "STORAGE_FSYNC_POLICY",
+    "STORAGE_FSYNC_INTERVAL", "SHM_RING_NAME", "SLIDING_MEDIAN_WINDOW",
+    "SLIDING_MEDIAN_TTL", "SLIDING_MEDIAN_MAX_STREAMS", "METRICS_ENABLED",
+    "METRICS_DIR", "METRICS_WINDOW", "METRICS_EXPORT_INTERVAL", "METRICS_SUMMARY_INTERVAL",
+)
+
+
+def shard_of(beacon_name, shards):
+    """Shard d'une balise (crc32 : stable d'un processus et d'un lancement à l'autre)"""
+    return zlib.crc32(str(beacon_name).encode("utf-8")) % shards
+
+
+def shard_prefix(index):
+    return f"shard{index}"
+
+
+def run_shard(index, inbox, ring_lock, settings):
+    """Boucle d'un worker : médianes glissantes, journal et partitions de son shard."""
+    for name, value in settings.items():
+        setattr(config, name, value)
+    # Ctrl+C est géré par le processus principal ; SIGTERM → sortie propre (journal vidé)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    from core import server
+    from core.shared_ring import MeasurementRing
+    from core.storage import RecordLog, BeaconStore
+
+    record_log = RecordLog(prefix=shard_prefix(index), sinks=[BeaconStore()]).start()
+    ring = MeasurementRing.attach(lock=ring_lock)
+    if metrics.enable(shard_prefix(index)):
+        metrics.gauge("queue_depth", record_log.qsize)
+    try:
+        while True:
+            entries = inbox.get()
+            if entries is None:
+                break
+            with metrics.timed("persist"):
+                server.apply_sliding_medians(entries)
+                accepted = record_log.extend(entries)
+                if accepted < len(entries):
+                    print(f"[SHARD {index}] File d'écriture pleine : lot de {len(entries)} mesure(s) rejeté")
+                if ring is not None:
+                    ring.write(entries)
+    finally:
+        record_log.close()
+        if ring is not None:
+            ring.close()
+
+
+class ShardPool:
+    """Répartiteur de mesures vers N processus de stockage."""
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or config.INGEST_WORKERS
+        self.queue_size = queue_size or config.SHARD_QUEUE_SIZE
+        self.inboxes = []
+        self.processes = []
+        self.dropped = 0
+        self.ring_lock = None
+        self._dispatch_lock = threading.Lock()   # vérification de place + envoi atomiques entre threads
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        # Plusieurs écrivains dans la mémoire partagée ; référence gardée tant que les workers vivent
+        self.ring_lock = context.Lock()
+        settings = {name: getattr(config, name) for name in SHARD_SETTINGS}
+        for index in range(self.workers):
+            inbox = context.Queue(maxsize=self.queue_size)
+            process = context.Process(
+                target=run_shard, args=(index, inbox, self.ring_lock, settings),
+                name=f"ingest-shard-{index}", daemon=True,
+            )
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+        print(f"[INFO] Ingestion répartie sur {self.workers} workers")
+        return self
+
+    def dispatch(self, entries):
+        """
+        Envoie chaque mesure au shard de sa balise, en tout ou rien : si la
+        file d'un des shards visés est pleine, aucun lot n'est envoyé et la
+        fonction retourne False (le client renvoie alors tout le lot).
+        """
+        groups = defaultdict(list)
+        for entry in entries:
+            groups[shard_of(entry["beacon"], self.workers)].append(entry)
+
+        with self._dispatch_lock:
+            # Seul producteur des files : une place libre ici l'est encore au put
+            # (les workers ne font qu'en libérer)
+            if any(self.inboxes[index].full() for index in groups):
+                self.dropped += len(entries)
+                return False
+            for index, group in groups.items():
+                self.inboxes[index].put_nowait(group)
+        return True
+
+    def qsize(self):
+        """Lots en attente dans les files des workers (approximatif)."""
+        try:
+            return sum(inbox.qsize() for inbox in self.inboxes)
+        except NotImplementedError:  # macOS
+            return 0
+
+    def close(self, timeout=30.0):
+        """Arrête les workers après traitement des lots en attente."""
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.inboxes, self.processes = [], []
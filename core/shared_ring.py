@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core import config
+
+# Tampon circulaire en mémoire partagée entre le serveur (écrivain) et les
+# processus d'affichage (lecteurs). Chaque mesure occupe un enregistrement de
+# taille fixe ; un compteur de séquence global indique combien de mesures ont
+# été écrites depuis la création du tampon.
+
+RING_MAGIC = 0x424C4552494E4732  # "BLERING2"
+NAME_SIZE = 32
+TIME_SIZE = 40                    # "time" de la mesure, encodé en JSON (ISO 8601 : 28 octets)
+
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u8"),               # numéro de séquence (INVALID_SEQ pendant l'écriture)
+    ("ts", "<f8"),                # horodatage d'ingestion (epoch)
+    ("beacon", f"S{NAME_SIZE}"),  # nom/alias de la balise
+    ("source", f"S{NAME_SIZE}"),  # identifiant du gateway
+    ("time", f"S{TIME_SIZE}"),    # "time" de la mesure tel que journalisé (vide : déduit de ts)
+    ("rssi", "<f4"),
+    ("median", "<f4"),
+])
+
+INVALID_SEQ = np.iinfo(np.uint64).max
+
+# En-tête : [magic, capacité, séquence suivante (head), taille d'enregistrement]
+HEADER_DTYPE = np.dtype("<u8")
+HEADER_FIELDS = 4
+HEADER_SIZE = 64
+
+
+def encode_time(value):
+    """Champ "time" d'un enregistrement : JSON de la valeur journalisée, vide s'il ne tient pas."""
+    if value is None:
+        return b""
+    try:
+        encoded = json.dumps(value).encode("utf-8")
+    except (TypeError, ValueError):
+        return b""
+    return encoded if len(encoded) <= TIME_SIZE else b""
+
+
+def decode_time(encoded, ts):
+    """Valeur "time" d'une mesure ; à défaut, instant d'ingestion en ISO 8601 UTC."""
+    if encoded:
+        try:
+            return json.loads(encoded)
+        except ValueError:
+            pass
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+
+class MeasurementRing:
+    """Tampon circulaire de mesures partagé entre processus."""
+
+    def __init__(self, shm, owner=False, lock=None):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=HEADER_DTYPE, buffer=shm.buf[:HEADER_FIELDS * 8])
+        if self.header[0] != RING_MAGIC or self.header[3] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Mémoire partagée '{shm.name}' incompatible")
+        self.capacity = int(self.header[1])
+        self.records = np.ndarray(
+            (self.capacity,), dtype=RECORD_DTYPE,
+            buffer=shm.buf[HEADER_SIZE:HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize],
+        )
+        # Un verrou inter-processus est requis quand plusieurs processus écrivent
+        self._lock = lock or threading.Lock()
+
+    @classmethod
+    def create(cls, name=None, capacity=None):
+        """Crée le tampon (processus principal). Remplace un segment orphelin du même nom."""
+        name = name or config.SHM_RING_NAME
+        capacity = capacity or config.SHM_RING_CAPACITY
+        size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=HEADER_DTYPE, buffer=shm.buf[:HEADER_FIELDS * 8])
+        header[:] = (RING_MAGIC, capacity, 0, RECORD_DTYPE.itemsize)
+        del header
+        ring = cls(shm, owner=True)
+        ring.records["seq"] = INVALID_SEQ
+        return ring
+
+    @classmethod
+    def attach(cls, name=None, lock=None):
+        """
+        Se connecte à un tampon existant. Retourne None s'il n'existe pas.
+        `lock` (multiprocessing.Lock) sérialise les écrivains de plusieurs processus.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name or config.SHM_RING_NAME)
+        except FileNotFoundError:
+            return None
+        return cls(shm, lock=lock)
+
+    @property
+    def head(self):
+        """Séquence de la prochaine mesure écrite (= nombre total de mesures écrites)."""
+        return int(self.header[2])
+
+    def write(self, entries):
+        """Ajoute des mesures (dicts du serveur) au tampon."""
+        if not entries:
+            return
+        with self._lock:
+            # Au-delà de la capacité, seules les dernières mesures survivraient
+            seq = int(self.header[2]) + max(0, len(entries) - self.capacity)
+            for entry in entries[-self.capacity:]:
+                slot = self.records[seq % self.capacity]
+                slot["seq"] = INVALID_SEQ  # les lecteurs ignorent l'emplacement pendant l'écriture
+                slot["ts"] = entry.get("ts", time.time())
+                slot["beacon"] = str(entry["beacon"]).encode("utf-8")[:NAME_SIZE]
+                slot["source"] = str(entry["source"]).encode("utf-8")[:NAME_SIZE]
+                slot["time"] = encode_time(entry.get("time"))
+                slot["rssi"] = entry["rssi"]
+                slot["median"] = entry.get("median", entry["rssi"])
+                slot["seq"] = seq
+                seq += 1
+            self.header[2] = seq  # publié une fois les enregistrements complets
+
+    def _spans(self, cursor):
+        """
+        (plages, nouveau_curseur, perdues) : vues sans copie sur les
+        enregistrements de séquence >= `cursor`, chacune avec les séquences
+        qu'elle doit contenir (deux plages au plus quand elles font le tour).
+        """
+        head = self.head
+        start = max(cursor, head - self.capacity)
+        lost = start - cursor
+        if start >= head:
+            return [], head, lost
+
+        first, last = start % self.capacity, (head - 1) % self.capacity
+        if first <= last:
+            chunks = [self.records[first:last + 1]]
+        else:
+            chunks = [self.records[first:], self.records[:last + 1]]
+
+        spans = []
+        expected = start
+        for chunk in chunks:
+            spans.append((chunk, expected + np.arange(len(chunk), dtype=np.uint64)))
+            expected += len(chunk)
+        return spans, head, lost
+
+    def read(self, cursor):
+        """
+        Retourne (blocs, nouveau_curseur, perdues) pour les mesures de séquence
+        >= `cursor`. Les blocs sont des vues sans copie sur la mémoire partagée
+        (deux au plus quand la plage fait le tour du tampon) : à consommer
+        avant que l'écrivain ne les recouvre. `perdues` compte les mesures déjà
+        écrasées depuis le dernier appel.
+        """
+        spans, head, lost = self._spans(cursor)
+        # Écarter les emplacements en cours d'écriture ou déjà recouverts
+        valid_chunks = []
+        for chunk, seqs in spans:
+            ok = chunk["seq"] == seqs
+            valid_chunks.append(chunk if ok.all() else chunk[ok])
+        return valid_chunks, head, lost
+
+    def read_entries(self, cursor):
+        """
+        Comme `read`, mais convertit les mesures en dicts au format du serveur :
+        "time" tel qu'écrit dans le journal (horodatage du relevé), "ts" en epoch.
+        Les enregistrements sont copiés puis leur séquence relue : une mesure
+        recouverte par l'écrivain pendant la copie est écartée.
+        """
+        spans, cursor, lost = self._spans(cursor)
+        entries = []
+        for chunk, seqs in spans:
+            copy = chunk.copy()
+            # Séquence attendue avant la copie (copiée en premier) et toujours là après
+            copy = copy[(copy["seq"] == seqs) & (chunk["seq"] == seqs)]
+            for ts, reading_time, beacon, source, rssi, median in zip(
+                copy["ts"].tolist(), copy["time"].tolist(), copy["beacon"].tolist(),
+                copy["source"].tolist(), copy["rssi"].tolist(), copy["median"].tolist(),
+            ):
+                entries.append({
+                    "time": decode_time(reading_time, ts),
+                    "beacon": beacon.decode("utf-8", "replace"),
+                    "rssi": rssi,
+                    "median": median,
+                    "source": source.decode("utf-8", "replace"),
+                    "ts": ts,
+                })
+        return entries, cursor, lost
+
+    def close(self):
+        """Détache le tampon (et le détruit si ce processus l'a créé)."""
+        self.header = None
+        self.records = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
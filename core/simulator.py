@@ -0,0 +1,287 @@
+import argparse
+import http.client
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from core import config
+from core.filters import RunningMedian
+from core.particle_filter import sample_in_zones, zone_boxes
+from core.presets import PRESETS
+from core.trilateration_utils import distance_to_rssi_array
+
+# Simulateur de charge : des gateways virtuels, placés aux positions d'un
+# préset, « entendent » des balises virtuelles qui parcourent en boucle des
+# trajectoires entre points tirés dans les zones de leur étage. Le RSSI est
+# synthétisé par le modèle de propagation, l'atténuation des murs (rasters
+# précalculés), une perte inter-étages et un bruit gaussien, puis envoyé au
+# serveur comme le feraient les vrais gateways :
+#   - "batch" : {"gateway_id", "readings": [...]} (firmware ESP32 actuel)
+#   - "esp32" : un POST par relevé (ancien firmware)
+#   - "udp"   : datagrammes binaires (voir core/udp_listener.py)
+#   - Minew G1 : [{"type": "iBeacon", "mac", "rssi"}, ...]. Le serveur
+#     attribue ces relevés à la source "minew" : ils comptent dans le débit
+#     d'ingestion mais pas dans le positionnement.
+# La vérité terrain (`VirtualSite.truth`) sert à mesurer l'erreur de position.
+
+FORMATS = ("batch", "esp32", "udp")
+
+
+class VirtualSite:
+    """Gateways d'un préset et balises virtuelles en mouvement."""
+
+    def __init__(self, preset_key, beacons=None, speed=None, noise_db=None, floor_loss_db=None,
+                 sensitivity=None, height=1.0, waypoints=16, seed=0):
+        preset = PRESETS[preset_key]
+        self.preset_key = preset_key
+        self.floors = preset["floors"] if preset.get("multi_floor") else [preset]
+        self.correction = preset.get("correction_rssi", {})
+        self.noise_db = config.SIM_NOISE_DB if noise_db is None else noise_db
+        self.floor_loss_db = config.SIM_FLOOR_LOSS_DB if floor_loss_db is None else floor_loss_db
+        self.sensitivity = config.SIM_SENSITIVITY if sensitivity is None else sensitivity
+        self.height = height
+        speed = speed or config.SIM_SPEED
+        count = beacons or config.SIM_BEACONS
+
+        self.gateway_names, self.gateway_floor, self.gateway_xyz = [], [], []
+        for floor_idx, floor in enumerate(self.floors):
+            for gw, position in floor["gateway_positions"].items():
+                self.gateway_names.append(gw)
+                self.gateway_floor.append(floor_idx)
+                self.gateway_xyz.append(position)
+        self.gateway_floor = np.array(self.gateway_floor, dtype=int)
+        self.gateway_xyz = np.array(self.gateway_xyz, dtype=float)
+
+        from core.attenuation import load_attenuation_raster
+        self.rasters = [load_attenuation_raster(floor) for floor in self.floors]
+
+        # Trajectoires : boucle fermée sur `waypoints` points, parcourue à vitesse constante
+        rng = np.random.default_rng(seed)
+        self.beacon_names = [f"sim_{i:04d}" for i in range(count)]
+        self.beacon_macs = [f"51AA{i:08X}" for i in range(count)]
+        self.beacon_floor = rng.integers(0, len(self.floors), count)
+        boxes = zone_boxes(self.floors)
+        points = sample_in_zones(boxes, np.repeat(self.beacon_floor, waypoints), rng).reshape(count, waypoints, 2)
+        self.waypoints = np.concatenate([points, points[:, :1]], axis=1)     # (B, W + 1, 2)
+        legs = np.linalg.norm(np.diff(self.waypoints, axis=1), axis=2) / speed
+        self.times = np.concatenate([np.zeros((count, 1)), np.cumsum(legs, axis=1)], axis=1)
+        self.phase = rng.random(count) * self.times[:, -1]
+        self.started = time.time()
+
+    def truth(self, t=None):
+        """Étage (B,) et position (B, 3) de chaque balise à l'instant `t` (epoch)."""
+        t = time.time() if t is None else t
+        tau = (t - self.started + self.phase) % np.maximum(self.times[:, -1], 1e-9)
+        leg = np.minimum((self.times[:, 1:] <= tau[:, None]).sum(axis=1), self.times.shape[1] - 2)
+        rows = np.arange(len(tau))
+        start, end = self.times[rows, leg], self.times[rows, leg + 1]
+        fraction = ((tau - start) / np.maximum(end - start, 1e-9))[:, None]
+        xy = self.waypoints[rows, leg] + fraction * (self.waypoints[rows, leg + 1] - self.waypoints[rows, leg])
+        return self.beacon_floor, np.column_stack([xy, np.full(len(xy), self.height)])
+
+    def rssi(self, gateway_idx, t=None, rng=None):
+        """RSSI brut (B,) reçu par un gateway, NaN pour les balises hors de portée."""
+        rng = rng or np.random.default_rng()
+        floors, positions = self.truth(t)
+        gw = self.gateway_names[gateway_idx]
+        gateway_floor = self.gateway_floor[gateway_idx]
+        distances = np.linalg.norm(positions - self.gateway_xyz[gateway_idx], axis=1)
+        rssi = distance_to_rssi_array(distances) + rng.normal(0.0, self.noise_db, len(distances))
+        same_floor = floors == gateway_floor
+        raster = self.rasters[gateway_floor]
+        if same_floor.any():
+            column = raster.gateway_names.index(gw)
+            rssi[same_floor] -= raster.lookup(positions[same_floor])[:, column]
+        rssi[~same_floor] -= self.floor_loss_db
+        # Le serveur ajoute la correction du gateway : le relevé brut en est diminué
+        rssi -= self.correction.get(gw, 0)
+        rssi[rssi < self.sensitivity] = np.nan
+        return np.round(rssi)
+
+
+class VirtualGateway:
+    """Un gateway simulé : relevés périodiques envoyés au serveur dans un thread."""
+
+    def __init__(self, site, gateway_idx, fmt, target, rate=None, minew=False, seed=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Format inconnu : {fmt}")
+        self.site = site
+        self.gateway_idx = gateway_idx
+        self.gateway_id = "minew" if minew else site.gateway_names[gateway_idx]
+        self.fmt = fmt
+        self.minew = minew
+        self.target = target            # (hôte, port) HTTP ou UDP
+        self.rate = rate or config.SIM_RATE
+        self.rng = np.random.default_rng(seed)
+        self.medians = {}               # médiane glissante par balise, comme le firmware ESP32
+        self._thread = None
+
+        self.requests = 0
+        self.readings = 0
+        self.accepted = 0
+        self.errors = 0
+        self.statuses = {}
+        self.latencies = []             # durée (s) de chaque requête HTTP
+
+    def payloads(self, t):
+        """Requêtes (corps, type MIME, nombre de relevés) à envoyer pour l'instant `t`."""
+        rssi = self.site.rssi(self.gateway_idx, t, self.rng)
+        heard = np.flatnonzero(np.isfinite(rssi))
+        if not len(heard):
+            return []
+        if self.minew:
+            body = [{"type": "iBeacon", "mac": self.site.beacon_macs[i], "rssi": int(rssi[i])} for i in heard]
+            return [(json.dumps(body).encode("utf-8"), "application/json", len(body))]
+
+        timestamp = datetime.utcnow().isoformat()
+        readings = []
+        for i in heard:
+            name = self.site.beacon_names[i]
+            median = self.medians.get(name)
+            if median is None:
+                median = self.medians[name] = RunningMedian(config.SLIDING_MEDIAN_WINDOW)
+            median.push(int(rssi[i]))
+            readings.append({"beacon_name": name, "rssi": int(rssi[i]), "median": int(round(median.median())),
+                             "timestamp": timestamp})
+        if self.fmt == "batch":
+            body = {"gateway_id": self.gateway_id, "readings": readings}
+            return [(json.dumps(body).encode("utf-8"), "application/json", len(readings))]
+        if self.fmt == "esp32":
+            return [(json.dumps(dict(reading, gateway_id=self.gateway_id)).encode("utf-8"), "application/json", 1)
+                    for reading in readings]
+
+        from core.udp_listener import MAX_RECORDS, encode_datagram
+        records = [dict(reading, gateway_id=self.gateway_id, timestamp=0) for reading in readings]
+        return [(encode_datagram(records[k:k + MAX_RECORDS]), None, len(records[k:k + MAX_RECORDS]))
+                for k in range(0, len(records), MAX_RECORDS)]
+
+    def start(self, duration):
+        self._thread = threading.Thread(target=self.run, args=(duration,), name=f"sim-{self.gateway_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self, duration):
+        """Envois à cadence fixe pendant `duration` secondes (sans rattrapage en cas de retard)."""
+        host, port = self.target
+        connection, udp = None, None
+        if self.fmt == "udp" and not self.minew:
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+        period = 1.0 / self.rate
+        deadline = time.monotonic() + duration
+        # Départs décalés pour ne pas synchroniser tous les gateways
+        next_send = time.monotonic() + self.rng.random() * period
+        try:
+            while next_send < deadline:
+                time.sleep(max(0.0, next_send - time.monotonic()))
+                next_send = max(next_send + period, time.monotonic())
+                for body, mimetype, count in self.payloads(time.time()):
+                    self.readings += count
+                    if udp is not None:
+                        udp.sendto(body, (host, port))
+                        self.requests += 1
+                        continue
+                    self._post(connection, body, mimetype)
+        finally:
+            if connection is not None:
+                connection.close()
+            if udp is not None:
+                udp.close()
+
+    def _post(self, connection, body, mimetype):
+        started = time.perf_counter()
+        try:
+            connection.request("POST", "/collect_gateway_info", body, {"Content-Type": mimetype})
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            connection.close()  # reconnexion à la requête suivante
+            return
+        self.latencies.append(time.perf_counter() - started)
+        self.requests += 1
+        self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+        if response.status == 200:
+            try:
+                self.accepted += json.loads(payload).get("received", 0)
+            except ValueError:
+                pass
+
+
+def start_gateways(site, target, fmt="batch", rate=None, duration=10.0, minew=0, udp_target=None, seed=0):
+    """
+    Démarre un gateway virtuel par gateway du préset (format `fmt`) et
+    `minew` gateways Minew G1 supplémentaires, placés aux mêmes positions.
+    """
+    gateways = []
+    for g in range(len(site.gateway_names)):
+        gateway_target = udp_target if fmt == "udp" else target
+        gateways.append(VirtualGateway(site, g, fmt, gateway_target, rate, seed=seed + g))
+    for k in range(minew):
+        gateways.append(VirtualGateway(site, k % len(site.gateway_names), "batch", target, rate,
+                                       minew=True, seed=seed + 1000 + k))
+    for gateway in gateways:
+        gateway.start(duration)
+    return gateways
+
+
+def summarize(gateways, duration):
+    """Débit et latences HTTP agrégés sur tous les gateways virtuels."""
+    latencies = np.array([latency for gateway in gateways for latency in gateway.latencies]) * 1000
+    statuses = {}
+    for gateway in gateways:
+        for status, count in gateway.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    over_http = [gateway for gateway in gateways if gateway.fmt != "udp" or gateway.minew]
+    summary = {
+        "requests_s": sum(gateway.requests for gateway in gateways) / duration,
+        "readings_s": sum(gateway.readings for gateway in gateways) / duration,
+        # En UDP le serveur ne répond pas : les relevés envoyés sont comptés comme reçus
+        "accepted_s": (sum(gateway.accepted for gateway in over_http)
+                       + sum(gateway.readings for gateway in gateways if gateway not in over_http)) / duration,
+        "errors": sum(gateway.errors for gateway in gateways),
+        "statuses": statuses,
+    }
+    for p in (50, 95, 99):
+        summary[f"http_p{p}_ms"] = float(np.percentile(latencies, p)) if len(latencies) else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateways et balises virtuels envoyant des relevés au serveur")
+    parser.add_argument("--preset", default="salle_1")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{config.SERVER_PORT}")
+    parser.add_argument("--format", choices=FORMATS, default="batch")
+    parser.add_argument("--udp-port", type=int, default=config.UDP_PORT)
+    parser.add_argument("--minew", type=int, default=0, help="gateways Minew G1 supplémentaires")
+    parser.add_argument("--beacons", type=int, default=config.SIM_BEACONS)
+    parser.add_argument("--rate", type=float, default=config.SIM_RATE, help="envois par seconde et par gateway")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    site = VirtualSite(args.preset, args.beacons, seed=args.seed)
+    print(f"[SIM] {args.preset} : {len(site.gateway_names)} gateways ({args.format}) + {args.minew} Minew, "
+          f"{args.beacons} balises, {args.rate:g} envoi(s)/s → {args.url}")
+    gateways = start_gateways(site, (url.hostname, url.port or 80), args.format, args.rate, args.duration,
+                              args.minew, (url.hostname, args.udp_port), args.seed)
+    for gateway in gateways:
+        gateway.join()
+    summary = summarize(gateways, args.duration)
+    print(f"[SIM] {summary['readings_s']:.0f} relevés/s envoyés, {summary['accepted_s']:.0f} acceptés, "
+          f"{summary['requests_s']:.0f} requêtes/s, codes {summary['statuses']}, erreurs {summary['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+import bisect
+import json
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from core import config
+
+# Le serveur n'écrit plus l'historique complet à chaque requête : les mesures
+# sont mises en file, puis un thread d'écriture les ajoute par lots à la fin
+# d'un journal NDJSON découpé en segments (une mesure JSON par ligne).
+
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx"
+INDEX_RECORD = struct.Struct("<dQ")  # (horodatage d'ingestion, offset dans le segment)
+
+
+def segment_name(prefix, index):
+    """Nom du fichier de segment numéro `index`."""
+    return f"{prefix}-{index:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory, prefix=None):
+    """Liste triée des segments d'un répertoire (optionnellement filtrés par préfixe)."""
+    if not os.path.isdir(directory):
+        return []
+    names = [
+        name for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX) and (prefix is None or name.startswith(f"{prefix}-"))
+    ]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class SegmentWriter:
+    """
+    Fichier append-only découpé en segments avec rotation par taille, et par
+    âge si `max_age` est donné (un segment inactif n'est alors jamais rouvert :
+    la rétention peut le supprimer sans risque).
+    """
+
+    def __init__(self, directory, prefix, max_bytes=None, max_age=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes or config.LOG_SEGMENT_MAX_BYTES
+        self.max_age = max_age
+        self.index = 0
+        self.offset = 0
+        self.file = None
+        self.opened_at = None
+        os.makedirs(directory, exist_ok=True)
+
+        # Reprendre à la fin du dernier segment existant
+        existing = list_segments(directory, prefix)
+        if existing:
+            last = os.path.basename(existing[-1])
+            self.index = int(last[len(prefix) + 1:-len(SEGMENT_SUFFIX)])
+        self._open_segment(self.index)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, segment_name(self.prefix, self.index))
+
+    def _open_segment(self, index):
+        if self.file:
+            self.file.close()
+        self.index = index
+        os.makedirs(self.directory, exist_ok=True)  # dossier vide supprimé par la rétention
+        self.file = open(self.path, "ab")
+        self.offset = self.file.tell()
+        self.opened_at = time.time()
+        self.on_segment_opened()
+
+    def on_segment_opened(self):
+        """Point d'extension appelé après l'ouverture d'un nouveau segment."""
+
+    def rotate(self):
+        self._open_segment(self.index + 1)
+
+    def should_rotate(self, size):
+        """Le segment courant est-il plein (ou trop vieux) pour `size` octets de plus ?"""
+        if self.offset == 0:
+            return False
+        if self.offset + size > self.max_bytes:
+            return True
+        return self.max_age is not None and time.time() - self.opened_at > self.max_age
+
+    def write(self, data):
+        """Ajoute `data` (bytes) et retourne l'offset où il a été écrit."""
+        if self.should_rotate(len(data)):
+            self.rotate()
+        start = self.offset
+        self.file.write(data)
+        self.offset += len(data)
+        return start
+
+    def flush(self, fsync=False):
+        if not self.file:
+            return
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file:
+            self.file.flush()
+            self.file.close()
+            self.file = None
+
+
+class RecordLog:
+    """
+    Journal global des mesures avec écriture différée (write-behind).
+
+    `append` se contente de mettre la mesure en file ; un thread dédié vide la
+    file par lots, dès que `flush_batch` mesures sont en attente ou au plus tard
+    après `flush_interval` secondes.
+    """
+
+    def __init__(self, directory=None, prefix="data", flush_interval=None, flush_batch=None,
+                 fsync_policy=None, fsync_interval=None, queue_size=None, segment_max_bytes=None,
+                 sinks=None):
+        self.directory = directory or config.LOG_DIR
+        self.prefix = prefix
+        self.flush_interval = flush_interval if flush_interval is not None else config.STORAGE_FLUSH_INTERVAL
+        self.flush_batch = flush_batch or config.STORAGE_FLUSH_BATCH
+        self.fsync_policy = fsync_policy or config.STORAGE_FSYNC_POLICY
+        self.fsync_interval = fsync_interval if fsync_interval is not None else config.STORAGE_FSYNC_INTERVAL
+        self.segment_max_bytes = segment_max_bytes or config.LOG_SEGMENT_MAX_BYTES
+        self.queue = queue.Queue(maxsize=queue_size or config.STORAGE_QUEUE_SIZE)
+        self.sinks = list(sinks or [])  # stockages secondaires (write_batch / flush / close)
+        self.dropped = 0
+        self.writer = None
+        self._thread = None
+        self._put_lock = threading.Lock()  # vérification de place + mise en file atomiques entre producteurs
+        self._stop = threading.Event()
+        self._last_fsync = time.monotonic()
+
+        if self.fsync_policy not in ("batch", "interval", "never"):
+            raise ValueError(f"Politique fsync inconnue : {self.fsync_policy}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self.writer = SegmentWriter(self.directory, self.prefix, self.segment_max_bytes, config.LOG_SEGMENT_MAX_AGE)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"record-log-{self.prefix}", daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, entry):
+        """Met une mesure en file. Retourne False si la file est pleine."""
+        return self.extend([entry]) == 1
+
+    def extend(self, entries):
+        """
+        Met plusieurs mesures en file, toutes ou aucune : un lot refusé n'est
+        pas écrit en partie (le client le renverra en entier). Retourne le
+        nombre de mesures acceptées (0 ou len(entries)).
+        """
+        with self._put_lock:
+            # Le thread d'écriture ne fait que libérer des places : celles vues ici restent libres
+            if self.free_slots() < len(entries):
+                self.dropped += len(entries)
+                return 0
+            now = time.time()
+            for entry in entries:
+                entry.setdefault("ts", now)  # horodatage d'ingestion (epoch)
+                self.queue.put_nowait(entry)
+        return len(entries)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def free_slots(self):
+        """Places encore disponibles dans la file d'écriture."""
+        if self.queue.maxsize <= 0:
+            return float("inf")
+        return self.queue.maxsize - self.queue.qsize()
+
+    def close(self, timeout=5.0):
+        """Arrête le thread après avoir écrit toutes les mesures en attente."""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        for sink in self.sinks:
+            sink.close()
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < self.flush_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+                pending.extend(self._drain(item))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            if stopping:
+                while True:
+                    try:
+                        pending.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if pending and (len(pending) >= self.flush_batch or due or stopping):
+                self._write_batch(pending)
+                pending = []
+                deadline = None
+
+            if stopping:
+                return
+
+    def _write_batch(self, batch):
+        fsync = self._should_fsync()
+        try:
+            data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch)
+            self.writer.write(data.encode("utf-8"))
+            self.writer.flush(fsync=fsync)
+        except Exception as e:
+            print(f"[ERREUR] Écriture du journal {self.writer.path} : {e}")
+        for sink in self.sinks:
+            try:
+                sink.write_batch(batch)
+                sink.flush(fsync=fsync)
+            except Exception as e:
+                print(f"[ERREUR] Écriture {type(sink).__name__} : {e}")
+
+    def _should_fsync(self):
+        if self.fsync_policy == "batch":
+            return True
+        if self.fsync_policy == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                self._last_fsync = now
+                return True
+        return False
+
+
+class PartitionWriter(SegmentWriter):
+    """
+    Segments NDJSON d'une balise, accompagnés d'un index clairsemé.
+
+    Chaque segment `<prefix>-N.ndjson` a un fichier `<prefix>-N.idx` composé
+    d'entrées binaires (horodatage, offset) : une au début du segment puis au
+    plus une par `index_interval` secondes. Un lecteur retrouve ainsi l'offset
+    d'un instant donné par dichotomie, sans relire l'historique.
+    """
+
+    def __init__(self, directory, prefix="seg", max_bytes=None, index_interval=None):
+        self.index_interval = index_interval if index_interval is not None else config.BEACON_INDEX_INTERVAL
+        self.index_file = None
+        self.last_indexed_ts = None
+        super().__init__(directory, prefix, max_bytes or config.BEACON_SEGMENT_MAX_BYTES,
+                         config.BEACON_SEGMENT_MAX_AGE)
+
+    def on_segment_opened(self):
+        if self.index_file:
+            self.index_file.close()
+        index_path = self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        self.index_file = open(index_path, "ab")
+        self.last_indexed_ts = None
+
+    def append(self, ts, data):
+        """Ajoute une ligne horodatée à `ts` et met l'index à jour si nécessaire."""
+        if self.should_rotate(len(data)):
+            self.rotate()
+        if self.last_indexed_ts is None or ts - self.last_indexed_ts >= self.index_interval:
+            self.index_file.write(INDEX_RECORD.pack(ts, self.offset))
+            self.last_indexed_ts = ts
+        return self.write(data)
+
+    def flush(self, fsync=False):
+        if self.index_file:
+            self.index_file.flush()
+            if fsync:
+                os.fsync(self.index_file.fileno())
+        super().flush(fsync)
+
+    def close(self):
+        if self.index_file:
+            self.index_file.close()
+            self.index_file = None
+        super().close()
+
+
+def partition_dir(beacon_name, directory=None):
+    """Dossier de la partition d'une balise (nom nettoyé pour le système de fichiers)."""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(beacon_name))
+    return os.path.join(directory or config.BEACONS_DIR, safe_name)
+
+
+class BeaconStore:
+    """
+    Stockage partitionné par balise, branché comme sink d'un RecordLog.
+
+    Chaque mesure est ajoutée en O(1) à la fin du segment courant de sa balise.
+    Seules les `max_open` partitions les plus récemment écrites gardent leurs
+    fichiers ouverts.
+    """
+
+    def __init__(self, directory=None, max_open=None):
+        self.directory = directory or config.BEACONS_DIR
+        self.max_open = max_open or config.BEACON_MAX_OPEN_PARTITIONS
+        self.partitions = OrderedDict()
+
+    def _partition(self, beacon_name):
+        writer = self.partitions.get(beacon_name)
+        if writer is not None:
+            self.partitions.move_to_end(beacon_name)
+            return writer
+        writer = PartitionWriter(partition_dir(beacon_name, self.directory))
+        self.partitions[beacon_name] = writer
+        while len(self.partitions) > self.max_open:
+            _, oldest = self.partitions.popitem(last=False)
+            oldest.close()
+        return writer
+
+    def write_batch(self, entries):
+        for entry in entries:
+            line = json.dumps(entry, separators=(",", ":")) + "\n"
+            self._partition(entry["beacon"]).append(entry["ts"], line.encode("utf-8"))
+
+    def flush(self, fsync=False):
+        for writer in self.partitions.values():
+            writer.flush(fsync)
+
+    def close(self):
+        for writer in self.partitions.values():
+            writer.close()
+        self.partitions.clear()
+
+
+def _read_index(segment_path):
+    index_path = segment_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+    try:
+        with open(index_path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return []
+    usable = len(raw) - len(raw) % INDEX_RECORD.size
+    return list(INDEX_RECORD.iter_unpack(raw[:usable]))
+
+
+def _read_segment_from(segment_path, offset, since):
+    """Lit un segment par mmap à partir de `offset` en gardant les mesures postérieures à `since`."""
+    entries = []
+    with open(segment_path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return entries  # segment vide
+        with mm:
+            end = mm.rfind(b"\n") + 1  # ignorer une ligne en cours d'écriture
+            if end <= offset:
+                return entries
+            for line in mm[offset:end].splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get("ts", 0) >= since:
+                    entries.append(entry)
+    return entries
+
+
+def read_beacon_tail(beacon_name, seconds=None, since=None, directory=None):
+    """
+    Retourne les mesures d'une balise depuis `since` (epoch) ou sur les
+    `seconds` dernières secondes, sans parser l'historique antérieur.
+    Sans borne, retourne toutes les mesures de la partition.
+    """
+    if since is None and seconds is not None:
+        since = time.time() - seconds
+
+    segments = list_segments(partition_dir(beacon_name, directory))
+    chunks = []
+    for segment_path in reversed(segments):
+        index = _read_index(segment_path)
+        offset = 0
+        if since is not None and index:
+            times = [ts for ts, _ in index]
+            position = bisect.bisect_right(times, since) - 1
+            if position >= 0:
+                offset = index[position][1]
+        try:
+            chunks.append(_read_segment_from(segment_path, offset, since))
+        except FileNotFoundError:
+            continue  # segment supprimé entre-temps par la rétention
+        # Ce segment débute avant `since` : les segments plus anciens sont inutiles
+        if since is not None and index and index[0][0] <= since:
+            break
+
+    entries = []
+    for chunk in reversed(chunks):
+        entries.extend(chunk)
+    return entries
+
+
+def reset_beacon_store(directory=None):
+    """Supprime les segments et index de toutes les partitions de balises."""
+    directory = directory or config.BEACONS_DIR
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        partition = os.path.join(directory, name)
+        if not os.path.isdir(partition):
+            continue
+        for file_name in os.listdir(partition):
+            if file_name.endswith((SEGMENT_SUFFIX, INDEX_SUFFIX)):
+                try:
+                    os.remove(os.path.join(partition, file_name))
+                except OSError as e:
+                    print(f"[ERREUR] Impossible de supprimer {file_name} : {e}")
+
+
+def iter_log_records(directory=None, prefix=None):
+    """Parcourt toutes les mesures du journal, du plus ancien au plus récent."""
+    for path in list_segments(directory or config.LOG_DIR, prefix):
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # ligne en cours d'écriture
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError as e:
+            print(f"[ERREUR] Lecture {path} : {e}")
+
+
+def reset_log(directory=None):
+    """Supprime tous les segments du journal."""
+    for path in list_segments(directory or config.LOG_DIR):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"[ERREUR] Impossible de supprimer {path} : {e}")
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+from core import config
+from core.filters import KalmanFilterBank, ButterworthStreamBank
+from core.shared_ring import MeasurementRing
+from core.storage import list_segments
+
+# Les plots ne relisent plus tout l'historique à chaque image : un curseur
+# mémorise où la lecture s'est arrêtée, et seules les nouvelles mesures sont
+# ajoutées à l'état en mémoire par couple (balise, gateway).
+
+HISTORY_SIZE = 10  # Fenêtre de valeurs conservée par flux (celle utilisée par les filtres)
+
+
+class MeasurementCursor:
+    """
+    Lecture incrémentale des mesures : par numéro de séquence dans la mémoire
+    partagée si elle existe, sinon par offset d'octet dans chaque segment du
+    journal.
+    """
+
+    def __init__(self, log_dir=None):
+        self.log_dir = log_dir or config.LOG_DIR
+        self.ring = None
+        self.ring_cursor = 0
+        self.log_offsets = {}
+
+    def poll(self):
+        """Retourne les mesures arrivées depuis l'appel précédent."""
+        if self.ring is None:
+            self.ring = MeasurementRing.attach()
+            if self.ring is not None and self.log_offsets:
+                # Déjà lu via le journal : ne prendre que les mesures à venir
+                self.ring_cursor = self.ring.head
+        if self.ring is not None:
+            entries, self.ring_cursor, lost = self.ring.read_entries(self.ring_cursor)
+            if lost:
+                print(f"[WARNING] {lost} mesure(s) écrasée(s) dans la mémoire partagée avant lecture")
+            return entries
+        return self._poll_log()
+
+    def _poll_log(self):
+        entries = []
+        segments = list_segments(self.log_dir)
+        # Oublier les segments supprimés (réinitialisation du journal)
+        for path in list(self.log_offsets):
+            if path not in segments:
+                del self.log_offsets[path]
+
+        for path in segments:
+            offset = self.log_offsets.get(path, 0)
+            try:
+                if os.path.getsize(path) <= offset:
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+            except OSError as e:
+                print(f"[ERREUR] Lecture {path} : {e}")
+                continue
+            end = chunk.rfind(b"\n") + 1  # ne pas consommer une ligne incomplète
+            for line in chunk[:end].splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            self.log_offsets[path] = offset + end
+        return entries
+
+
+class StreamState:
+    """
+    Dernières valeurs RSSI corrigées par balise et par gateway, et leur
+    version filtrée par une banque de Kalman persistante puis un passe-bas de
+    Butterworth causal (un état par flux, avancé uniquement par les nouvelles
+    mesures). Un flux sans mesure depuis `hot_window` secondes est oublié,
+    avec l'état de ses filtres, pour que la mémoire reste bornée.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, hot_window=None):
+        self.history_size = history_size
+        self.hot_window = hot_window or config.RETENTION_HOT_WINDOW
+        self.beacons = {}       # {balise: {gateway: deque([rssi, ...])}}
+        self.filtered = {}      # {balise: {gateway: deque([rssi filtré, ...])}}
+        self.last_seen = OrderedDict()  # {(balise, gateway): horodatage}, du moins au plus récemment mis à jour
+        self.kalman = KalmanFilterBank()
+        self.butterworth = ButterworthStreamBank()
+        self.ignored = OrderedDict()    # {balise écartée par le filtre: horodatage}, oubliée comme un flux inactif
+
+    def ingest(self, entries):
+        """Ajoute de nouvelles mesures. Retourne l'ensemble des balises mises à jour."""
+        updated = set()
+        keys, values = [], []
+        for d in entries:
+            beacon_name = d.get("beacon")
+            if beacon_name not in self.beacons:
+                if beacon_name in self.ignored:
+                    self.ignored[beacon_name] = d.get("ts") or time.time()
+                    self.ignored.move_to_end(beacon_name)
+                    continue
+                if not config.should_process_beacon(beacon_name):
+                    # Log une seule fois tant que la balise reste visible
+                    self.ignored[beacon_name] = d.get("ts") or time.time()
+                    print(f"[FILTER] Balise {beacon_name} ignorée par le filtre")
+                    continue
+                self.beacons[beacon_name] = {}
+                self.filtered[beacon_name] = {}
+
+            gateway_id = d.get("source")
+            streams = self.beacons[beacon_name]
+            if gateway_id not in streams:
+                streams[gateway_id] = deque(maxlen=self.history_size)
+                self.filtered[beacon_name][gateway_id] = deque(maxlen=self.history_size)
+            value = d.get("median", d["rssi"]) + config.CORRECTION_RSSI.get(gateway_id, 0)
+            streams[gateway_id].append(value)
+            key = (beacon_name, gateway_id)
+            self.last_seen[key] = d.get("ts") or time.time()
+            self.last_seen.move_to_end(key)
+            keys.append(key)
+            values.append(value)
+            updated.add(beacon_name)
+
+        # Kalman puis passe-bas de tous les nouveaux échantillons, en passes vectorisées
+        if keys:
+            smoothed = self.butterworth.update(keys, self.kalman.update(keys, values))
+            for (beacon_name, gateway_id), value in zip(keys, smoothed.tolist()):
+                self.filtered[beacon_name][gateway_id].append(value)
+        self.expire()
+        return updated
+
+    def expire(self, now=None):
+        """
+        Oublie les flux inactifs depuis `hot_window` secondes, ainsi que les
+        balises écartées par le filtre qui ne sont plus vues (adresses BLE
+        aléatoires...). Retourne les balises disparues. Les flux sont retirés
+        par le début de `last_seen` (les moins récemment mis à jour) : coût
+        proportionnel au nombre de flux expirés, pas au nombre de flux suivis.
+        """
+        cutoff = (time.time() if now is None else now) - self.hot_window
+        ignored = self.ignored
+        while ignored and next(iter(ignored.values())) < cutoff:
+            ignored.popitem(last=False)
+
+        last_seen = self.last_seen
+        stale = []
+        while last_seen:
+            key, seen = next(iter(last_seen.items()))
+            if seen >= cutoff:
+                break
+            del last_seen[key]
+            stale.append(key)
+        if not stale:
+            return set()
+
+        gone = set()
+        for beacon_name, gateway_id in stale:
+            del self.beacons[beacon_name][gateway_id]
+            del self.filtered[beacon_name][gateway_id]
+            if not self.beacons[beacon_name]:
+                del self.beacons[beacon_name]
+                del self.filtered[beacon_name]
+                gone.add(beacon_name)
+        self.kalman.discard(stale)
+        self.butterworth.discard(stale)
+        return gone
+
+    def streams(self, beacon_name):
+        """{gateway: deque de valeurs} pour une balise."""
+        return self.beacons.get(beacon_name, {})
+
+    def filtered_streams(self, beacon_name):
+        """{gateway: deque de valeurs filtrées (Kalman + Butterworth)} pour une balise."""
+        return self.filtered.get(beacon_name, {})
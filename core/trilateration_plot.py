@@ -2,22 +2,18 @@ import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import matplotlib.image as mpimg
 import numpy as np
-import json
 import os
-from datetime import datetime
 
-from core.filters import apply_kalman_filter, apply_butterworth_filter
-from core.attenuation import apply_path_based_attenuation
-from core.trilateration_utils import trilateration_optim, rssi_to_distance, apply_proximity_bonus
-from core import config
+from core import config, metrics, profiler
+from core.engine import PositioningEngine
+from core.plot_artists import ArtistPool
 
 # === Variables globales ===
 fig, ax = plt.subplots()
-beacon_points = {}
 beacon_colors = ['red', 'green', 'blue', 'orange', 'purple']
-circle_artists = []
-text_artists = []  # Ajouter cette liste pour les textes
-legend_updated = False
+pool = None  # marqueurs, cercles et étiquettes réutilisés (créés par setup_plot())
+animation = None  # FuncAnimation en blit (créée par start())
+engine = None  # moteur de positionnement (thread lancé par start())
 
 def transform_coordinates(x, y):
     """Transformer les coordonnées pour corriger l'inversion de la map"""
@@ -34,6 +30,7 @@ def transform_coordinates(x, y):
 
 def setup_plot():
     """Configuration du plot avec les valeurs du préset chargé"""
+    global pool
     ax.clear()
     
     print(f"[PLOT] Configuration avec:")
@@ -69,199 +66,70 @@ def setup_plot():
     ax.set_ylim(config.EXTENT[2], config.EXTENT[3])
     ax.set_title("Position estimée des balises (projection 2D)")
     ax.grid(True)
-    ax.legend()
-
-def load_data():
-    if not os.path.exists(config.DATA_FILE):
-        return []
-    try:
-        with open(config.DATA_FILE, "r") as f:
-            data = json.load(f)
-            for d in data:
-                if isinstance(d.get("time"), str):
-                    d["time"] = datetime.fromisoformat(d["time"])
-            return data
-    except Exception as e:
-        print(f"[ERREUR] Lecture {config.DATA_FILE} : {e}")
-        return []
-
-def is_position_in_zones(x, y):
-    """Vérifier si la position (x, y) est dans une des zones définies"""
-    if not hasattr(config, 'USE_ZONES') or not config.USE_ZONES:
-        return True, None
-        
-    for name, x1, y1, x2, y2 in config.ZONES:
-        if x1 <= x <= x2 and y1 <= y <= y2:
-            return True, name
-    return False, None
-
-def find_closest_zone(x, y):
-    """Trouver la zone la plus proche et retourner une position corrigée"""
-    if not hasattr(config, 'USE_ZONES') or not config.USE_ZONES:
-        return None, (x, y)
-        
-    min_distance = float('inf')
-    closest_zone = None
-    corrected_pos = (x, y)
-    
-    for name, x1, y1, x2, y2 in config.ZONES:
-        corrected_x = max(x1, min(x, x2))
-        corrected_y = max(y1, min(y, y2))
-        distance = ((x - corrected_x) ** 2 + (y - corrected_y) ** 2) ** 0.5
-        
-        if distance < min_distance:
-            min_distance = distance
-            closest_zone = name
-            corrected_pos = (corrected_x, corrected_y)
-    
-    return closest_zone, corrected_pos
+    # Légende construite à la première image, avec les balises
+    pool = ArtistPool(ax)
 
+@metrics.timed_calls("render")
 def update(frame):
-    """Mise à jour avec filtrage des balises et transformation des coordonnées"""
-    global circle_artists, text_artists, beacon_points
-    
+    """
+    Affichage des dernières positions calculées par le moteur de positionnement.
+    Retourne les artistes à redessiner (blit).
+    """
     # Utiliser config.* au lieu des variables importées
-    if not config.GATEWAY_POSITIONS:
-        return
+    if not config.GATEWAY_POSITIONS or engine is None:
+        return pool.artists()
         
-    data = load_data()
-    if not data:
-        return
-
-    # Nettoyage des anciens cercles ET des textes
-    for circ in circle_artists:
-        circ.remove()
-    for text in text_artists:
-        text.remove()
-    circle_artists.clear()
-    text_artists.clear()
-
-    # Grouper les données par beacon
-    beacon_data = {}
-    for d in data:
-        beacon_name = d.get("beacon")
-        if beacon_name not in beacon_data:
-            beacon_data[beacon_name] = []
-        beacon_data[beacon_name].append(d)
-
-    # APPLIQUER LE FILTRE DES BALISES
-    from core.config import should_process_beacon
-    
-    filtered_beacon_data = {}
-    for beacon_name, beacon_entries in beacon_data.items():
-        if should_process_beacon(beacon_name):
-            filtered_beacon_data[beacon_name] = beacon_entries
-        else:
-            print(f"[FILTER] Balise {beacon_name} ignorée par le filtre")
-    
-    beacon_data = filtered_beacon_data
-    
-    if not beacon_data:
-        print("[FILTER] Aucune balise autorisée détectée")
-        return
-
-    print(f"[FILTER] Balises autorisées détectées: {list(beacon_data.keys())}")
-    
-    new_beacon_added = False
+    positions = engine.get_positions()
+    # Même sans position, l'image efface les balises disparues (begin/finish)
+    pool.begin()
+    if positions:
+        print(f"[FILTER] Balises autorisées détectées: {list(positions.keys())}")
     
     # Traiter chaque balise séparément
-    for i, (beacon_name, beacon_entries) in enumerate(beacon_data.items()):
+    for i, (beacon_name, result) in enumerate(positions.items()):
         color = beacon_colors[i % len(beacon_colors)]
         
         # Créer le point pour cette balise s'il n'existe pas
-        if beacon_name not in beacon_points:
-            point, = ax.plot([], [], 'o', color=color, label=f"{beacon_name}", markersize=8)
-            beacon_points[beacon_name] = point
-            new_beacon_added = True
+        if beacon_name not in pool.markers:
+            pool.marker(beacon_name, color)
             print(f"[DEBUG] Nouveau point créé pour {beacon_name}")
 
-        filtered_rssi = {}
-        for gw in config.GATEWAY_POSITIONS:
-            values = [
-                d.get("median", d["rssi"]) + config.CORRECTION_RSSI.get(gw, 0)
-                for d in beacon_entries if d.get("source") == gw 
-            ]
-            if len(values) < 5:
-                continue
-            kalman_values = apply_kalman_filter(values[-10:])
-            butter_values = apply_butterworth_filter(kalman_values)
-            filtered_rssi[gw] = np.mean(butter_values[-5:])
-
-        print(f"[DEBUG] {beacon_name}: {len(filtered_rssi)} gateways avec données")
-
-        if len(filtered_rssi) < 3:
-            print(f"[DEBUG] {beacon_name}: Pas assez de gateways ({len(filtered_rssi)} < 3)")
+        gateways = result["gateways"]
+        if len(gateways) < 3:
+            print(f"[DEBUG] {beacon_name}: Pas assez de gateways ({len(gateways)} < 3)")
             # Réinitialiser la position si pas assez de données
-            beacon_points[beacon_name].set_data([], [])
+            pool.hide(beacon_name)
             continue
 
-        # Synchronisation distances ↔ positions
-        valid_gateways = [gw for gw in config.GATEWAY_POSITIONS if gw in filtered_rssi]
-        distances = [rssi_to_distance(filtered_rssi[gw]) for gw in valid_gateways]
-        positions = [config.GATEWAY_POSITIONS[gw] for gw in valid_gateways]
-
-        print(f"[DEBUG] {beacon_name}: distances = {[f'{d:.1f}m' for d in distances]}")
-
         # Affichage des cercles de trilatération pour cette balise avec coordonnées transformées
-        for j, ((x_gw, y_gw, _), radius) in enumerate(zip(positions, distances)):
-            x_gw_display, y_gw_display = transform_coordinates(x_gw, y_gw)
-            
-            circle = plt.Circle((x_gw_display, y_gw_display), radius, 
-                              color=color, fill=False, 
-                              linestyle='--', alpha=0.4, linewidth=1.5)
-            ax.add_patch(circle)
-            circle_artists.append(circle)
-            
-            # Ajouter le texte à la liste des textes à supprimer
-            text = ax.text(x_gw_display + radius * 0.7, y_gw_display + radius * 0.7, 
-                          f"{radius:.2f}m", fontsize=8, color=color, alpha=0.7)
-            text_artists.append(text)
+        for gw, info in gateways.items():
+            x_gw, y_gw, _ = config.GATEWAY_POSITIONS[gw]
+            pool.circle(beacon_name, gw, transform_coordinates(x_gw, y_gw), info["distance"], color,
+                        text_alpha=0.7)
 
-        # Trilateration et mise à jour de la position de la balise
-        pos_3d = trilateration_optim(distances, positions)
-        if pos_3d is not None:
-            # Appliquer les corrections
-            filtered_rssi = apply_path_based_attenuation(pos_3d[:2], filtered_rssi, config.GATEWAY_POSITIONS)
-            filtered_rssi = apply_proximity_bonus(distances, filtered_rssi, config.GATEWAY_POSITIONS)
-
-            x, y = pos_3d[0], pos_3d[1]
-            
-            print(f"[DEBUG] {beacon_name}: Position calculée = ({x:.2f}, {y:.2f})")
-            
-            # Vérifier si le système de zones est activé
-            if hasattr(config, 'USE_ZONES') and config.USE_ZONES and config.ZONES:
-                # Vérifier si la position est dans une zone autorisée
-                in_zone, zone_name = is_position_in_zones(x, y)
-                
-                if in_zone:
-                    x_display, y_display = transform_coordinates(x, y)
-                    beacon_points[beacon_name].set_data([x_display], [y_display])
-                    print(f"[INFO] ✅ {beacon_name} détectée dans la zone : {zone_name} ({x:.2f}, {y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
-                else:
-                    closest_zone, (corrected_x, corrected_y) = find_closest_zone(x, y)
-                    x_display, y_display = transform_coordinates(corrected_x, corrected_y)
-                    beacon_points[beacon_name].set_data([x_display], [y_display])
-                    print(f"[WARNING] ⚠️  {beacon_name} corrigée vers : {closest_zone} ({corrected_x:.2f}, {corrected_y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
-            else:
-                # Pas de contrainte de zones - utiliser la position brute transformée
-                x_display, y_display = transform_coordinates(x, y)
-                beacon_points[beacon_name].set_data([x_display], [y_display])
-                print(f"[INFO] 📍 {beacon_name} position libre : ({x:.2f}, {y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
-        else:
+        if result["x"] is None:
             print(f"[DEBUG] {beacon_name}: Échec de la trilatération")
             # Réinitialiser la position si échec
-            beacon_points[beacon_name].set_data([], [])
+            pool.hide(beacon_name)
+            continue
 
-    # Mettre à jour la légende si de nouvelles balises ont été ajoutées
-    if new_beacon_added:
-        ax.legend(loc='upper right')
+        # Position déjà ramenée dans une zone par le moteur si USE_ZONES est actif
+        x, y = result["x"], result["y"]
+        x_display, y_display = transform_coordinates(x, y)
+        pool.move(beacon_name, color, x_display, y_display)
+        if result["zone"] is None:
+            print(f"[INFO] 📍 {beacon_name} position libre : ({x:.2f}, {y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
+        elif result["in_zone"]:
+            print(f"[INFO] ✅ {beacon_name} détectée dans la zone : {result['zone']} ({x:.2f}, {y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
+        else:
+            print(f"[WARNING] ⚠️  {beacon_name} corrigée vers : {result['zone']} ({x:.2f}, {y:.2f}) -> affichage ({x_display:.2f}, {y_display:.2f})")
 
-    # Forcer le rafraîchissement du plot
-    plt.draw()
-    plt.pause(0.01)  # Petite pause pour forcer l'actualisation
+    # Marqueurs et cercles non mis à jour masqués, légende reconstruite si de nouvelles balises sont apparues
+    return pool.finish()
 
 def start():
     """Fonction principale pour démarrer le plot"""
+    global engine, animation
     print("[PLOT] Démarrage du système de visualisation...")
     
     # Charger la configuration depuis le fichier
@@ -283,9 +151,14 @@ def start():
         print("[ERREUR] Configuration non disponible après timeout")
         return
     
+    # Le calcul des positions tourne à son propre rythme, indépendamment de l'affichage
+    engine = PositioningEngine().start()
+    profiler.install_signal_handler("plot")
+    
     # Configurer le plot avec le préset chargé
     setup_plot()
     
     # Démarrer l'animation
-    ani = FuncAnimation(fig, update, interval=4000, cache_frame_data=False)
+    # Blit : seuls les artistes du pool sont redessinés sur le fond (carte, gateways, zones) en cache
+    animation = FuncAnimation(fig, update, interval=4000, blit=True, cache_frame_data=False)
     plt.show()
@@ -2,6 +2,7 @@ import numpy as np
 from scipy.optimize import minimize
 
 # === Configuration centralisée ===
+from core import config
 from core.config import GATEWAY_POSITIONS
 
 def rssi_to_distance(rssi, tx_power=-59):
@@ -16,43 +17,339 @@ def rssi_to_distance(rssi, tx_power=-59):
     else:
         return 0.89976 * pow(ratio, 7.7095) + 0.111
 
-def trilateration_optim(distances, positions):
+# Compteurs du solveur (solution linéaire acceptée / raffinement itératif,
+# itérations cumulées, échecs ou non-convergence)
+solver_stats = {"fast_path": 0, "refined": 0, "warm_start": 0, "failed": 0, "iterations": 0}
+
+# Dernière position connue de chaque balise (point de départ du raffinement)
+last_positions = {}
+
+def get_solver_stats():
+    """Retourne une copie des compteurs du solveur"""
+    return dict(solver_stats)
+
+def distance_residual(pos, distances, positions):
+    """Erreur RMS entre les distances mesurées et celles d'une position candidate"""
+    P = np.asarray(positions, dtype=float)
+    d = np.asarray(distances, dtype=float)
+    return float(np.sqrt(np.mean((np.linalg.norm(P - pos, axis=1) - d) ** 2)))
+
+def trilateration_linear(distances, positions, z0=0.5):
     """
-    Effectue une trilatération 3D à partir des distances connues et des positions des ESP32.
-    Utilise une optimisation pour minimiser l'erreur sur les distances.
+    Trilatération linéarisée en forme fermée : on soustrait l'équation de la
+    dernière sphère aux autres et on résout le système linéaire aux moindres
+    carrés. Si les gateways sont quasiment à la même hauteur (z non
+    observable), la résolution se fait en 2D avec z fixé à `z0`.
+
+    Returns:
+        position (3,) ou None si le système est dégénéré
     """
-    if len(distances) != len(positions):
-        print(f"[ERREUR] Nombre de distances ({len(distances)}) != nombre de positions ({len(positions)})")
+    P = np.asarray(positions, dtype=float)
+    d = np.asarray(distances, dtype=float)
+    if len(P) < 3:
         return None
-    
-    if len(distances) < 3:
-        print(f"[ERREUR] Pas assez de points pour trilatération ({len(distances)} < 3)")
+
+    if len(P) >= 4 and np.ptp(P[:, 2]) > 0.5:
+        dims = 3
+        d2 = d ** 2
+        coords = P
+    else:
+        # Projection sur le plan z = z0 : rayon horizontal de chaque sphère
+        dims = 2
+        d2 = np.maximum(d ** 2 - (z0 - P[:, 2]) ** 2, 0.0)
+        coords = P[:, :2]
+
+    ref, ref_d2 = coords[-1], d2[-1]
+    A = 2.0 * (coords[:-1] - ref)
+    b = ref_d2 - d2[:-1] + (coords[:-1] ** 2).sum(axis=1) - (ref ** 2).sum()
+    solution, _, rank, _ = np.linalg.lstsq(A, b, rcond=None)
+    if rank < dims:
         return None
-    
+    return solution if dims == 3 else np.array([solution[0], solution[1], z0])
+
+def _solve_position(distances, positions, bounds, beacon_name=None, mode=None):
+    """
+    Résout une position : solution linéaire d'abord, raffinement L-BFGS-B
+    seulement si son erreur dépasse SOLVER_RESIDUAL_THRESHOLD. Le raffinement
+    part de la dernière position connue de la balise si elle est meilleure.
+
+    Returns:
+        (position, fast_path) ou (None, False)
+    """
+    mode = mode or config.SOLVER_MODE
+    lower = np.array([lo for lo, _ in bounds], dtype=float)
+    upper = np.array([hi for _, hi in bounds], dtype=float)
+
+    x0 = np.array([
+        np.mean([p[0] for p in positions]),
+        np.mean([p[1] for p in positions]),
+        0.5,  # Hauteur estimée du beacon
+    ])
+
+    if mode == "fast":
+        estimate = trilateration_linear(distances, positions)
+        if estimate is not None:
+            estimate = np.clip(estimate, lower, upper)
+            if distance_residual(estimate, distances, positions) <= config.SOLVER_RESIDUAL_THRESHOLD:
+                solver_stats["fast_path"] += 1
+                if beacon_name is not None:
+                    last_positions[beacon_name] = estimate
+                return estimate, True
+            x0 = estimate
+
+        previous = last_positions.get(beacon_name)
+        if previous is not None:
+            previous = np.clip(previous, lower, upper)
+            if distance_residual(previous, distances, positions) < distance_residual(x0, distances, positions):
+                x0 = previous
+                solver_stats["warm_start"] += 1
+
     def loss(pos):
         x, y, z = pos
-        error = sum(
+        return sum(
             (np.sqrt((x - xi)**2 + (y - yi)**2 + (z - zi)**2) - di)**2
             for (xi, yi, zi), di in zip(positions, distances)
         )
-        return error
 
-    x0 = np.mean([p[0] for p in positions])
-    y0 = np.mean([p[1] for p in positions])
-    z0 = 0.5  # Hauteur estimée du beacon
+    result = minimize(loss, x0, method='L-BFGS-B', bounds=bounds)
+    solver_stats["iterations"] += result.nit
+    if not result.success:
+        solver_stats["failed"] += 1
+        return None, False
+
+    solver_stats["refined"] += 1
+    if beacon_name is not None:
+        last_positions[beacon_name] = result.x
+    return result.x, False
 
-    bounds = [(0, 20), (0, 11), (0, 3)]  # Adapté à ton plan (voir map)
+def rssi_to_distance_array(rssi, tx_power=-59):
+    """
+    Version vectorisée de `rssi_to_distance` pour un tableau de RSSI.
+    """
+    rssi = np.asarray(rssi, dtype=float)
+    ratio = rssi / tx_power
+    with np.errstate(invalid="ignore"):
+        distance = np.where(ratio < 1.0, ratio ** 10, 0.89976 * ratio ** 7.7095 + 0.111)
+    return np.where(rssi == 0, -1.0, distance)
+
+def distance_to_rssi_array(distance, tx_power=-59):
+    """
+    Inverse de `rssi_to_distance_array` : RSSI attendu à une distance donnée
+    (simulation de cartes radio). Le palier entre les deux branches du modèle
+    (1 m à 1.011 m) est ramené à un RSSI égal à `tx_power`.
+    """
+    distance = np.maximum(np.asarray(distance, dtype=float), 1e-6)
+    near = distance ** 0.1
+    far = (np.maximum(distance - 0.111, 1e-6) / 0.89976) ** (1 / 7.7095)
+    ratio = np.where(distance < 1.0, near, np.maximum(far, 1.0))
+    return ratio * tx_power
+
+def trilateration_optim(distances, positions, beacon_name=None, bounds=None):
+    """
+    Effectue une trilatération 3D à partir des distances connues et des positions des ESP32.
+    Utilise la solution linéaire quand elle est assez précise, sinon une optimisation
+    pour minimiser l'erreur sur les distances.
+    """
+    if len(distances) != len(positions):
+        print(f"[ERREUR] Nombre de distances ({len(distances)}) != nombre de positions ({len(positions)})")
+        return None
     
-    from scipy.optimize import minimize
-    result = minimize(loss, (x0, y0, z0), method='L-BFGS-B', bounds=bounds)
+    if len(distances) < 3:
+        print(f"[ERREUR] Pas assez de points pour trilatération ({len(distances)} < 3)")
+        return None
+
+    if bounds is None:
+        bounds = [(0, 20), (0, 11), (0, 3)]  # Adapté à ton plan (voir map)
+
+    position, fast_path = _solve_position(distances, positions, bounds, beacon_name)
     
-    if result.success:
-        print(f"[TRILATERATION] ✅ Succès: position = ({result.x[0]:.2f}, {result.x[1]:.2f}, {result.x[2]:.2f})")
-        return result.x
+    if position is not None:
+        path = "linéaire" if fast_path else "itératif"
+        print(f"[TRILATERATION] ✅ Succès ({path}): position = ({position[0]:.2f}, {position[1]:.2f}, {position[2]:.2f})")
+        return position
     else:
-        print(f"[TRILATERATION] ❌ Échec: {result.message}")
+        print(f"[TRILATERATION] ❌ Échec de l'optimisation")
         return None
 
+def trilateration_linear_batch(distances, mask, gateway_positions, z0=0.5):
+    """
+    Version vectorisée de `trilateration_linear` pour N balises (gateways
+    valides de chaque balise selon `mask`, sphère de référence : le dernier
+    gateway valide).
+
+    Args:
+        distances: (N, M) distances balise → gateway
+        mask: (N, M) booléens, True si la distance est exploitable
+        gateway_positions: (M, 3) ou (N, M, 3)
+
+    Returns:
+        positions (N, 3), NaN si le système d'une balise est dégénéré
+    """
+    m = np.asarray(mask, dtype=bool)
+    d = np.where(m, np.asarray(distances, dtype=float), 0.0)
+    n_beacons, n_gateways = d.shape
+    gw = np.broadcast_to(np.asarray(gateway_positions, dtype=float), (n_beacons, n_gateways, 3))
+    w = m.astype(float)
+    count = m.sum(axis=1)
+    ref = n_gateways - 1 - np.argmax(m[:, ::-1], axis=1)
+    rows = np.arange(n_beacons)
+
+    def solve(coords, d2):
+        # Équations des sphères moins celle de référence (lignes masquées nulles)
+        ref_coords, ref_d2 = coords[rows, ref], d2[rows, ref]
+        A = 2.0 * (coords - ref_coords[:, None, :]) * w[..., None]
+        b = (ref_d2[:, None] - d2 + (coords ** 2).sum(axis=2) - (ref_coords ** 2).sum(axis=1)[:, None]) * w
+        solution = (np.linalg.pinv(A) @ b[..., None])[..., 0]
+        return solution, np.linalg.matrix_rank(A) == coords.shape[2]
+
+    planar, planar_ok = solve(gw[..., :2], np.maximum(d ** 2 - (z0 - gw[..., 2]) ** 2, 0.0))
+    spatial, spatial_ok = solve(gw, d ** 2)
+    z = np.where(m, gw[..., 2], np.nan)
+    with np.errstate(invalid="ignore"):
+        spread = np.nanmax(z, axis=1, initial=-np.inf) - np.nanmin(z, axis=1, initial=np.inf)
+    use_3d = (count >= 4) & (spread > 0.5)
+
+    x = np.column_stack([planar, np.full(n_beacons, z0)])
+    x[use_3d] = spatial[use_3d]
+    x[~np.where(use_3d, spatial_ok, planar_ok) | (count < 3)] = np.nan
+    return x
+
+def trilateration_batch(distances, mask, gateway_positions, bounds=None, x0=None,
+                        min_gateways=3, max_iter=50, tol=1e-4, z0=0.5, distance_fn=None,
+                        mode=None, residual_threshold=None):
+    """
+    Trilatération 3D de N balises en un seul appel (Levenberg-Marquardt vectorisé).
+
+    Args:
+        distances: (N, M) distances estimées balise → gateway
+        mask: (N, M) booléens, True si la distance est exploitable
+        gateway_positions: (M, 3) positions des gateways, ou (N, M, 3) par balise
+        bounds: (3, 2) bornes [min, max] sur x, y, z, ou (N, 3, 2) par balise
+                (ex. l'extent de l'étage de chaque balise)
+        x0: (N, 3) positions précédentes pour le départ à chaud (lignes NaN : aucune)
+        min_gateways: nombre minimal de gateways valides par balise
+        distance_fn: optionnel, `distance_fn(pos) -> (N, M)` distances qui
+                     dépendent de la position courante (ex. RSSI corrigé de
+                     l'atténuation du trajet), réévaluées à chaque itération.
+                     Leur dérivée est négligée dans le jacobien.
+        mode: "fast" (défaut : SOLVER_MODE) : solution linéaire en forme
+              fermée, acceptée sans itération si son erreur RMS ne dépasse
+              pas `residual_threshold` (SOLVER_RESIDUAL_THRESHOLD) et que les
+              distances ne dépendent pas de la position (`distance_fn`) ;
+              sinon elle sert de départ, comme `x0` s'il est meilleur.
+              "optim" : toujours itératif, départ `x0` ou barycentre.
+
+    Returns:
+        (positions, residuals) : positions (N, 3) et erreur RMS sur les
+        distances (N,). NaN pour les balises sans assez de gateways.
+    """
+    d = np.asarray(distances, dtype=float)
+    m = np.asarray(mask, dtype=bool) & np.isfinite(d) & (d >= 0)
+    n_beacons, n_gateways = d.shape
+    gw = np.broadcast_to(np.asarray(gateway_positions, dtype=float), (n_beacons, n_gateways, 3))
+    d = np.where(m, d, 0.0)
+    w = m.astype(float)
+
+    if bounds is None:
+        bounds = [(0, 20), (0, 11), (0, 3)]
+    b = np.broadcast_to(np.asarray(bounds, dtype=float), (n_beacons, 3, 2))
+    lower, upper = b[..., 0], b[..., 1]
+
+    count = w.sum(axis=1)
+    solvable = count >= min_gateways
+
+    safe_count = np.maximum(count, 1)[:, None]
+    x = np.empty((n_beacons, 3))
+    x[:, :2] = (gw[..., :2] * w[..., None]).sum(axis=1) / safe_count
+    x[:, 2] = z0
+    x = np.clip(x, lower, upper)
+    previous = None
+    if x0 is not None:
+        # Départ à chaud : lignes NaN = pas de position précédente
+        previous = np.clip(np.asarray(x0, dtype=float), lower, upper)
+
+    def rms(pos):
+        norm = np.sqrt(((pos[:, None, :] - gw) ** 2).sum(axis=2))
+        return np.sqrt(((norm - d) ** 2 * w).sum(axis=1) / np.maximum(count, 1))
+
+    fast = np.zeros(n_beacons, dtype=bool)
+    if (mode or config.SOLVER_MODE) == "fast":
+        linear = np.clip(trilateration_linear_batch(d, m, gw, z0), lower, upper)
+        has_linear = solvable & np.isfinite(linear).all(axis=1)
+        x[has_linear] = linear[has_linear]
+        if distance_fn is None:
+            threshold = config.SOLVER_RESIDUAL_THRESHOLD if residual_threshold is None else residual_threshold
+            fast = has_linear & (rms(x) <= threshold)
+            solver_stats["fast_path"] += int(fast.sum())
+        if previous is not None:
+            # Position précédente retenue si elle explique mieux les distances
+            candidate = np.where(np.isnan(previous), x, previous)
+            warm = solvable & ~fast & np.isfinite(previous).all(axis=1) & (rms(candidate) < rms(x))
+            x[warm] = previous[warm]
+            solver_stats["warm_start"] += int(warm.sum())
+    elif previous is not None:
+        x = np.where(np.isnan(previous), x, previous)
+
+    def residuals_and_jacobian(pos, rows):
+        diff = pos[:, None, :] - gw[rows]                 # (n, M, 3)
+        norm = np.sqrt((diff ** 2).sum(axis=2))           # (n, M)
+        safe_norm = np.maximum(norm, 1e-9)
+        if distance_fn is None:
+            target = d[rows]
+        else:
+            current = x.copy()
+            current[rows] = pos
+            target = np.where(m[rows], distance_fn(current)[rows], 0.0)
+        r = (norm - target) * w[rows]                     # résidus masqués
+        J = diff / safe_norm[..., None] * w[rows][..., None]  # ∂r/∂pos analytique
+        return r, J
+
+    r, _ = residuals_and_jacobian(x, slice(None))
+    cost = (r ** 2).sum(axis=1)
+
+    # Itérations limitées aux balises à raffiner (solution linéaire acceptée : déjà résolues)
+    rows = np.flatnonzero(solvable & ~fast)
+    xs, low, up = x[rows], lower[rows], upper[rows]
+    rs, Js = residuals_and_jacobian(xs, rows)
+    costs = cost[rows]
+    lam = np.full(len(rows), 1e-2)
+    active = np.ones(len(rows), dtype=bool)
+    eye = np.eye(3)
+
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        if not active.any():
+            iterations -= 1
+            break
+        JtJ = np.einsum("nmi,nmj->nij", Js, Js)
+        grad = np.einsum("nmi,nm->ni", Js, rs)
+        A = JtJ + lam[:, None, None] * (JtJ * eye + 1e-9 * eye)
+        step = -np.linalg.solve(A, grad[..., None])[..., 0]
+        candidate = np.clip(xs + step, low, up)
+
+        r_new, J_new = residuals_and_jacobian(candidate, rows)
+        cost_new = (r_new ** 2).sum(axis=1)
+        accept = active & (cost_new < costs)
+        moved = np.abs(candidate - xs).max(axis=1)  # pas effectif après projection sur les bornes
+
+        xs[accept] = candidate[accept]
+        rs[accept], Js[accept], costs[accept] = r_new[accept], J_new[accept], cost_new[accept]
+        lam = np.where(accept, lam * 0.3, lam * 10.0)
+        if distance_fn is not None:
+            x[rows] = xs  # positions courantes des autres balises pour distance_fn
+
+        # Convergé : pas négligeable, ou plus aucune amélioration possible
+        active &= ~((moved < tol) | (lam > 1e8))
+
+    x[rows], cost[rows] = xs, costs
+    solver_stats["iterations"] += iterations
+    solver_stats["failed"] += int(active.sum())  # encore actives après max_iter : non convergées
+    solver_stats["refined"] += int((~active).sum())
+    residuals = np.sqrt(cost / np.maximum(count, 1))
+    x[~solvable] = np.nan
+    residuals[~solvable] = np.nan
+    return x, residuals
+
 def apply_proximity_bonus(distances, filtered_rssi, gateway_positions=None, threshold=1.0, max_bonus_db=3):
     """
     Ajoute un bonus au RSSI si la distance entre beacon et ESP est très courte.
@@ -67,7 +364,7 @@ def apply_proximity_bonus(distances, filtered_rssi, gateway_positions=None, thre
             adjusted[gw_name] += bonus
     return adjusted
 
-def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_threshold=1.5):
+def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_threshold=1.5, verbose=True):
     """
     Détermine sur quel étage se trouve une balise basé sur la force du signal RSSI.
     
@@ -76,10 +373,12 @@ def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_t
         config_floors: Configuration des étages
         rssi_threshold: Différence RSSI minimale pour forcer un étage (dB)
         ratio_threshold: Ratio minimal de force de signal
+        verbose: Afficher le détail de la décision
     
     Returns:
         floor_idx ou None si pas de détection claire
     """
+    log = print if verbose else (lambda *args, **kwargs: None)
     floor_strengths = {}
     
     # Calculer la force moyenne de chaque étage
@@ -116,8 +415,8 @@ def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_t
     best_floor, best_data = sorted_floors[0]
     second_floor, second_data = sorted_floors[1]
     
-    print(f"[FLOOR_DETECT] Étage {best_floor}: score={best_data['score']:.1f}, max_rssi={best_data['max_rssi']:.1f}")
-    print(f"[FLOOR_DETECT] Étage {second_floor}: score={second_data['score']:.1f}, max_rssi={second_data['max_rssi']:.1f}")
+    log(f"[FLOOR_DETECT] Étage {best_floor}: score={best_data['score']:.1f}, max_rssi={best_data['max_rssi']:.1f}")
+    log(f"[FLOOR_DETECT] Étage {second_floor}: score={second_data['score']:.1f}, max_rssi={second_data['max_rssi']:.1f}")
     
     # Vérifications pour forcer un étage
     rssi_diff = best_data['max_rssi'] - second_data['max_rssi']
@@ -125,12 +424,12 @@ def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_t
     
     # Cas 1: Signal beaucoup plus fort sur un étage
     if rssi_diff >= rssi_threshold:
-        print(f"[FLOOR_DETECT] ✅ Étage {best_floor} sélectionné (diff RSSI: {rssi_diff:.1f} dB)")
+        log(f"[FLOOR_DETECT] ✅ Étage {best_floor} sélectionné (diff RSSI: {rssi_diff:.1f} dB)")
         return best_floor
     
     # Cas 2: Score significativement meilleur
     if score_ratio >= ratio_threshold:
-        print(f"[FLOOR_DETECT] ✅ Étage {best_floor} sélectionné (ratio score: {score_ratio:.1f})")
+        log(f"[FLOOR_DETECT] ✅ Étage {best_floor} sélectionné (ratio score: {score_ratio:.1f})")
         return best_floor
     
     # Cas 3: ESP32 unique à l'étage avec signal fort
@@ -138,13 +437,13 @@ def detect_floor_from_rssi(floor_data, config_floors, rssi_threshold=15, ratio_t
         floor_config = config_floors[floor_idx] if floor_idx < len(config_floors) else None
         if floor_config and len(floor_config['gateway_positions']) == 1:  # Étage avec 1 seul ESP32
             if data['max_rssi'] > -50:  # Signal très fort (proche)
-                print(f"[FLOOR_DETECT] ✅ Étage {floor_idx} sélectionné (ESP unique + signal fort: {data['max_rssi']:.1f})")
+                log(f"[FLOOR_DETECT] ✅ Étage {floor_idx} sélectionné (ESP unique + signal fort: {data['max_rssi']:.1f})")
                 return floor_idx
     
-    print(f"[FLOOR_DETECT] ⚠️  Pas de détection claire, étage par défaut: {best_floor}")
+    log(f"[FLOOR_DETECT] ⚠️  Pas de détection claire, étage par défaut: {best_floor}")
     return best_floor
 
-def trilateration_multifloor(floor_data, config_floors, beacon_name, force_floor=None):
+def trilateration_multifloor(floor_data, config_floors, beacon_name, force_floor=None, filtered_data=None):
     """
     Trilatération intelligente multi-étages avec sélection automatique d'étage.
     
@@ -153,6 +452,8 @@ def trilateration_multifloor(floor_data, config_floors, beacon_name, force_floor
         config_floors: Configuration des étages
         beacon_name: Nom de la balise (pour debug)
         force_floor: Forcer un étage spécifique (None = auto)
+        filtered_data: {floor_idx: {gateway: [rssi_filtrés]}} déjà filtrés en continu
+                       (Kalman + Butterworth, cf. StreamState) ; None = filtrer `floor_data` ici
     
     Returns:
         (floor_idx, position_3d) ou (None, None)
@@ -170,8 +471,11 @@ def trilateration_multifloor(floor_data, config_floors, beacon_name, force_floor
         for gw, values in gateways_data.items():
             if len(values) >= 3:  # Minimum de valeurs
                 from core.filters import apply_kalman_filter, apply_butterworth_filter
-                kalman_values = apply_kalman_filter(values[-10:])
-                butter_values = apply_butterworth_filter(kalman_values)
+                if filtered_data is not None:
+                    butter_values = list(filtered_data[floor_idx][gw])
+                else:
+                    kalman_values = apply_kalman_filter(values[-10:])
+                    butter_values = apply_butterworth_filter(kalman_values)
                 filtered_rssi[gw] = np.mean(butter_values[-5:])
         
         if len(filtered_rssi) >= 1:  # Au moins 1 gateway
@@ -211,23 +515,11 @@ def trilateration_multifloor(floor_data, config_floors, beacon_name, force_floor
     extent = floor_config['extent']
     bounds = [(extent[0], extent[1]), (extent[2], extent[3]), (0, 3)]
     
-    def loss(pos):
-        x, y, z = pos
-        return sum(
-            (np.sqrt((x - xi)**2 + (y - yi)**2 + (z - zi)**2) - di)**2
-            for (xi, yi, zi), di in zip(positions, distances)
-        )
-
-    x0 = np.mean([p[0] for p in positions])
-    y0 = np.mean([p[1] for p in positions])
-    z0 = 0.5
-    
-    from scipy.optimize import minimize
-    result = minimize(loss, (x0, y0, z0), method='L-BFGS-B', bounds=bounds)
+    position, _ = _solve_position(distances, positions, bounds, beacon_name)
     
-    if result.success:
-        print(f"[TRILATERATION] {beacon_name}: Position trouvée sur étage {selected_floor}: ({result.x[0]:.2f}, {result.x[1]:.2f})")
-        return selected_floor, result.x
+    if position is not None:
+        print(f"[TRILATERATION] {beacon_name}: Position trouvée sur étage {selected_floor}: ({position[0]:.2f}, {position[1]:.2f})")
+        return selected_floor, position
     else:
         print(f"[TRILATERATION] {beacon_name}: Échec trilatération sur étage {selected_floor}")
         return selected_floor, None
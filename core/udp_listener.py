@@ -0,0 +1,164 @@
+import socket
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from core import config
+from core import server
+
+# Ingestion UDP pour les grandes flottes de gateways : chaque datagramme porte
+# un en-tête fixe suivi d'un ou plusieurs enregistrements binaires de taille
+# fixe, décodés d'un bloc avec np.frombuffer vers le format de mesure interne
+# du serveur (mêmes alias, même journal, même tampon partagé).
+#
+#   En-tête (6 octets)     : magic b"BL", version (u1), réservé (u1), nombre d'enregistrements (u2)
+#   Enregistrement (44 o.) : gateway (16 o.), balise ou MAC (16 o.), horodatage epoch (f8),
+#                            rssi (i2), médiane (i2) — petit-boutiste, chaînes complétées par des zéros
+
+UDP_MAGIC = b"BL"
+UDP_VERSION = 1
+UDP_HEADER = struct.Struct("<2sBxH")
+
+UDP_RECORD_DTYPE = np.dtype([
+    ("gateway", "S16"),
+    ("beacon", "S16"),
+    ("timestamp", "<f8"),   # epoch UTC (0 : horodatage de réception)
+    ("rssi", "<i2"),
+    ("median", "<i2"),
+])
+
+MAX_DATAGRAM = 65507
+MAX_RECORDS = (MAX_DATAGRAM - UDP_HEADER.size) // UDP_RECORD_DTYPE.itemsize
+
+
+def encode_datagram(readings):
+    """
+    Encode une liste de relevés {gateway_id, beacon_name, rssi, median,
+    timestamp optionnel} en un datagramme (côté gateway, bancs de test).
+    """
+    if len(readings) > MAX_RECORDS:
+        raise ValueError(f"Au plus {MAX_RECORDS} enregistrements par datagramme")
+    records = np.zeros(len(readings), dtype=UDP_RECORD_DTYPE)
+    records["gateway"] = [str(r["gateway_id"]).encode("utf-8")[:16] for r in readings]
+    records["beacon"] = [str(r["beacon_name"]).encode("utf-8")[:16] for r in readings]
+    records["timestamp"] = [r.get("timestamp", 0) for r in readings]
+    records["rssi"] = [r["rssi"] for r in readings]
+    records["median"] = [r.get("median", r["rssi"]) for r in readings]
+    return UDP_HEADER.pack(UDP_MAGIC, UDP_VERSION, len(readings)) + records.tobytes()
+
+
+def reading_time(timestamp, received):
+    """
+    "time" d'un relevé en ISO 8601 UTC, comme à l'ingestion HTTP. Horodatage
+    nul ou hors des dates représentables (NaN, infini, millisecondes...) :
+    instant de réception.
+    """
+    if not timestamp:
+        return received
+    try:
+        return datetime.utcfromtimestamp(timestamp).isoformat()
+    except (ValueError, OverflowError, OSError):
+        return received
+
+
+def decode_datagram(data):
+    """
+    Décode un datagramme en mesures au format du serveur.
+    Lève ValueError si l'en-tête ou la taille est incohérent.
+    """
+    if len(data) < UDP_HEADER.size:
+        raise ValueError("Datagramme trop court")
+    magic, version, count = UDP_HEADER.unpack_from(data)
+    if magic != UDP_MAGIC or version != UDP_VERSION:
+        raise ValueError(f"En-tête inconnu ({magic!r}, v{version})")
+    if len(data) != UDP_HEADER.size + count * UDP_RECORD_DTYPE.itemsize:
+        raise ValueError(f"Taille incohérente pour {count} enregistrement(s)")
+
+    records = np.frombuffer(data, dtype=UDP_RECORD_DTYPE, count=count, offset=UDP_HEADER.size)
+    received = datetime.utcnow().isoformat()
+    entries = []
+    for gateway, beacon, timestamp, rssi, median in zip(
+        records["gateway"].tolist(), records["beacon"].tolist(), records["timestamp"].tolist(),
+        records["rssi"].tolist(), records["median"].tolist(),
+    ):
+        if not gateway or not beacon:
+            continue
+        beacon_name = beacon.decode("utf-8", "replace")
+        entries.append({
+            "time": reading_time(timestamp, received),
+            "beacon": server.BEACON_ALIASES.get(beacon_name.upper(), beacon_name),
+            "rssi": rssi,
+            "median": median,
+            "source": gateway.decode("utf-8", "replace"),
+        })
+    return entries
+
+
+class UdpListener:
+    """Réception UDP dans un thread dédié, à côté du serveur HTTP."""
+
+    def __init__(self, host=None, port=None, stats_interval=None):
+        self.host = host or config.SERVER_HOST
+        self.port = port or config.UDP_PORT
+        self.stats_interval = stats_interval or config.SERVER_STATS_INTERVAL
+        self.datagrams = 0
+        self.readings = 0
+        self.malformed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.sock = None
+        self._thread = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((self.host, self.port))
+        self._thread = threading.Thread(target=self.run, name="udp-listener", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Écoute UDP sur {self.host}:{self.port} ({UDP_RECORD_DTYPE.itemsize} octets par relevé)")
+        return self
+
+    def handle(self, data):
+        """Traite un datagramme. Retourne le nombre de mesures acceptées."""
+        self.datagrams += 1
+        try:
+            entries = decode_datagram(data)
+        except ValueError:
+            self.malformed += 1
+            return 0
+        # Pas de réponse possible en UDP : un lot qui ne tient pas dans la file est abandonné
+        if server.submit_entries(entries) != 200:
+            self.dropped += len(entries)
+            return 0
+        self.readings += len(entries)
+        return len(entries)
+
+    def run(self):
+        buffer = bytearray(MAX_DATAGRAM)
+        view = memoryview(buffer)
+        last_report = time.monotonic()
+        while True:
+            try:
+                size, _ = self.sock.recvfrom_into(buffer)
+            except OSError:
+                return  # socket fermée
+            try:
+                self.handle(view[:size])  # décodé en objets Python avant la réception suivante
+            except Exception as e:
+                # Un datagramme ne doit jamais arrêter la réception
+                self.errors += 1
+                print(f"[ERREUR] Datagramme UDP non traité : {e}")
+
+            now = time.monotonic()
+            if now - last_report >= self.stats_interval:
+                last_report = now
+                print(f"[UDP] datagrammes: {self.datagrams} | relevés: {self.readings} | "
+                      f"rejetés: {self.dropped} | invalides: {self.malformed} | erreurs: {self.errors}")
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
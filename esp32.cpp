@@ -10,6 +10,7 @@
 
 // === CONFIGURATION ===
 const int RSSI_WINDOW_SIZE = 7;
+const size_t BEACON_NAME_MAX_LEN = 32; // Place réservée par nom de balise copié dans le lot JSON
 const unsigned long SEND_INTERVAL = 5000; // Envoi toutes les 5 secondes
 const unsigned long MAX_DATA_AGE = 30000; // 30 secondes max pour les données
 const char* WIFI_SSID = "IT_Staff";
@@ -105,27 +106,45 @@ int computeMedian(const std::vector<RSSIData>& values) {
   return (n % 2 == 0) ? (rssi_values[n/2 - 1] + rssi_values[n/2]) / 2 : rssi_values[n/2];
 }
 
-// === Envoi au serveur modifié ===
-void sendToServer(String mac, int rssi, int median) {
+// === Envoi au serveur : un seul POST par lot de relevés ===
+void sendBatchToServer() {
   if (WiFi.status() != WL_CONNECTED) return;
 
+  // Document dimensionné sur le nombre de balises suivies : un StaticJsonDocument
+  // fixe tronquerait le lot sans erreur au-delà d'une dizaine de relevés
+  const size_t count = rssiHistory.size();
+  const size_t capacity = JSON_OBJECT_SIZE(2) + JSON_ARRAY_SIZE(count)
+                        + count * (JSON_OBJECT_SIZE(4) + BEACON_NAME_MAX_LEN);
+  DynamicJsonDocument doc(capacity);
+  doc["gateway_id"] = "esp32_1";
+  JsonArray readings = doc.createNestedArray("readings");
+
+  for (auto const& entry : rssiHistory) {
+    String mac = entry.first;
+    const std::vector<RSSIData>& history = entry.second;
+    if (history.empty()) continue;
+
+    JsonObject reading = readings.createNestedObject();
+    reading["beacon_name"] = getBeaconName(mac);
+    reading["rssi"] = history.back().rssi;  // Dernier RSSI connu
+    reading["median"] = computeMedian(history);
+    reading["timestamp"] = millis();
+  }
+  if (readings.size() == 0) return;
+  if (doc.overflowed()) {
+    Serial.printf("Lot non envoyé : document JSON trop petit (%u octets)\n", (unsigned) capacity);
+    return;
+  }
+
   HTTPClient http;
   http.begin(SERVER_URL);
   http.addHeader("Content-Type", "application/json");
 
-  StaticJsonDocument<256> doc;
-  doc["gateway_id"] = "esp32_1";
-  doc["beacon_name"] = getBeaconName(mac);
-  doc["rssi"] = rssi;
-  doc["median"] = median;
-  doc["timestamp"] = millis();
-
   String payload;
   serializeJson(doc, payload);
 
   int code = http.POST(payload);
-  Serial.printf("POST → %s | RSSI: %d | Médiane: %d | Historique: %d | Code: %d\n", 
-                getBeaconName(mac).c_str(), rssi, median, rssiHistory[mac].size(), code);
+  Serial.printf("POST → %d relevé(s) | Code: %d\n", readings.size(), code);
   http.end();
 }
 
@@ -160,17 +179,7 @@ void loop() {
   unsigned long now = millis();
   if (now - lastSendTime >= SEND_INTERVAL) {
     lastSendTime = now;
-
-    for (auto const& entry : rssiHistory) {
-      String mac = entry.first;
-      const std::vector<RSSIData>& history = entry.second;
-      
-      if (!history.empty()) {
-        int median = computeMedian(history);
-        int latestRssi = history.back().rssi;  // Dernier RSSI connu
-        sendToServer(mac, latestRssi, median);
-      }
-    }
+    sendBatchToServer();
   }
 
   delay(100);
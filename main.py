@@ -1,19 +1,28 @@
 import multiprocessing
 from multiprocessing import Process
 import os
+import sys
 import time
-import json
 from core import server
 from core import trilateration_plot
-from core.config import load_preset
+from core.config import load_preset, LOG_DIR, BEACONS_DIR
+from core.storage import reset_log, reset_beacon_store
+from core.shared_ring import MeasurementRing
 from core.presets import get_available_presets, get_preset_info, validate_preset
 
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
-DATA_FILE = os.path.join(DATA_DIR, "data.json")
 
-# Liste des beacons pour créer les fichiers individuels
-BEACON_LIST = ["balise_1", "balise_2", "balise_4", "balise_5"]
+# python main.py --headless : positionnement sans fenêtre matplotlib
+HEADLESS = "--headless" in sys.argv
+# python main.py --asyncio : frontal d'ingestion asyncio au lieu du serveur Flask
+SERVER_BACKEND = "asyncio" if "--asyncio" in sys.argv else None
+# python main.py --udp : écoute UDP des enregistrements binaires en plus du HTTP
+UDP_ENABLED = True if "--udp" in sys.argv else None
+# python main.py --workers N : stockage réparti sur N processus (shards par balise)
+INGEST_WORKERS = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+# python main.py --positions : le serveur calcule aussi les positions (/positions, /positions/stream)
+SERVER_POSITIONS = True if "--positions" in sys.argv else None
 
 def select_preset():
     """Interface de sélection du préset"""
@@ -66,23 +75,13 @@ def select_preset():
             return None
 
 def clear_data_file():
-    try:
-        with open(DATA_FILE, "w") as f:
-            f.write("[]")
-        print(f"[INFO] Fichier data.json réinitialisé.")
-    except Exception as e:
-        print(f"[ERREUR] Impossible de vider {DATA_FILE} : {e}")
+    reset_log(LOG_DIR)
+    print(f"[INFO] Journal {LOG_DIR} réinitialisé.")
 
-def create_beacon_files():
-    """Créer un fichier JSON vide pour chaque beacon"""
-    for beacon in BEACON_LIST:
-        beacon_file = os.path.join(DATA_DIR, f"{beacon}.json")
-        try:
-            with open(beacon_file, "w") as f:
-                json.dump([], f, indent=2)
-            print(f"[INFO] Fichier {beacon}.json créé/réinitialisé.")
-        except Exception as e:
-            print(f"[ERREUR] Impossible de créer {beacon_file} : {e}")
+def clear_beacon_partitions():
+    """Vider les partitions de segments de chaque balise"""
+    reset_beacon_store(BEACONS_DIR)
+    print(f"[INFO] Partitions {BEACONS_DIR} réinitialisées.")
 
 if __name__ == '__main__':
     try:
@@ -110,18 +109,28 @@ if __name__ == '__main__':
 
     # === INITIALISATION ===
     clear_data_file()
-    create_beacon_files()
+    clear_beacon_partitions()
 
     try:
+        # Tampon partagé serveur → plot (créé avant les processus qui s'y attachent)
+        ring = MeasurementRing.create()
+        print(f"[INFO] Mémoire partagée '{ring.shm.name}' créée ({ring.capacity} mesures).")
+
         # Lancer le serveur
-        p1 = Process(target=server.start_server, daemon=True)
+        # Un processus démon ne peut pas lancer les workers des shards : il est alors arrêté dans le finally
+        p1 = Process(target=server.start_server, args=(SERVER_BACKEND, UDP_ENABLED, INGEST_WORKERS, SERVER_POSITIONS),
+                     daemon=not (INGEST_WORKERS and INGEST_WORKERS > 1))
         p1.start()
         print("[INFO] Serveur lancé.")
 
         time.sleep(1)
 
-        # Choisir le bon type de plot
-        if is_multifloor:
+        # Choisir le bon type de plot (ou le moteur seul en mode headless)
+        if HEADLESS:
+            from core import engine
+            p2 = Process(target=engine.start_headless, daemon=True)
+            print("[INFO] Moteur de positionnement headless lancé.")
+        elif is_multifloor:
             from core import multifloor_plot
             p2 = Process(target=multifloor_plot.start_multifloor, daemon=True)
             print("[INFO] Plot multi-étages lancé.")
@@ -150,13 +159,10 @@ if __name__ == '__main__':
             p2.terminate()
             p2.join()
 
+        if 'ring' in locals():
+            ring.close()
+
         clear_data_file()
-        for beacon in BEACON_LIST:
-            beacon_file = os.path.join(DATA_DIR, f"{beacon}.json")
-            try:
-                with open(beacon_file, "w") as f:
-                    json.dump([], f, indent=2)
-            except:
-                pass
+        clear_beacon_partitions()
         
         print("[INFO] Fin du programme.")
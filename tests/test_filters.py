@@ -0,0 +1,110 @@
+"""
+Les banques de filtres par flux doivent reproduire le filtrage d'un flux
+isolé : `KalmanFilterBank` ↔ `apply_kalman_filter`, `ButterworthStreamBank`
+↔ `sosfilt` causal démarré en régime établi, `RunningMedian` ↔ médiane
+naïve de la fenêtre.
+"""
+import random
+import statistics
+
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+from core.filters import (
+    ButterworthStreamBank, KalmanFilterBank, RunningMedian, RunningMedianBank,
+    apply_kalman_filter, butterworth_sos,
+)
+
+
+def interleaved_streams(streams=12, samples=60, seed=0):
+    """(clés, valeurs) entrelacées dans un ordre aléatoire, et {clé: valeurs} dans l'ordre de chaque flux"""
+    rng = random.Random(seed)
+    order = [key for key in range(streams) for _ in range(samples)]
+    rng.shuffle(order)
+    keys = [(f"balise_{key}", f"gw_{key % 3}") for key in order]
+    values = [rng.gauss(-70, 6) for _ in keys]
+    per_stream = {}
+    for key, value in zip(keys, values):
+        per_stream.setdefault(key, []).append(value)
+    return keys, values, per_stream
+
+
+def bank_outputs(bank, keys, values, batch=25):
+    """Passe les échantillons à la banque par lots (plusieurs par flux possibles). Retourne {clé: sorties}"""
+    outputs = {}
+    for start in range(0, len(keys), batch):
+        batch_keys = keys[start:start + batch]
+        filtered = bank.update(batch_keys, values[start:start + batch])
+        for key, value in zip(batch_keys, filtered.tolist()):
+            outputs.setdefault(key, []).append(value)
+    return outputs
+
+
+def butterworth_reference(values, order=2, cutoff=0.1):
+    sos = butterworth_sos(order, cutoff)
+    return sosfilt(sos, values, zi=sosfilt_zi(sos) * values[0])[0].tolist()
+
+
+def test_kalman_bank_matches_per_stream_filter():
+    keys, values, per_stream = interleaved_streams()
+    outputs = bank_outputs(KalmanFilterBank(capacity=4), keys, values)
+    for key, stream in per_stream.items():
+        np.testing.assert_allclose(outputs[key], apply_kalman_filter(stream), rtol=0, atol=1e-9)
+
+
+def test_kalman_bank_discard_keeps_other_streams():
+    keys, values, per_stream = interleaved_streams(streams=6, samples=20)
+    bank = KalmanFilterBank(capacity=2)
+    half = len(keys) // 2
+    bank.update(keys[:half], values[:half])
+    dropped = keys[0]
+    bank.discard([dropped])
+    rest = [(key, value) for key, value in zip(keys[half:], values[half:]) if key != dropped]
+    bank.update([key for key, _ in rest], [value for _, value in rest])
+
+    for key, stream in per_stream.items():
+        if key != dropped:
+            assert bank.estimate(key) == apply_kalman_filter(stream)[-1]
+    assert bank.estimate(dropped) is None
+
+
+def test_butterworth_bank_matches_causal_filter():
+    keys, values, per_stream = interleaved_streams(seed=1)
+    outputs = bank_outputs(ButterworthStreamBank(capacity=4), keys, values)
+    for key, stream in per_stream.items():
+        np.testing.assert_allclose(outputs[key], butterworth_reference(stream), rtol=0, atol=1e-9)
+
+
+def test_butterworth_bank_block_matches_samples():
+    _, _, per_stream = interleaved_streams(streams=4, samples=30, seed=2)
+    keys = list(per_stream)
+    block = ButterworthStreamBank().process(keys, [per_stream[key] for key in keys])
+    for row, key in enumerate(keys):
+        np.testing.assert_allclose(block[row], butterworth_reference(per_stream[key]), rtol=0, atol=1e-9)
+
+
+def test_running_median_matches_naive_median():
+    rng = random.Random(3)
+    for window in range(1, 8):
+        median = RunningMedian(window)
+        values = []
+        for _ in range(200):
+            value = rng.choice([rng.randint(-95, -45), rng.uniform(-95, -45)])
+            values.append(value)
+            assert median.push(value) == statistics.median(values[-window:])
+        assert len(median) == window
+
+
+def test_running_median_bank_evicts_expired_then_oldest():
+    now = [0.0]
+    bank = RunningMedianBank(window=3, ttl=10.0, max_streams=3, clock=lambda: now[0])
+    for key in ("a", "b", "c"):
+        bank.update(key, -60)
+        now[0] += 1.0
+    bank.update("a", -70)           # "a" devient le plus récent
+    bank.update("d", -80)           # au-delà de max_streams : "b" (le plus ancien) est retiré
+    assert "b" not in bank and len(bank) == 3
+    now[0] += 9.5                   # "c" (vu à t=2) expire, pas "a" ni "d" (vus à t=3)
+    bank.update("d", -80)
+    assert "c" not in bank and "a" in bank
+    assert bank.evicted == 2
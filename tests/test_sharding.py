@@ -0,0 +1,76 @@
+"""
+Ingestion répartie : pour chaque balise, la suite des (rssi, médiane
+glissante) écrite par les shards doit être celle du mode mono-processus, et
+un lot refusé (429) ne doit laisser aucune mesure en file.
+"""
+import os
+import queue
+import random
+from collections import defaultdict
+
+from core import config, server
+from core.filters import RunningMedianBank
+from core.sharding import ShardPool, shard_of
+from core.storage import iter_log_records
+
+
+def minew_batches(count=600, beacons=12, batch=40, seed=0):
+    """Lots de relevés Minew (médiane glissante laissée au stockage, comme en mode réparti)"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        beacon = f"C30000{rng.randrange(beacons):06X}"
+        entries.append({"time": i, "beacon": beacon, "mac": beacon, "rssi": rng.randint(-95, -45),
+                        "median": None, "source": "minew"})
+    return [entries[i:i + batch] for i in range(0, count, batch)]
+
+
+def per_beacon(records):
+    sequences = defaultdict(list)
+    for record in records:
+        sequences[record["beacon"]].append((record["rssi"], record["median"]))
+    return dict(sequences)
+
+
+def test_shards_match_single_process(tmp_path, monkeypatch):
+    batches = minew_batches()
+
+    # Mode mono-processus : médianes du serveur, dans l'ordre d'arrivée
+    monkeypatch.setattr(server, "sliding_medians", RunningMedianBank(
+        window=config.SLIDING_MEDIAN_WINDOW, ttl=config.SLIDING_MEDIAN_TTL,
+        max_streams=config.SLIDING_MEDIAN_MAX_STREAMS,
+    ))
+    reference = per_beacon(
+        entry for batch in batches for entry in server.apply_sliding_medians([dict(e) for e in batch])
+    )
+
+    # Mode réparti : deux workers, journal dans un dossier temporaire, sans tampon partagé
+    monkeypatch.setattr(config, "LOG_DIR", str(tmp_path / "log"))
+    monkeypatch.setattr(config, "BEACONS_DIR", str(tmp_path / "beacons"))
+    monkeypatch.setattr(config, "SHM_RING_NAME", f"test_shards_{os.getpid()}")
+    monkeypatch.setattr(config, "METRICS_ENABLED", False)
+    pool = ShardPool(workers=2, queue_size=len(batches)).start()
+    try:
+        for batch in batches:
+            assert pool.dispatch([dict(entry) for entry in batch])
+    finally:
+        pool.close()  # attend l'écriture de toutes les mesures
+
+    assert per_beacon(iter_log_records(config.LOG_DIR)) == reference
+
+
+def test_dispatch_is_all_or_nothing():
+    pool = ShardPool(workers=2, queue_size=1)
+    pool.inboxes = [queue.Queue(maxsize=1) for _ in range(2)]
+    batch = minew_batches(count=40, batch=40)[0]
+    assert {shard_of(entry["beacon"], 2) for entry in batch} == {0, 1}
+
+    pool.inboxes[1].put_nowait(["lot en attente"])  # shard 1 saturé
+    assert not pool.dispatch(batch)
+    assert pool.inboxes[0].empty()                  # rien envoyé au shard 0 non plus
+    assert pool.dropped == len(batch)
+
+    pool.inboxes[1].get_nowait()                    # le worker libère sa file
+    assert pool.dispatch(batch)                     # le client renvoie le lot entier
+    delivered = [entry for inbox in pool.inboxes for entry in inbox.get_nowait()]
+    assert sorted(map(id, delivered)) == sorted(map(id, batch))